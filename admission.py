@@ -0,0 +1,114 @@
+"""Admission control: batas koneksi per proses dan per IP sumber
+
+Setiap koneksi baru diperiksa sebelum dibuatkan ClientConnection, masuk
+registry atau room. Koneksi yang melebihi batas menerima satu FRAME_BUSY
+berisi saran jeda (retry_after) lalu ditutup, sehingga lonjakan reconnect
+ditolak dengan murah alih-alih menghabiskan fd dan memori server.
+
+Accept sendiri dilakukan event loop asyncio: setiap kali listening socket
+readable, accept() diulang sampai EAGAIN (paling banyak LISTEN_BACKLOG
+koneksi per putaran), jadi backlog kernel dikuras dalam satu batch.
+
+Batas berlaku per proses (per worker di mode cluster). Semua method
+dipanggil dari thread event loop.
+
+Konfigurasi lewat environment (0 = tanpa batas):
+    LISTEN_BACKLOG      panjang antrean accept kernel dan ukuran batch accept
+                        (default 1024; dibatasi net.core.somaxconn)
+    MAX_CLIENTS         koneksi per proses (default: batas fd RLIMIT_NOFILE
+                        dikurangi FD_RESERVE, dihitung saat server mulai setelah
+                        soft limit dinaikkan; tanpa batas jika tidak diketahui)
+    MAX_CLIENTS_PER_IP  koneksi per alamat IP sumber (default 0)
+    FD_RESERVE          fd yang disisakan untuk log, file transfer dan
+                        koneksi yang sedang ditolak (default 128)
+    BUSY_RETRY_AFTER    detik jeda yang disarankan ke client yang ditolak (default 5)
+"""
+import os
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LISTEN_BACKLOG = int(os.environ.get('LISTEN_BACKLOG', '1024'))
+FD_RESERVE = int(os.environ.get('FD_RESERVE', '128'))
+MAX_CLIENTS_PER_IP = int(os.environ.get('MAX_CLIENTS_PER_IP', '0'))
+BUSY_RETRY_AFTER = float(os.environ.get('BUSY_RETRY_AFTER', '5'))
+# Detik maksimal menunggu client menutup koneksi yang ditolak
+BUSY_LINGER = 2.0
+
+# Alasan penolakan di FRAME_BUSY
+REASON_CLIENTS = "clients"
+REASON_IP = "ip"
+
+
+def default_max_clients():
+    """Batas koneksi dari batas fd proses; 0 jika tidak diketahui"""
+    if resource is None:
+        return 0
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return 0
+    return max(soft - FD_RESERVE, 1)
+
+
+# None = dihitung dari batas fd saat server mulai (setelah soft limit dinaikkan)
+MAX_CLIENTS = int(os.environ['MAX_CLIENTS']) if os.environ.get('MAX_CLIENTS') else None
+
+
+def source_ip(addr):
+    """Kunci batas per IP dari peername (tuple IPv4/IPv6), None untuk socket lain.
+
+    Koneksi tanpa alamat IP tidak dibatasi per IP, hanya oleh MAX_CLIENTS.
+    """
+    return addr[0] if isinstance(addr, tuple) and addr else None
+
+
+class AdmissionControl:
+    """Hitungan koneksi aktif total dan per IP"""
+
+    def __init__(self, max_clients=None, max_per_ip=None, retry_after=None):
+        self.max_clients = MAX_CLIENTS if max_clients is None else max_clients
+        # Batas dari batas fd, dihitung ulang oleh apply_fd_limit()
+        self.auto_limit = self.max_clients is None
+        self.max_per_ip = MAX_CLIENTS_PER_IP if max_per_ip is None else max_per_ip
+        self.retry_after = BUSY_RETRY_AFTER if retry_after is None else retry_after
+        self.active = 0
+        self.per_ip = {}  # IP -> jumlah koneksi aktif
+
+    def apply_fd_limit(self):
+        """Hitung batas default dari batas fd saat ini (dipanggil saat server mulai)"""
+        if self.auto_limit:
+            self.max_clients = default_max_clients()
+
+    def admit(self, addr):
+        """Catat koneksi baru jika masih ada tempat.
+
+        Mengembalikan None jika diterima, atau (alasan, retry_after) jika
+        ditolak; koneksi yang diterima wajib dilepas dengan release().
+        """
+        if self.max_clients and self.active >= self.max_clients:
+            return REASON_CLIENTS, self.retry_after
+        ip = source_ip(addr)
+        if self.max_per_ip and ip is not None and self.per_ip.get(ip, 0) >= self.max_per_ip:
+            return REASON_IP, self.retry_after
+        self.add(addr)
+        return None
+
+    def add(self, addr):
+        """Catat koneksi tanpa pemeriksaan batas (client hasil handoff)"""
+        ip = source_ip(addr)
+        self.active += 1
+        if ip is not None:
+            self.per_ip[ip] = self.per_ip.get(ip, 0) + 1
+
+    def release(self, addr):
+        ip = source_ip(addr)
+        self.active -= 1
+        if ip is None:
+            return
+        count = self.per_ip.get(ip, 0) - 1
+        if count > 0:
+            self.per_ip[ip] = count
+        else:
+            self.per_ip.pop(ip, None)
@@ -0,0 +1,143 @@
+"""Benchmark fan-out broadcast: encode per penerima vs encode sekali + coalescing
+
+Mode "legacy" meniru jalur broadcast lama: string di-encode ulang untuk setiap
+penerima dan setiap pesan ditulis dengan write() sendiri. Mode "encode-once"
+memakai jalur server sekarang: frame di-encode sekali lalu dimasukkan ke
+ClientConnection, yang menggabungkan frame tertunda dalam satu writelines().
+
+Jumlah syscall dihitung dari panggilan send/sendmsg pada socket sisi server,
+CPU dari time.process_time(). Jalankan dari root repo:
+
+    python benchmarks/fanout_bench.py --clients 200 --messages 2000 --burst 20
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import FrameDecoder, encode_text  # noqa: E402
+from connection import ClientConnection  # noqa: E402
+
+
+class CountingSocket(socket.socket):
+    """Socket yang menghitung panggilan send/sendmsg (satu panggilan = satu syscall)"""
+
+    syscalls = 0
+
+    def send(self, data, flags=0):
+        CountingSocket.syscalls += 1
+        return super().send(data, flags)
+
+    def sendmsg(self, buffers, *args):
+        CountingSocket.syscalls += 1
+        return super().sendmsg(buffers, *args)
+
+
+async def _receiver(reader, expected, done):
+    decoder = FrameDecoder()
+    received = 0
+    while received < expected:
+        chunk = await reader.read(256 * 1024)
+        if not chunk:
+            break
+        decoder.feed(chunk)
+        for _frame in decoder.frames():
+            received += 1
+    done.append(received)
+
+
+async def run_mode(mode, clients, messages, burst, size):
+    loop = asyncio.get_running_loop()
+    conns = []
+    receivers = []
+    streams = []
+    done = []
+    for _ in range(clients):
+        a, b = socket.socketpair()
+        server_sock = CountingSocket(a.family, a.type, a.proto, fileno=a.detach())
+        server_reader, writer = await asyncio.open_connection(sock=server_sock)
+        reader, client_writer = await asyncio.open_connection(sock=b)
+        # Simpan referensi agar transport tidak ditutup oleh garbage collector
+        streams.append((server_reader, client_writer))
+        conn = ClientConnection(writer, ("bench", 0), maxsize=messages + 1)
+        conn.start()
+        conns.append(conn)
+        receivers.append(loop.create_task(_receiver(reader, messages, done)))
+
+    body = "x" * size
+    encodes = 0
+    CountingSocket.syscalls = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(messages):
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        if mode == "legacy":
+            for conn in conns:
+                conn.writer.write(encode_text(f"[{timestamp}] 127.0.0.1: {body}"))
+                encodes += 1
+        else:
+            frame = encode_text(f"[{timestamp}] 127.0.0.1: {body}")
+            encodes += 1
+            for conn in conns:
+                conn.send(frame)
+        if (i + 1) % burst == 0:
+            # Beri kesempatan writer dan receiver berjalan di antara burst
+            await asyncio.sleep(0)
+    await asyncio.gather(*receivers)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    syscalls = CountingSocket.syscalls
+
+    for conn in conns:
+        conn.close()
+        await conn.wait_closed()
+    for _reader, client_writer in streams:
+        client_writer.close()
+
+    delivered = sum(done)
+    return {
+        "mode": mode,
+        "clients": clients,
+        "messages": messages,
+        "burst": burst,
+        "size": size,
+        "delivered": delivered,
+        "encodes": encodes,
+        "send_syscalls": syscalls,
+        "syscalls_per_delivered": syscalls / delivered if delivered else 0.0,
+        "cpu_us_per_delivered": cpu * 1e6 / delivered if delivered else 0.0,
+        "delivered_per_sec": delivered / wall if wall else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fan-out broadcast ChatBox")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=20, help="pesan per burst")
+    parser.add_argument("--size", type=int, default=64, help="panjang isi pesan")
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    results = []
+    for mode in ("legacy", "encode-once"):
+        res = asyncio.run(run_mode(mode, args.clients, args.messages, args.burst, args.size))
+        results.append(res)
+        print(f"{mode:12} delivered={res['delivered']:>9} encodes={res['encodes']:>9} "
+              f"syscalls/msg={res['syscalls_per_delivered']:.3f} "
+              f"cpu/msg={res['cpu_us_per_delivered']:.2f}us "
+              f"rate={res['delivered_per_sec']:.0f}/s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
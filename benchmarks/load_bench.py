@@ -0,0 +1,414 @@
+"""Benchmark beban dan latensi server chat dengan ribuan client simulasi
+
+Server dijalankan sebagai subprocess di localhost (default), di dalam proses
+benchmark (--inprocess), atau server yang sudah berjalan (--connect).
+Semua client adalah koneksi asyncio di satu proses. Sebagian client menjadi
+pengirim dengan laju total --rate pesan/detik; setiap pesan membawa waktu
+kirim (monotonic_ns) sehingga setiap penerima bisa menghitung latensi
+fan-out dari send sampai frame diterima.
+
+Hasil: throughput kirim/terima, latensi p50/p99/p999, memori server per
+koneksi (selisih RSS), dan CPU server selama fase ukur. CPU dan RSS dibaca
+dari /proc, jadi hanya tersedia di Linux; pada mode --inprocess angka ini
+termasuk beban generator sendiri.
+
+Jalankan dari root repo:
+
+    python benchmarks/load_bench.py --clients 2000 --senders 20 --rate 200 \\
+        --duration 10 --json hasil.json
+    python benchmarks/load_bench.py --clients 2000 --compare hasil.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from protocol import FrameDecoder, FRAME_TEXT, encode_text  # noqa: E402
+
+MARKER = b"bench:"
+
+
+def _raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except Exception:
+        pass
+
+
+def _proc_cpu(pid):
+    """Detik CPU (user + system) proses pid, None jika /proc tidak ada"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _proc_rss(pid):
+    """RSS proses pid dalam byte, None jika /proc tidak ada"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ServerProcess:
+    """server.py cli sebagai subprocess di localhost"""
+
+    def __init__(self, port, env=None):
+        self.port = port
+        self.env = dict(os.environ, HOST="127.0.0.1", PORT=str(port), REPLAY_COUNT="0")
+        self.env.update(env or {})
+        self.proc = None
+        self.pid = None
+        self.workdir = None
+
+    def start(self):
+        # Direktori kerja sementara agar chat_logs benchmark tidak bercampur
+        self.workdir = tempfile.mkdtemp(prefix="chatbox-bench-")
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server.py"), "cli"],
+            cwd=self.workdir, env=self.env, stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.pid = self.proc.pid
+        _wait_port(self.port)
+
+    def stop(self):
+        if self.proc is None:
+            return
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class InProcessServer:
+    """server.start_server() di thread terpisah dalam proses benchmark"""
+
+    def __init__(self, port, env=None):
+        self.port = port
+        self.pid = os.getpid()
+        os.environ.update(HOST="127.0.0.1", PORT=str(port), REPLAY_COUNT="0")
+        os.environ.update(env or {})
+        self.thread = None
+
+    def start(self):
+        import server
+        self.server = server
+        self.thread = threading.Thread(
+            target=server.start_server, kwargs={"console": False}, daemon=True)
+        self.thread.start()
+        _wait_port(self.port)
+
+    def stop(self):
+        self.server.shutdown_server()
+        self.thread.join(10)
+
+
+class ExternalServer:
+    """Server yang sudah berjalan; CPU/RSS hanya jika --pid diberikan"""
+
+    def __init__(self, pid=None):
+        self.pid = pid
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def _wait_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server tidak listen di port {port}")
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.frames = 0
+        self.latencies = []
+        self.measuring = False
+
+
+async def _reader(reader, stats):
+    decoder = FrameDecoder()
+    latencies = stats.latencies
+    try:
+        while True:
+            chunk = await reader.read(256 * 1024)
+            if not chunk:
+                break
+            now = time.monotonic_ns()
+            decoder.feed(chunk)
+            for frame_type, payload in decoder.frames():
+                stats.frames += 1
+                if frame_type != FRAME_TEXT or not stats.measuring:
+                    continue
+                raw = payload.tobytes()
+                pos = raw.find(MARKER)
+                if pos < 0:
+                    continue
+                end = raw.find(b" ", pos)
+                sent_ns = int(raw[pos + len(MARKER):end if end > 0 else None])
+                latencies.append((now - sent_ns) / 1e6)
+                stats.received += 1
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+
+
+async def _wait_quiet(stats, quiet=0.5, timeout=60.0):
+    """Tunggu sampai tidak ada frame baru selama quiet detik"""
+    deadline = time.monotonic() + timeout
+    last = -1
+    while time.monotonic() < deadline:
+        if stats.frames == last:
+            return
+        last = stats.frames
+        await asyncio.sleep(quiet)
+
+
+async def run_load(host, port, args, server):
+    stats = Stats()
+    writers = []
+    tasks = []
+    rss_before = _proc_rss(server.pid) if server.pid else None
+
+    # Buka koneksi dengan konkurensi terbatas agar backlog tidak meluap
+    sem = asyncio.Semaphore(args.connect_concurrency)
+
+    async def open_one():
+        async with sem:
+            reader, writer = await asyncio.open_connection(host, port)
+        writers.append(writer)
+        tasks.append(asyncio.get_running_loop().create_task(_reader(reader, stats)))
+
+    connect_start = time.perf_counter()
+    await asyncio.gather(*(open_one() for _ in range(args.clients)))
+    connect_time = time.perf_counter() - connect_start
+    # Tunggu notifikasi "joined the chat" selesai menyebar
+    await _wait_quiet(stats)
+    rss_after = _proc_rss(server.pid) if server.pid else None
+
+    senders = writers[:max(1, min(args.senders, len(writers)))]
+    padding = "x" * max(0, args.size)
+    stats.measuring = True
+    cpu_start = _proc_cpu(server.pid) if server.pid else None
+    wall_start = time.perf_counter()
+    start_ns = time.monotonic_ns()
+    end_ns = start_ns + int(args.duration * 1e9)
+    i = 0
+    # Pacing: kirim semua pesan yang "jatuh tempo" lalu tidur sebentar
+    while True:
+        now = time.monotonic_ns()
+        if now >= end_ns:
+            break
+        due = int((now - start_ns) / 1e9 * args.rate)
+        while i < due:
+            writer = senders[i % len(senders)]
+            writer.write(encode_text(f"bench:{time.monotonic_ns()} {padding}"))
+            i += 1
+        stats.sent = i
+        await asyncio.sleep(0.001)
+    send_wall = time.perf_counter() - wall_start
+    await asyncio.gather(*(w.drain() for w in senders), return_exceptions=True)
+    expected = stats.sent * (len(writers) - 1)
+    deadline = time.monotonic() + args.drain_timeout
+    while stats.received < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    wall = time.perf_counter() - wall_start
+    cpu_end = _proc_cpu(server.pid) if server.pid else None
+    stats.measuring = False
+
+    for writer in writers:
+        writer.close()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    lat = sorted(stats.latencies)
+    result = {
+        "sent": stats.sent,
+        "expected_deliveries": expected,
+        "delivered": stats.received,
+        "delivery_ratio": stats.received / expected if expected else 0.0,
+        "connect_seconds": connect_time,
+        "send_rate": stats.sent / send_wall if send_wall else 0.0,
+        "deliveries_per_sec": stats.received / wall if wall else 0.0,
+        "latency_ms": {
+            "p50": percentile(lat, 50),
+            "p99": percentile(lat, 99),
+            "p999": percentile(lat, 99.9),
+            "max": lat[-1] if lat else 0.0,
+        },
+        "server_cpu_seconds": None,
+        "server_cpu_percent": None,
+        "server_rss_bytes": rss_after,
+        "memory_per_connection_bytes": None,
+    }
+    if cpu_start is not None and cpu_end is not None:
+        result["server_cpu_seconds"] = cpu_end - cpu_start
+        result["server_cpu_percent"] = 100.0 * (cpu_end - cpu_start) / wall
+    if rss_before is not None and rss_after is not None:
+        result["memory_per_connection_bytes"] = (rss_after - rss_before) / args.clients
+    return result
+
+
+# Metrik yang dibandingkan: (path, True jika lebih besar = lebih baik)
+COMPARE_METRICS = (
+    (("deliveries_per_sec",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p99"), False),
+    (("latency_ms", "p999"), False),
+    (("server_cpu_percent",), False),
+    (("memory_per_connection_bytes",), False),
+)
+
+
+def _lookup(result, path):
+    for key in path:
+        if result is None:
+            return None
+        result = result.get(key)
+    return result
+
+
+def compare(baseline, current, tolerance):
+    """Cetak perubahan terhadap baseline; True jika ada regresi > tolerance"""
+    regressed = False
+    for path, higher_is_better in COMPARE_METRICS:
+        old = _lookup(baseline["result"], path)
+        new = _lookup(current["result"], path)
+        name = ".".join(path)
+        if not old or new is None:
+            print(f"  {name:30} {old!s:>12} -> {new!s:>12}")
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESI"
+            regressed = True
+        print(f"  {name:30} {old:12.2f} -> {new:12.2f} ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark beban dan latensi ChatBox")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--senders", type=int, default=10, help="jumlah client pengirim")
+    parser.add_argument("--rate", type=float, default=100.0, help="total pesan/detik")
+    parser.add_argument("--size", type=int, default=64, help="panjang padding pesan")
+    parser.add_argument("--duration", type=float, default=10.0, help="detik fase ukur")
+    parser.add_argument("--drain-timeout", type=float, default=10.0)
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--inprocess", action="store_true", help="jalankan server di proses ini")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="pakai server yang sudah berjalan")
+    parser.add_argument("--pid", type=int, help="pid server untuk --connect (CPU/RSS)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment tambahan untuk server")
+    parser.add_argument("--label", default="asyncio", help="nama engine/konfigurasi")
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    parser.add_argument("--compare", help="file JSON baseline untuk dibandingkan")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="batas regresi relatif (default 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    _raise_fd_limit()
+    env = dict(item.split("=", 1) for item in args.env)
+    host, port = "127.0.0.1", args.port
+    if args.connect:
+        host, _, port_str = args.connect.rpartition(":")
+        port = int(port_str)
+        server = ExternalServer(args.pid)
+    elif args.inprocess:
+        server = InProcessServer(port, env)
+    else:
+        server = ServerProcess(port, env)
+
+    server.start()
+    try:
+        result = asyncio.run(run_load(host, port, args, server))
+    finally:
+        server.stop()
+
+    report = {
+        "label": args.label,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "clients": args.clients,
+            "senders": args.senders,
+            "rate": args.rate,
+            "size": args.size,
+            "duration": args.duration,
+            "server": "connect" if args.connect else "inprocess" if args.inprocess else "subprocess",
+            "env": env,
+        },
+        "result": result,
+    }
+    lat = result["latency_ms"]
+    print(f"{args.label}: clients={args.clients} sent={result['sent']} "
+          f"delivered={result['delivered']}/{result['expected_deliveries']} "
+          f"rate={result['deliveries_per_sec']:.0f}/s "
+          f"p50={lat['p50']:.2f}ms p99={lat['p99']:.2f}ms p999={lat['p999']:.2f}ms")
+    if result["server_cpu_percent"] is not None:
+        print(f"  server cpu={result['server_cpu_percent']:.1f}% "
+              f"rss={result['server_rss_bytes'] / 1e6:.1f}MB")
+    if result["memory_per_connection_bytes"] is not None:
+        print(f"  memori per koneksi={result['memory_per_connection_bytes'] / 1024:.1f}KiB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Dibandingkan dengan {baseline.get('label')} ({baseline.get('timestamp')}):")
+        if compare(baseline, report, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
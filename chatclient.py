@@ -0,0 +1,225 @@
+"""Library client tanpa GUI dan tanpa console untuk integrasi, load test dan bot
+
+Dua varian:
+    ChatClient       sinkron, di atas session.ChatSession (reconnect, antrean
+                     offline, resume). Satu thread penerima per client.
+    AsyncChatClient  asyncio, tanpa thread; ratusan client bisa berjalan di
+                     satu event loop. Tidak menyambung ulang sendiri:
+                     iterasi pesan berhenti saat koneksi putus. Jika server
+                     menolak (FRAME_BUSY), retry_after berisi saran jedanya.
+
+Keduanya mengembalikan Message(text, room, seq, replay); room dan seq None
+untuk pesan di luar room (SERVER, DM). replay True untuk riwayat yang
+dikirim ulang server saat masuk room (juga setiap kali connect ke room
+default), yaitu pesan dengan nomor urut sampai pesan terakhir room saat
+masuk. run_bot() melewati pesan replay agar bot tidak membalas riwayat. Pesan yang belum dibaca ditahan di antrean
+terbatas (CHAT_RECV_QUEUE); pada AsyncChatClient antrean penuh membuat
+socket berhenti dibaca sehingga server yang menahan pesan berikutnya.
+
+Contoh bot:
+
+    async def echo(message):
+        if "ping" in message.text:
+            return "pong"
+
+    async def main():
+        async with AsyncChatClient("127.0.0.1", 8081, nickname="bot1") as client:
+            await run_bot(client, echo)
+
+Modul ini tidak mengimpor tkinter dan tidak menulis log chat.
+"""
+import asyncio
+import collections
+import os
+import queue
+
+from protocol import (FrameDecoder, FrameError, FRAME_HELLO, FRAME_PING, FRAME_BUSY,
+                      COMPRESSION_ZLIB, encode_text, decode_text, encode_hello, expand_frames,
+                      encode_pong, decode_busy)
+from session import ChatSession, SeqFilter, SEND_FULL
+
+CHAT_RECV_QUEUE = int(os.environ.get('CHAT_RECV_QUEUE', '10000'))
+
+Message = collections.namedtuple("Message", "text room seq replay", defaults=(False,))
+
+
+class ChatClient:
+    """Client sinkron; send() tidak pernah menunggu server saat offline"""
+
+    def __init__(self, host, port, nickname=None, compress=False, queue_size=None):
+        self.nickname = nickname
+        self.messages = queue.Queue(queue_size or CHAT_RECV_QUEUE)
+        self.dropped = 0
+        self.session = ChatSession(host, port, compress, self._on_message)
+
+    def _on_message(self, text):
+        # Dipanggil dari thread session tepat setelah SeqFilter.accept()
+        seq_filter = self.session.seq_filter
+        room, seq = seq_filter.context
+        try:
+            self.messages.put_nowait(Message(text, room, seq, seq_filter.replay))
+        except queue.Full:
+            self.dropped += 1
+
+    def connect(self):
+        """Sambungkan ke server (OSError jika gagal); nickname diset jika ada"""
+        self.session.start()
+        if self.nickname:
+            self.send(f"/nick {self.nickname}")
+        return self
+
+    def send(self, text):
+        """Kirim satu pesan; False jika antrean offline penuh"""
+        return self.session.send(text) != SEND_FULL
+
+    def send_many(self, texts):
+        """Kirim banyak pesan dengan satu write"""
+        return self.session.send_many(texts) != SEND_FULL
+
+    def recv(self, timeout=None):
+        """Pesan berikutnya, atau None jika timeout habis"""
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __iter__(self):
+        while not self.session.closed:
+            message = self.recv(timeout=0.5)
+            if message is not None:
+                yield message
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncChatClient:
+    """Client asyncio; satu task pembaca per client, tanpa thread"""
+
+    def __init__(self, host, port, nickname=None, compress=False, queue_size=None):
+        self.host = host
+        self.port = port
+        self.nickname = nickname
+        self.compress = compress
+        self.seq_filter = SeqFilter()
+        self.messages = asyncio.Queue(queue_size or CHAT_RECV_QUEUE)
+        self.closed = False
+        self.retry_after = None  # detik dari FRAME_BUSY jika server menolak koneksi
+        self._reader = None
+        self._writer = None
+        self._task = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        options = {"heartbeat": 1}
+        if self.compress:
+            options["compress"] = COMPRESSION_ZLIB
+        data = encode_hello(**options)
+        if self.nickname:
+            data += encode_text(f"/nick {self.nickname}")
+        self._writer.write(data)
+        await self._writer.drain()
+        self._task = asyncio.get_running_loop().create_task(self._read_loop())
+        return self
+
+    async def _read_loop(self):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                chunk = await self._reader.read(64 * 1024)
+                if not chunk:
+                    break
+                decoder.feed(chunk)
+                for frame_type, payload in expand_frames(decoder.frames()):
+                    if frame_type == FRAME_PING:
+                        self._writer.write(encode_pong(payload))
+                        continue
+                    if frame_type == FRAME_BUSY:
+                        self.retry_after = decode_busy(payload)[0]
+                        return
+                    if frame_type == FRAME_HELLO or not self.seq_filter.accept(frame_type, payload):
+                        continue
+                    room, seq = self.seq_filter.context
+                    # Menunggu jika antrean penuh: socket berhenti dibaca
+                    await self.messages.put(Message(decode_text(payload), room, seq,
+                                                    self.seq_filter.replay))
+        except (OSError, FrameError):
+            pass
+        finally:
+            self.closed = True
+            # Penanda akhir untuk iterator yang sedang menunggu
+            try:
+                self.messages.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    async def send(self, text):
+        self._writer.write(encode_text(text))
+        await self._writer.drain()
+
+    async def send_many(self, texts):
+        """Kirim banyak pesan dengan satu write"""
+        self._writer.write(b"".join(encode_text(text) for text in texts))
+        await self._writer.drain()
+
+    async def recv(self, timeout=None):
+        """Pesan berikutnya; None jika koneksi putus atau timeout habis"""
+        if self.closed and self.messages.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed and self.messages.empty():
+            raise StopAsyncIteration
+        message = await self.messages.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, 1.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def run_bot(client, handler):
+    """Panggil handler(message) untuk setiap pesan masuk sampai koneksi putus.
+
+    handler boleh fungsi biasa atau coroutine; jika mengembalikan teks,
+    teks itu dikirim sebagai balasan (ke room aktif bot). Riwayat yang
+    di-replay saat masuk room (message.replay) tidak diteruskan ke handler.
+    """
+    async for message in client:
+        if message.replay:
+            continue
+        reply = handler(message)
+        if asyncio.iscoroutine(reply):
+            reply = await reply
+        if reply:
+            await client.send(reply)
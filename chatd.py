@@ -0,0 +1,131 @@
+"""Entry point server headless (daemon) untuk supervisor dan container
+
+Tanpa GUI, tanpa tkinter, dan tanpa thread input console. Semua pengaturan
+server memakai nama variabel environment yang sama (HOST, PORT, WORKERS,
+RATE_MSGS, LOG_FORMAT, ...), diambil dengan urutan prioritas:
+
+    1. flag CLI (--port 9000, atau --set KEY=VALUE untuk kunci lain)
+    2. environment
+    3. file konfigurasi (--config FILE): baris KEY=VALUE, '#' untuk komentar
+
+Nilai dimasukkan ke os.environ sebelum server.py diimpor, karena setiap
+modul membaca konfigurasinya saat diimpor (worker cluster mewarisinya).
+
+Sinyal siap: READY=1 lewat NOTIFY_SOCKET (systemd Type=notify) dan/atau
+file READY_FILE yang dibuat saat server menerima koneksi. SIGTERM/SIGINT
+menghentikan accept, mengirim pemberitahuan ke client, menunggu antrean
+keluar terkirim paling lama DRAIN_TIMEOUT detik, lalu menutup koneksi.
+
+Restart tanpa downtime (handoff.py): jalankan proses lama dengan
+--handoff-socket PATH, lalu proses baru dengan --handoff-socket PATH
+--takeover. Proses baru mengambil alih port dan semua koneksi client,
+kemudian proses lama berhenti tanpa memutus siapa pun.
+
+Koneksi di atas --max-clients / --max-clients-per-ip ditolak dengan
+FRAME_BUSY berisi saran jeda (admission.py); client menyambung ulang
+setelahnya dengan jitter.
+
+Contoh:
+    python chatd.py --config /etc/chatbox.conf --port 9000 --workers 4
+"""
+import argparse
+import os
+import sys
+
+# Flag CLI -> nama variabel environment
+FLAG_ENV = {
+    "host": "HOST",
+    "port": "PORT",
+    "workers": "WORKERS",
+    "log_dir": "LOG_DIR",
+    "log_format": "LOG_FORMAT",
+    "metrics_port": "METRICS_PORT",
+    "ready_file": "READY_FILE",
+    "drain_timeout": "DRAIN_TIMEOUT",
+    "handoff_socket": "HANDOFF_SOCKET",
+    "backlog": "LISTEN_BACKLOG",
+    "max_clients": "MAX_CLIENTS",
+    "max_clients_per_ip": "MAX_CLIENTS_PER_IP",
+}
+
+
+def read_config(path):
+    """Baca file KEY=VALUE; nilai boleh diapit tanda kutip"""
+    values = {}
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, sep, value = line.partition("=")
+            key = key.strip()
+            if not sep or not key:
+                raise ValueError(f"{path}:{lineno}: baris harus berbentuk KEY=VALUE")
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+                value = value[1:-1]
+            values[key] = value
+    return values
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Server chat mode headless")
+    parser.add_argument("--config", help="file konfigurasi KEY=VALUE")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--log-dir")
+    parser.add_argument("--log-format", choices=("text", "binary", "both"))
+    parser.add_argument("--metrics-port", type=int, help="port endpoint metrik Prometheus (default mati)")
+    parser.add_argument("--ready-file", help="file yang dibuat saat server siap")
+    parser.add_argument("--drain-timeout", type=float, help="detik menguras client saat berhenti")
+    parser.add_argument("--handoff-socket", help="Unix socket untuk restart tanpa downtime")
+    parser.add_argument("--backlog", type=int, help="panjang antrean accept kernel")
+    parser.add_argument("--max-clients", type=int, help="batas koneksi per proses")
+    parser.add_argument("--max-clients-per-ip", type=int, help="batas koneksi per IP sumber")
+    parser.add_argument("--takeover", action="store_true",
+                        help="ambil alih listening socket dan client dari proses yang berjalan")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="pengaturan lain dengan nama variabel environment")
+    return parser.parse_args(argv)
+
+
+def apply_config(args, environ=None):
+    """Gabungkan file konfigurasi, environment dan flag ke environ"""
+    environ = os.environ if environ is None else environ
+    if args.config:
+        for key, value in read_config(args.config).items():
+            environ.setdefault(key, value)
+    for attr, key in FLAG_ENV.items():
+        value = getattr(args, attr)
+        if value is not None:
+            environ[key] = str(value)
+    for item in args.set:
+        key, sep, value = item.partition("=")
+        if not sep or not key:
+            raise ValueError(f"--set harus berbentuk KEY=VALUE: {item}")
+        environ[key.strip()] = value.strip()
+    if args.takeover:
+        environ["HANDOFF_TAKEOVER"] = "1"
+    return environ
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        apply_config(args)
+    except (OSError, ValueError) as e:
+        print(f"[CONFIG] {e}", file=sys.stderr)
+        return 2
+    # Log per baris walau stdout bukan terminal (journald, docker logs)
+    try:
+        sys.stdout.reconfigure(line_buffering=True)
+    except Exception:
+        pass
+    import server
+    server.daemon_main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""Penulis log chat di background untuk server.py dan client.py
+
+log_message() di server dan client hanya memasukkan record ke antrean. Satu
+thread writer menjaga file harian tetap terbuka, menulis record secara batch
+(berdasarkan jumlah atau waktu), dan berganti file saat tanggal berubah.
+
+Konfigurasi lewat environment:
+    LOG_FLUSH_INTERVAL  detik maksimal record menunggu di antrean (default 0.2)
+    LOG_BATCH_SIZE      jumlah record per batch tulis (default 512)
+    LOG_FSYNC_INTERVAL  mode durability: < 0 tidak pernah fsync (default),
+                        0 fsync setiap batch, > 0 fsync paling sering tiap N detik
+    LOG_QUEUE_SIZE      batas antrean; record dibuang jika disk tertinggal
+    LOG_FORMAT          'text' (default), 'binary' (segmen .chs, lihat
+                        logstore.py) atau 'both'
+    LOG_BLOCK_SECONDS   umur maksimal blok biner yang belum ditulis (default 5)
+"""
+import atexit
+import datetime
+import os
+import queue
+import threading
+import time
+
+import logstore
+
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '0.2'))
+LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', '512'))
+LOG_FSYNC_INTERVAL = float(os.environ.get('LOG_FSYNC_INTERVAL', '-1'))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '100000'))
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+LOG_BLOCK_SECONDS = float(os.environ.get('LOG_BLOCK_SECONDS', '5'))
+
+_STOP = object()
+
+
+class ChatLogWriter:
+    """Writer log harian asynchronous: <log_dir>/<prefix>_<YYYY-mm-dd>.txt"""
+
+    def __init__(self, log_dir, prefix, flush_interval=None, batch_size=None,
+                 fsync_interval=None, queue_size=None, log_format=None):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.flush_interval = LOG_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = batch_size or LOG_BATCH_SIZE
+        self.fsync_interval = LOG_FSYNC_INTERVAL if fsync_interval is None else fsync_interval
+        log_format = log_format or LOG_FORMAT
+        self.text_enabled = log_format in ("text", "both")
+        self.binary_enabled = log_format in ("binary", "both")
+        self.dropped = 0
+        self.written = 0
+        # Dipanggil dengan durasi (detik) setiap batch selesai ditulis
+        self.write_observer = None
+        self._queue = queue.Queue(maxsize=queue_size or LOG_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_date = None
+        self._segment = None
+        self._segment_started = 0.0
+        self._last_fsync = time.monotonic()
+        self._atexit_registered = False
+
+    def path_for(self, date):
+        """Path file log untuk tanggal tertentu (datetime.date)"""
+        return os.path.join(self.log_dir, f"{self.prefix}_{date.strftime('%Y-%m-%d')}.txt")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name=f"log-{self.prefix}", daemon=True)
+                thread.start()
+                self._thread = thread
+                if not self._atexit_registered:
+                    atexit.register(self.close)
+                    self._atexit_registered = True
+
+    def write(self, text):
+        """Antrekan satu baris log (tanpa timestamp); tidak pernah blocking"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.time(), text, None))
+        except queue.Full:
+            self.dropped += 1
+
+    def write_record(self, sender, record_type, message):
+        """Seperti write(), tapi field tetap terpisah untuk log biner"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.time(), f"{sender} - {record_type}: {message}",
+                                    (str(sender), record_type, message)))
+        except queue.Full:
+            self.dropped += 1
+
+    def pending(self):
+        """Jumlah record yang masih menunggu di antrean"""
+        return self._queue.qsize()
+
+    def flush(self, timeout=2.0):
+        """Tunggu sampai semua record yang sudah diantrekan tertulis ke file"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def close(self):
+        """Tulis sisa antrean, tutup file dan hentikan thread writer"""
+        thread = self._thread
+        if thread is None:
+            return
+        if thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout=5.0)
+        self._thread = None
+
+    def _open_for(self, now):
+        date = datetime.date.fromtimestamp(now)
+        if date != self._file_date:
+            # Ganti file saat tengah malam
+            if self._file is not None:
+                self._file.close()
+            os.makedirs(self.log_dir, exist_ok=True)
+            # Tanpa buffer: satu batch = satu write() O_APPEND, sehingga
+            # beberapa proses (worker cluster) aman menulis ke file yang sama
+            if self.text_enabled:
+                self._file = open(self.path_for(date), "ab", buffering=0)
+            if self.binary_enabled:
+                self._close_segment()
+                path = self.path_for(date)[:-4] + logstore.SEGMENT_SUFFIX
+                self._segment = logstore.SegmentWriter(path)
+            self._file_date = date
+        return self._file
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _write_batch(self, batch):
+        lines = []
+        current = None
+        for now, text, record in batch:
+            if lines and datetime.date.fromtimestamp(now) != self._file_date:
+                # Batch melewati tengah malam: tulis baris hari lama sebelum
+                # _open_for() menutup filenya
+                current.write("".join(lines).encode("utf-8"))
+                lines = []
+            f = self._open_for(now)
+            if self._segment is not None:
+                if not self._segment.pending:
+                    self._segment_started = time.monotonic()
+                sender, record_type, message = record or ("", "", text)
+                self._segment.append(now, record_type, sender, message)
+            if not self.text_enabled:
+                continue
+            if f is not current and lines:
+                current.write("".join(lines).encode("utf-8"))
+                lines = []
+            current = f
+            stamp = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+            lines.append(f"[{stamp}] {text}\n")
+        if lines:
+            current.write("".join(lines).encode("utf-8"))
+        if self._segment is not None and self._segment.pending and \
+                time.monotonic() - self._segment_started >= LOG_BLOCK_SECONDS:
+            # Blok biner ditulis per 1024 record atau setelah LOG_BLOCK_SECONDS
+            self._segment.flush()
+        self.written += len(batch)
+
+    def _block_timeout(self):
+        """Detik sampai blok biner tertunda mencapai LOG_BLOCK_SECONDS; None jika tidak ada"""
+        if self._segment is None or not self._segment.pending:
+            return None
+        return max(self._segment_started + LOG_BLOCK_SECONDS - time.monotonic(), 0.0)
+
+    def _sync(self, force=False, flush_block=False):
+        if (force or flush_block) and self._segment is not None:
+            self._segment.flush()
+        if self._file is not None:
+            self._file.flush()
+        if self.fsync_interval < 0:
+            return
+        now = time.monotonic()
+        if force or now - self._last_fsync >= self.fsync_interval:
+            for f in (self._file, self._segment):
+                if f is not None:
+                    os.fsync(f.fileno())
+            self._last_fsync = now
+
+    def _run(self):
+        q = self._queue
+        stopping = False
+        while not stopping:
+            # Blocking tanpa timeout jika tidak ada blok biner tertunda: thread
+            # tidur total saat tidak ada log
+            try:
+                item = q.get(timeout=self._block_timeout())
+            except queue.Empty:
+                # Server diam: blok biner tidak boleh lebih tua dari LOG_BLOCK_SECONDS
+                try:
+                    self._sync(flush_block=True)
+                except Exception:
+                    pass
+                continue
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            # Kumpulkan record sampai batch penuh atau flush_interval habis
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stopping or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            started = time.perf_counter()
+            try:
+                if batch:
+                    self._write_batch(batch)
+                # flush() menunggu record sampai di disk, termasuk blok biner
+                self._sync(force=stopping, flush_block=bool(waiters))
+            except Exception:
+                # Jangan sampai error disk menghentikan writer
+                pass
+            if batch and self.write_observer is not None:
+                self.write_observer(time.perf_counter() - started)
+            for waiter in waiters:
+                waiter.set()
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+        try:
+            self._close_segment()
+        except Exception:
+            pass
+        self._file_date = None
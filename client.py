@@ -1,67 +1,139 @@
-import socket
 import datetime
 import os
-import threading
 import sys
-try:
-    import tkinter as tk
-    from tkinter import ttk, messagebox
-    from tkinter.scrolledtext import ScrolledText
-except Exception:
-    tk = None
-
-# Buat direktori untuk menyimpan log jika belum ada
-LOG_DIR = "chat_logs"
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+from protocol import FrameError, COMPRESSION_ZLIB
+from chatlog import ChatLogWriter
+from history import HistoryStore
+from logview import BatchedLogView
+from session import ChatSession, SeqFilter, SEND_OK, SEND_QUEUED
+
+# tkinter baru diimpor saat GUI dijalankan (load_tk), tidak di mode CLI
+tk = ttk = messagebox = filedialog = ScrolledText = None
+
+def load_tk():
+    """Impor tkinter untuk GUI; False jika tidak tersedia"""
+    global tk, ttk, messagebox, filedialog, ScrolledText
+    if tk is not None:
+        return True
+    try:
+        import tkinter
+        from tkinter import ttk as _ttk, messagebox as _messagebox, filedialog as _filedialog
+        from tkinter.scrolledtext import ScrolledText as _ScrolledText
+    except Exception:
+        return False
+    tk, ttk, messagebox, filedialog = tkinter, _ttk, _messagebox, _filedialog
+    ScrolledText = _ScrolledText
+    return True
+
+# Direktori log; dibuat writer saat record pertama ditulis
+LOG_DIR = os.environ.get('LOG_DIR', 'chat_logs')
+
+# Writer log di background; file harian tetap terbuka
+chat_log = ChatLogWriter(LOG_DIR, "client_chat")
+# Riwayat (tail, paging, rentang waktu, pencarian) atas file log yang sama
+history_store = HistoryStore(LOG_DIR, "client_chat")
+
+HISTORY_PAGE_SIZE = 10
+
+# Minta server mengompres pesan (opt-in): CHAT_COMPRESSION=zlib
+CHAT_COMPRESSION = os.environ.get('CHAT_COMPRESSION', '').lower() == COMPRESSION_ZLIB
 
 def log_message(message, message_type="SENT", server_response=""):
-    """Fungsi untuk menyimpan log percakapan di client"""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_file = os.path.join(LOG_DIR, f"client_chat_{datetime.datetime.now().strftime('%Y-%m-%d')}.txt")
-    
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"[{timestamp}] CLIENT - {message_type}: {message}\n")
-        if server_response:
-            f.write(f"[{timestamp}] SERVER RESPONSE: {server_response}\n")
-
-def show_chat_history():
-    """Fungsi untuk menampilkan riwayat chat hari ini"""
-    log_file = os.path.join(LOG_DIR, f"client_chat_{datetime.datetime.now().strftime('%Y-%m-%d')}.txt")
-    
-    if os.path.exists(log_file):
-        print("\n" + "="*50)
-        print("RIWAYAT CHAT HARI INI")
-        print("="*50)
-        try:
-            with open(log_file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                # Tampilkan 10 pesan terakhir
-                for line in lines[-10:]:
-                    print(line.strip())
-        except Exception as e:
-            print(f"Error membaca file log: {e}")
-        print("="*50 + "\n")
+    """Fungsi untuk menyimpan log percakapan di client (tidak menunggu disk)"""
+    chat_log.write_record("CLIENT", message_type, message)
+    if server_response:
+        chat_log.write(f"SERVER RESPONSE: {server_response}")
+
+def print_history(title, lines):
+    print("\n" + "="*50)
+    print(title)
+    print("="*50)
+    for line in lines:
+        print(line)
+    print("="*50 + "\n")
+
+def show_chat_history(page=0):
+    """Fungsi untuk menampilkan riwayat chat hari ini (page 0 = terbaru)"""
+    # Pastikan record yang masih di antrean sudah tertulis
+    chat_log.flush()
+    try:
+        # Dibaca dari akhir file, tidak memuat seluruh file
+        lines = history_store.page(page, HISTORY_PAGE_SIZE)
+    except Exception as e:
+        print(f"Error membaca file log: {e}")
+        return
+    if lines:
+        print_history(f"RIWAYAT CHAT HARI INI (halaman {page + 1})", lines)
+    elif page:
+        print("Tidak ada riwayat lebih lama hari ini.")
     else:
         print("Belum ada riwayat chat hari ini.")
 
-def receive_messages(client):
-    """Fungsi untuk menerima pesan dari server/client lain"""
+def handle_history_command(command):
+    """Perintah history:
+    history [halaman] | history search <kata kunci> [#halaman] |
+    history range <HH:MM> <HH:MM> [YYYY-mm-dd]
+    """
+    parts = command.split()
     try:
-        while True:
-            message = client.recv(1024).decode()
-            if not message:
-                break
-            
-            # Tampilkan pesan yang diterima
-            print(f"\n{message}")
-            print("Anda: ", end="", flush=True)
-            
-            # Log pesan yang diterima
-            log_message(message, "RECEIVED")
-            
+        if len(parts) == 1:
+            show_chat_history()
+        elif parts[1].isdigit():
+            show_chat_history(max(int(parts[1]) - 1, 0))
+        elif parts[1] == "search" and len(parts) > 2:
+            page = 0
+            if parts[-1].startswith("#") and parts[-1][1:].isdigit():
+                page = max(int(parts.pop()[1:]) - 1, 0)
+            query = " ".join(parts[2:])
+            chat_log.flush()
+            lines = history_store.search(query, HISTORY_PAGE_SIZE, page)
+            if lines:
+                print_history(f"HASIL PENCARIAN '{query}' (halaman {page + 1})", lines)
+            else:
+                print(f"Tidak ada riwayat yang cocok dengan '{query}'.")
+        elif parts[1] == "range" and len(parts) >= 4:
+            day = parts[4] if len(parts) > 4 else datetime.date.today().strftime("%Y-%m-%d")
+            start = datetime.datetime.strptime(f"{day} {parts[2]}", "%Y-%m-%d %H:%M")
+            end = datetime.datetime.strptime(f"{day} {parts[3]}", "%Y-%m-%d %H:%M")
+            end += datetime.timedelta(seconds=59)
+            chat_log.flush()
+            lines = history_store.range(start, end)
+            if lines:
+                print_history(f"RIWAYAT {day} {parts[2]}-{parts[3]}", lines)
+            else:
+                print("Tidak ada riwayat pada rentang waktu tersebut.")
+        else:
+            print(handle_history_command.__doc__)
+    except ValueError:
+        print("Format waktu tidak valid. Contoh: history range 08:00 09:30 2025-10-16")
     except Exception as e:
-        print(f"\nError receiving message: {e}")
+        print(f"Error membaca file log: {e}")
+
+def handle_file_command(session, text):
+    """Perintah file yang ditangani client: /send <path> dan /get <id>.
+
+    Mengembalikan teks status, atau None jika text bukan perintah file.
+    """
+    cmd, _, arg = text.partition(" ")
+    arg = arg.strip()
+    if cmd == "/send":
+        if not arg:
+            return "Gunakan: /send <path file>"
+        try:
+            upload = session.transfers.upload(os.path.expanduser(arg))
+        except OSError as e:
+            return f"File tidak bisa dibaca: {e}"
+        log_message(f"FILE UPLOAD: {upload.path}", "SENT")
+        return f"Mengupload {upload.name} di background..."
+    if cmd == "/get":
+        try:
+            session.transfers.download(arg)
+        except ValueError:
+            return "Gunakan: /get <id file>"
+        except OSError as e:
+            return f"Download gagal: {e}"
+        return f"Mengunduh file {arg}..."
+    return None
 
 def cli_main():
     # Input IP dan port server (LAN IP dari laptop server)
@@ -73,25 +145,34 @@ def cli_main():
         print("Port tidak valid. Gunakan angka, contoh 8081.")
         return
 
-    # Membuat socket client
-    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def on_message(message):
+        # Tampilkan dan log pesan yang diterima
+        print(f"\n{message}")
+        print("Anda: ", end="", flush=True)
+        log_message(message, "RECEIVED")
+
+    def on_status(text):
+        print(f"\n{text}")
+        print("Anda: ", end="", flush=True)
+        log_message(text, "SYSTEM")
+
+    # Session menyambung ulang sendiri jika koneksi putus
+    session = ChatSession(server_ip, server_port, CHAT_COMPRESSION, on_message, on_status)
 
     try:
         # Koneksi ke server
-        client.connect((server_ip, server_port))
+        session.start()
         print("Berhasil terhubung ke server!")
         print("Ketik 'quit' untuk keluar dari chat")
         print("Ketik 'history' untuk melihat riwayat chat hari ini")
+        print("Ketik 'history 2' untuk halaman berikutnya, 'history search <kata>' untuk mencari")
+        print("Ketik '/join <room>', '/msg <nick> <pesan>' atau '/help' untuk perintah room")
+        print("Ketik '/send <path>' untuk berbagi file, '/get <id>' untuk mengunduhnya")
         print("-" * 40)
         
         # Log koneksi berhasil
         log_message("CONNECTED TO SERVER", "SYSTEM")
         
-        # Buat thread untuk menerima pesan
-        receive_thread = threading.Thread(target=receive_messages, args=(client,))
-        receive_thread.daemon = True
-        receive_thread.start()
-        
         while True:
             # Input pesan dari user
             message = input("Anda: ")
@@ -103,41 +184,65 @@ def cli_main():
                 break
             
             # Cek apakah user ingin melihat history
-            if message.lower() == 'history':
-                show_chat_history()
+            if message.lower() == 'history' or message.lower().startswith('history '):
+                handle_history_command(message)
+                continue
+            
+            # Transfer file berjalan di background, tidak menahan chat
+            notice = handle_file_command(session, message)
+            if notice is not None:
+                print(notice)
                 continue
             
-            # Mengirim pesan ke server
-            client.send(message.encode())
-            print(f"Pesan terkirim: {message}")
+            # Mengirim pesan ke server (ditahan di antrean jika sedang offline)
+            try:
+                result = session.send(message)
+            except FrameError as e:
+                print(f"Pesan tidak terkirim: {e}")
+                continue
+            if result == SEND_OK:
+                print(f"Pesan terkirim: {message}")
+            elif result == SEND_QUEUED:
+                print(f"Offline, pesan dikirim setelah tersambung: {message}")
+            else:
+                print("Antrean pesan offline penuh, pesan tidak terkirim")
+                continue
             
             # Log pesan yang dikirim
             log_message(message, "SENT")
         
     except ConnectionRefusedError:
         print("Gagal terhubung ke server. Pastikan server sudah berjalan.")
+    except (KeyboardInterrupt, EOFError):
+        print("\nKeluar dari chat...")
     except Exception as e:
         print(f"Terjadi error: {e}")
     finally:
         # Menutup koneksi
-        client.close()
+        session.close()
         print("Koneksi ditutup.")
 
 class ChatClientGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Chat Client")
-        self.client = None
-        self.receiver_thread = None
+        self.session = None
         self.connected = False
+        # Dipertahankan antar session agar connect ulang hanya menampilkan delta
+        self.seq_filter = SeqFilter()
+
+        # Daftar user online terbaru dari thread session; dirender oleh _poll_presence
+        self._users = set()
+        self._users_shown = None
 
         container = ttk.Frame(root, padding=10)
         container.grid(row=0, column=0, sticky="nsew")
+        container.columnconfigure(0, weight=1)
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
 
         conn_frame = ttk.Frame(container)
-        conn_frame.grid(row=0, column=0, sticky="ew")
+        conn_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
         conn_frame.columnconfigure(5, weight=1)
 
         ttk.Label(conn_frame, text="IP:").grid(row=0, column=0, padx=(0,5))
@@ -153,15 +258,33 @@ class ChatClientGUI:
         self.connect_btn = ttk.Button(conn_frame, text="Connect", command=self.toggle_connect)
         self.connect_btn.grid(row=0, column=4, padx=(10,0))
 
+        self.compress_var = tk.BooleanVar(value=CHAT_COMPRESSION)
+        ttk.Checkbutton(conn_frame, text="Kompresi", variable=self.compress_var).grid(row=0, column=6, padx=(10,0))
+
         self.history_btn = ttk.Button(conn_frame, text="History", command=self.show_history_popup)
         self.history_btn.grid(row=0, column=5, sticky="e")
 
+        self.file_btn = ttk.Button(conn_frame, text="Kirim File", command=self.send_file)
+        self.file_btn.grid(row=0, column=7, padx=(10,0))
+
         self.chat_box = ScrolledText(container, height=18, wrap=tk.WORD, state=tk.DISABLED)
         self.chat_box.grid(row=1, column=0, sticky="nsew", pady=(10,10))
         container.rowconfigure(1, weight=1)
+        # Pesan masuk dirender batch, bukan satu root.after per pesan
+        self.chat_view = BatchedLogView(root, self.chat_box)
+
+        users_frame = ttk.Frame(container)
+        users_frame.grid(row=1, column=1, sticky="ns", padx=(8,0), pady=(10,10))
+        users_frame.rowconfigure(1, weight=1)
+        self.users_label = ttk.Label(users_frame, text="Online (0)")
+        self.users_label.grid(row=0, column=0, sticky="w")
+        self.users_list = tk.Listbox(users_frame, width=18, activestyle="none")
+        self.users_list.grid(row=1, column=0, sticky="ns")
+        # Klik dua kali nama untuk menulis pesan langsung
+        self.users_list.bind("<Double-Button-1>", lambda _e: self.start_direct_message())
 
         input_frame = ttk.Frame(container)
-        input_frame.grid(row=2, column=0, sticky="ew")
+        input_frame.grid(row=2, column=0, columnspan=2, sticky="ew")
         input_frame.columnconfigure(0, weight=1)
 
         self.message_var = tk.StringVar()
@@ -173,12 +296,11 @@ class ChatClientGUI:
         self.send_btn.grid(row=0, column=1, padx=(8,0))
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self._poll_presence()
 
     def append_text(self, text):
-        self.chat_box.configure(state=tk.NORMAL)
-        self.chat_box.insert(tk.END, text + "\n")
-        self.chat_box.see(tk.END)
-        self.chat_box.configure(state=tk.DISABLED)
+        """Tambah baris ke chat box; aman dipanggil dari thread receiver"""
+        self.chat_view.append(text)
 
     def toggle_connect(self):
         if not self.connected:
@@ -194,93 +316,176 @@ class ChatClientGUI:
             messagebox.showerror("Error", "Port tidak valid. Gunakan angka, contoh 8081.")
             return
 
-        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Session menyambung ulang sendiri; callback dipanggil dari thread session
+        self.session = ChatSession(ip, port, self.compress_var.get(), self.on_message,
+                                   self.on_status, seq_filter=self.seq_filter,
+                                   on_presence=self.on_presence)
         try:
-            self.client.connect((ip, port))
+            self.session.start()
         except Exception as e:
             messagebox.showerror("Koneksi Gagal", f"Gagal terhubung: {e}")
-            self.client.close()
-            self.client = None
+            self.session = None
             return
 
         self.connected = True
         self.connect_btn.configure(text="Disconnect")
         self.append_text("Berhasil terhubung ke server!")
+        self.append_text("Ketik /join <room>, /msg <nick> <pesan> atau /help untuk perintah room")
+        self.append_text("Ketik /get <id> untuk mengunduh file yang dibagikan")
         log_message("CONNECTED TO SERVER", "SYSTEM")
 
-        self.receiver_thread = threading.Thread(target=self.receive_loop, daemon=True)
-        self.receiver_thread.start()
-
     def disconnect(self):
-        if self.client:
-            try:
-                self.client.close()
-            except Exception:
-                pass
-        self.client = None
+        if self.session:
+            self.session.close()
+        self.session = None
         if self.connected:
             log_message("DISCONNECTED FROM SERVER", "SYSTEM")
         self.connected = False
+        self._users = set()
         self.connect_btn.configure(text="Connect")
         self.append_text("Koneksi ditutup.")
 
-    def receive_loop(self):
-        try:
-            while self.connected and self.client:
-                try:
-                    data = self.client.recv(1024)
-                    if not data:
-                        break
-                    message = data.decode()
-                    log_message(message, "RECEIVED")
-                    self.root.after(0, lambda m=message: self.append_text(m))
-                except OSError:
-                    break
-                except Exception as e:
-                    self.root.after(0, lambda: self.append_text(f"Error receiving message: {e}"))
-                    break
-        finally:
-            self.root.after(0, self.disconnect)
+    def on_message(self, message):
+        log_message(message, "RECEIVED")
+        self.append_text(message)
+
+    def on_status(self, text):
+        log_message(text, "SYSTEM")
+        self.append_text(text)
+
+    def on_presence(self, users):
+        # Thread session: cukup simpan; banyak delta digabung jadi satu render
+        self._users = users
+
+    def _poll_presence(self):
+        users = self._users
+        if users is not self._users_shown:
+            self._users_shown = users
+            self.users_list.delete(0, tk.END)
+            for name in sorted(users, key=str.lower):
+                self.users_list.insert(tk.END, name)
+            self.users_label.configure(text=f"Online ({len(users)})")
+        self.root.after(250, self._poll_presence)
+
+    def start_direct_message(self):
+        selection = self.users_list.curselection()
+        if selection:
+            self.message_var.set(f"/msg {self.users_list.get(selection[0])} ")
+            self.message_entry.focus_set()
+            self.message_entry.icursor(tk.END)
 
     def send_message(self):
-        if not self.connected or not self.client:
+        if not self.connected or not self.session:
             messagebox.showwarning("Tidak Terhubung", "Silakan connect ke server terlebih dahulu.")
             return
         message = self.message_var.get().strip()
         if not message:
             return
-        try:
-            self.client.send(message.encode())
-            self.append_text(f"Pesan terkirim: {message}")
-            log_message(message, "SENT")
+        notice = handle_file_command(self.session, message)
+        if notice is not None:
+            self.append_text(notice)
             self.message_var.set("")
+            return
+        try:
+            result = self.session.send(message)
         except Exception as e:
             messagebox.showerror("Gagal Mengirim", str(e))
+            return
+        if result == SEND_OK:
+            self.append_text(f"Pesan terkirim: {message}")
+        elif result == SEND_QUEUED:
+            self.append_text(f"Offline, pesan dikirim setelah tersambung: {message}")
+        else:
+            messagebox.showwarning("Gagal Mengirim", "Antrean pesan offline penuh.")
+            return
+        log_message(message, "SENT")
+        self.message_var.set("")
+
+    def send_file(self):
+        if not self.connected or not self.session:
+            messagebox.showwarning("Tidak Terhubung", "Silakan connect ke server terlebih dahulu.")
+            return
+        path = filedialog.askopenfilename(title="Pilih file untuk dibagikan")
+        if path:
+            self.append_text(handle_file_command(self.session, f"/send {path}"))
 
     def show_history_popup(self):
-        log_file = os.path.join(LOG_DIR, f"client_chat_{datetime.datetime.now().strftime('%Y-%m-%d')}.txt")
-        if not os.path.exists(log_file):
+        chat_log.flush()
+        if not os.path.exists(chat_log.path_for(datetime.date.today())) and not history_store.days():
             messagebox.showinfo("Riwayat", "Belum ada riwayat chat hari ini.")
             return
-        try:
-            with open(log_file, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            last_lines = "".join(lines[-10:]) or "(Kosong)"
-            history_win = tk.Toplevel(self.root)
-            history_win.title("Riwayat Chat Hari Ini")
-            text = ScrolledText(history_win, width=80, height=20, state=tk.NORMAL)
-            text.pack(fill=tk.BOTH, expand=True)
-            text.insert(tk.END, last_lines)
-            text.configure(state=tk.DISABLED)
-        except Exception as e:
-            messagebox.showerror("Error", f"Error membaca file log: {e}")
+        HistoryWindow(self.root)
 
     def on_close(self):
         self.disconnect()
+        self.chat_view.close()
         self.root.destroy()
 
+class HistoryWindow:
+    """Popup riwayat dengan paging dan kotak pencarian"""
+
+    def __init__(self, root):
+        self.page = 0
+        self.query = ""
+        self.win = tk.Toplevel(root)
+        self.win.title("Riwayat Chat")
+
+        bar = ttk.Frame(self.win, padding=(8, 8, 8, 0))
+        bar.pack(fill=tk.X)
+        self.search_var = tk.StringVar()
+        entry = ttk.Entry(bar, textvariable=self.search_var)
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        entry.bind("<Return>", lambda _e: self.search())
+        ttk.Button(bar, text="Cari", command=self.search).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Button(bar, text="Hari Ini", command=self.reset).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Button(bar, text="< Lebih Lama", command=self.older).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Button(bar, text="Lebih Baru >", command=self.newer).pack(side=tk.LEFT, padx=(6, 0))
+
+        self.status = ttk.Label(self.win, padding=(8, 4))
+        self.status.pack(fill=tk.X)
+        self.text = ScrolledText(self.win, width=80, height=20, state=tk.DISABLED)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        self.render()
+
+    def render(self):
+        try:
+            if self.query:
+                # Hasil pencarian diurutkan dari yang terbaru
+                lines = list(reversed(history_store.search(self.query, HISTORY_PAGE_SIZE, self.page)))
+                title = f"Pencarian '{self.query}' - halaman {self.page + 1}"
+            else:
+                lines = history_store.page(self.page, HISTORY_PAGE_SIZE)
+                title = f"Hari ini - halaman {self.page + 1}"
+        except Exception as e:
+            messagebox.showerror("Error", f"Error membaca file log: {e}")
+            return
+        self.status.configure(text=title)
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "\n".join(lines) or "(Kosong)")
+        self.text.configure(state=tk.DISABLED)
+
+    def search(self):
+        chat_log.flush()
+        self.query = self.search_var.get().strip()
+        self.page = 0
+        self.render()
+
+    def reset(self):
+        self.search_var.set("")
+        self.search()
+
+    def older(self):
+        self.page += 1
+        self.render()
+
+    def newer(self):
+        if self.page > 0:
+            self.page -= 1
+            self.render()
+
 def gui_main():
-    if tk is None:
+    if not load_tk():
         print("Tkinter tidak tersedia. Menjalankan mode CLI.")
         cli_main()
         return
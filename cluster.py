@@ -0,0 +1,441 @@
+"""Mode multi-proses: N worker berbagi port, broadcast lewat bus lokal
+
+Proses induk (master) menjalankan hub pub/sub di Unix domain socket lalu
+menjalankan N proses worker. Setiap worker adalah server asyncio biasa
+(server.serve) yang membuka listening socket sendiri dengan SO_REUSEPORT,
+atau jika tidak tersedia, memakai socket yang di-bind master dan diwariskan
+ke worker. Kernel membagi koneksi baru ke semua worker.
+
+Pesan room dan pesan langsung dari worker dikirim ke hub, lalu hub
+meneruskan frame yang sama ke worker lain sehingga client di worker A
+menerima pesan dari client di worker B. Master juga mengirim permintaan
+(broadcast SERVER, statistik client, metrik) ke semua worker dan menjumlahkan
+balasannya, sehingga console dan GUI tetap bekerja seperti mode satu proses.
+
+Frame bus memakai format protocol.py dengan tipe:
+    BUS_HELLO   worker -> hub     [index worker 2 byte]
+    BUS_ROOM    worker -> worker  [panjang nama 2 byte][room][frame chat]
+    BUS_DIRECT  worker -> worker  [panjang nama 2 byte][nickname][frame chat]
+    BUS_REQUEST master -> worker  [id 4 byte][json]
+    BUS_REPLY   worker -> master  [id 4 byte][json]
+    BUS_LOG     worker -> master  [json [[level, teks], ...]] batch event untuk GUI
+    BUS_PRESENCE worker -> worker [index worker 2 byte][payload FRAME_PRESENCE]
+    BUS_GONE    hub -> worker     [index worker 2 byte] worker terputus dari bus
+
+Presence: saat tersambung ke bus worker mengirim snapshot daftar user
+lokalnya, lalu hanya delta. Worker yang menerima snapshot dari worker yang
+belum dikenalnya membalas dengan snapshot miliknya, sehingga worker yang
+di-restart mendapat daftar lengkap. Saat worker terputus hub mengirim
+BUS_GONE dan user worker itu dianggap offline.
+"""
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import tempfile
+
+from connection import ClientConnection, OVERFLOW_DROP_OLDEST
+from events import ERROR, WARNING
+from metrics import merge_snapshots
+from protocol import (FrameDecoder, HEADER, MAX_FRAME_SIZE, encode_frame, encode_presence,
+                      decode_presence)
+
+BUS_HELLO = 1
+BUS_ROOM = 2
+BUS_DIRECT = 3
+BUS_REQUEST = 4
+BUS_REPLY = 5
+BUS_LOG = 6
+BUS_PRESENCE = 7
+BUS_GONE = 8
+
+# Frame bus membawa frame chat utuh ditambah nama room/nickname
+BUS_MAX_FRAME = MAX_FRAME_SIZE + 512
+BUS_QUEUE_SIZE = 65536
+# Detik maksimal menunggu semua worker terhubung sebelum memberi sinyal siap
+READY_TIMEOUT = 30.0
+
+_REQ_ID = struct.Struct("!I")
+_INDEX = struct.Struct("!H")
+_KEY_LEN = struct.Struct("!H")
+
+
+def _keyed(key, frame):
+    """[panjang kunci 2 byte][kunci UTF-8][frame]; ValueError jika kunci terlalu panjang"""
+    raw = key.encode("utf-8")
+    if len(raw) > 0xFFFF:
+        raise ValueError(f"Kunci bus terlalu panjang ({len(raw)} byte)")
+    return _KEY_LEN.pack(len(raw)) + raw + frame
+
+
+def _split_keyed(payload):
+    (size,) = _KEY_LEN.unpack_from(payload)
+    start = _KEY_LEN.size
+    return str(payload[start:start + size], "utf-8"), bytes(payload[start + size:])
+
+
+def reuse_port_supported():
+    return hasattr(socket, "SO_REUSEPORT") and os.name == "posix"
+
+
+class BusHub:
+    """Hub pub/sub di proses master; meneruskan frame antar worker"""
+
+    def __init__(self, srv, path):
+        self.server = srv
+        self.path = path
+        self.peers = {}  # index worker -> ClientConnection
+        self._server = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._handle_peer, path=self.path)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        for peer in list(self.peers.values()):
+            peer.close()
+            await peer.wait_closed()
+        self.peers.clear()
+
+    async def _handle_peer(self, reader, writer):
+        peer = ClientConnection(writer, ("bus", 0), maxsize=BUS_QUEUE_SIZE,
+                                policy=OVERFLOW_DROP_OLDEST)
+        peer.start()
+        index = None
+        decoder = FrameDecoder(BUS_MAX_FRAME)
+        try:
+            while True:
+                chunk = await reader.read(256 * 1024)
+                if not chunk:
+                    break
+                decoder.feed(chunk)
+                for frame_type, payload in decoder.frames():
+                    if frame_type == BUS_HELLO:
+                        index = _INDEX.unpack_from(payload)[0]
+                        self.peers[index] = peer
+                    elif frame_type in (BUS_ROOM, BUS_DIRECT, BUS_PRESENCE):
+                        # Teruskan frame yang sama (encode sekali) ke worker lain
+                        frame = HEADER.pack(len(payload), frame_type) + payload
+                        for other_index, other in list(self.peers.items()):
+                            if other_index != index:
+                                other.send(frame)
+                    elif frame_type == BUS_REPLY:
+                        self._on_reply(payload)
+                    elif frame_type == BUS_LOG:
+                        source = f"w{index}"
+                        for level, text in json.loads(bytes(payload)):
+                            self.server.events.emit(level, text, source)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.server.log_event(f"[CLUSTER] Bus worker {index}: {e}", ERROR)
+        finally:
+            if index is not None and self.peers.get(index) is peer:
+                del self.peers[index]
+                # User worker ini tidak lagi online di worker lain
+                gone = encode_frame(_INDEX.pack(index), BUS_GONE)
+                for other in list(self.peers.values()):
+                    other.send(gone)
+            peer.close()
+            await peer.wait_closed()
+
+    def _on_reply(self, payload):
+        req_id = _REQ_ID.unpack_from(payload)[0]
+        pending = self._pending.get(req_id)
+        if pending is None:
+            return
+        future, results, expected = pending
+        results.append(json.loads(str(payload[_REQ_ID.size:], "utf-8")))
+        if len(results) >= expected and not future.done():
+            future.set_result(results)
+
+    async def request_all(self, body, timeout=3.0):
+        """Kirim permintaan ke semua worker dan kumpulkan balasannya"""
+        peers = list(self.peers.values())
+        if not peers:
+            return []
+        req_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        results = []
+        self._pending[req_id] = (future, results, len(peers))
+        frame = encode_frame(_REQ_ID.pack(req_id) + json.dumps(body).encode("utf-8"),
+                             BUS_REQUEST, BUS_MAX_FRAME)
+        for peer in peers:
+            peer.send(frame)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # Kembalikan balasan yang sempat masuk
+            return list(results)
+        finally:
+            self._pending.pop(req_id, None)
+
+
+class ClusterMaster:
+    """Dipakai server.py di proses master untuk broadcast dan statistik"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    async def broadcast(self, message):
+        replies = await self.hub.request_all({"op": "broadcast", "message": message})
+        return sum(reply.get("delivered", 0) for reply in replies)
+
+    async def stats(self):
+        replies = await self.hub.request_all({"op": "stats"})
+        stats = []
+        for reply in replies:
+            stats.extend(reply.get("clients", []))
+        return stats
+
+    async def metrics(self):
+        replies = await self.hub.request_all({"op": "metrics"})
+        return merge_snapshots(reply.get("metrics", {}) for reply in replies)
+
+
+class WorkerBus:
+    """Koneksi worker ke hub; dipasang sebagai server.cluster_bus"""
+
+    def __init__(self, srv, index, path, forward_logs=False):
+        self.server = srv
+        self.index = index
+        self.path = path
+        self.forward_logs = forward_logs
+        self._peer = None
+        self._task = None
+        self._loop = None
+
+    async def connect(self):
+        self._loop = asyncio.get_running_loop()
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        self._peer = ClientConnection(writer, ("bus", self.index), maxsize=BUS_QUEUE_SIZE,
+                                      policy=OVERFLOW_DROP_OLDEST)
+        self._peer.start()
+        self._peer.send(encode_frame(_INDEX.pack(self.index), BUS_HELLO))
+        self.publish_presence(sorted(self.server.presence.published), (), snapshot=True)
+        self._task = asyncio.get_running_loop().create_task(self._read_loop(reader))
+
+    def _publish(self, frame_type, payload):
+        if self._peer is not None:
+            self._peer.send(encode_frame(payload, frame_type, BUS_MAX_FRAME))
+
+    def publish_room(self, room, frame):
+        """Teruskan frame chat room ke worker lain"""
+        self._publish(BUS_ROOM, _keyed(room, frame))
+
+    def publish_direct(self, nickname, frame):
+        """Teruskan pesan langsung; worker yang memiliki nickname mengirimkannya"""
+        self._publish(BUS_DIRECT, _keyed(nickname, frame))
+
+    def publish_presence(self, added, removed, snapshot=False):
+        """Perubahan daftar user lokal worker ini ke worker lain"""
+        decoder = FrameDecoder()
+        decoder.feed(encode_presence(added, removed, snapshot))
+        for _frame_type, payload in decoder.frames():
+            self._publish(BUS_PRESENCE, _INDEX.pack(self.index) + bytes(payload))
+
+    def _on_presence(self, payload):
+        presence = self.server.presence
+        source = _INDEX.unpack_from(payload)[0]
+        snapshot, added, removed = decode_presence(payload[_INDEX.size:])
+        if not snapshot:
+            presence.update_remote(source, added, removed)
+            return
+        known = source in presence.remote
+        presence.set_remote(source, added)
+        if not known:
+            # Worker baru (atau restart): kirim daftar kita sekali
+            self.publish_presence(sorted(presence.published), (), snapshot=True)
+
+    def forward_events(self, batch):
+        """Sink event: kirim batch event ke master (untuk GUI) dalam beberapa frame.
+
+        Dipanggil dari thread dispatcher event, jadi frame dimasukkan lewat
+        event loop worker.
+        """
+        if self._loop is None:
+            return
+        chunk, size = [], 0
+        chunks = [chunk]
+        for event in batch:
+            text = event.text[:MAX_FRAME_SIZE // 2]
+            if size + len(text) > MAX_FRAME_SIZE // 2 and chunk:
+                chunk, size = [], 0
+                chunks.append(chunk)
+            chunk.append((event.level, text))
+            size += len(text) + 8
+        for items in chunks:
+            payload = json.dumps(items).encode("utf-8", "replace")
+            self._loop.call_soon_threadsafe(self._publish, BUS_LOG, payload)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._peer is not None:
+            self._peer.close()
+            await self._peer.wait_closed()
+
+    async def _read_loop(self, reader):
+        server = self.server
+        decoder = FrameDecoder(BUS_MAX_FRAME)
+        try:
+            while True:
+                chunk = await reader.read(256 * 1024)
+                if not chunk:
+                    break
+                decoder.feed(chunk)
+                for frame_type, payload in decoder.frames():
+                    if frame_type == BUS_ROOM:
+                        room, frame = _split_keyed(payload)
+                        server.deliver_room(room, frame)
+                    elif frame_type == BUS_DIRECT:
+                        nickname, frame = _split_keyed(payload)
+                        target = server.client_registry.find(nickname)
+                        if target is not None and not target.send_compressible(frame):
+                            server.drop_client(target)
+                    elif frame_type == BUS_REQUEST:
+                        self._on_request(payload)
+                    elif frame_type == BUS_PRESENCE:
+                        self._on_presence(payload)
+                    elif frame_type == BUS_GONE:
+                        server.presence.drop_remote(_INDEX.unpack_from(payload)[0])
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            self.server.log_event(f"[CLUSTER] Worker {self.index} bus error: {e}", ERROR)
+        # Master hilang: worker ikut berhenti
+        server.shutdown_server()
+
+    def _on_request(self, payload):
+        server = self.server
+        req_id = payload[:_REQ_ID.size].tobytes()
+        body = json.loads(str(payload[_REQ_ID.size:], "utf-8"))
+        if body.get("op") == "broadcast":
+            result = {"delivered": server._broadcast_server_message(body.get("message", ""))}
+        elif body.get("op") == "stats":
+            clients = server._collect_client_stats()
+            for st in clients:
+                st["worker"] = self.index
+            result = {"clients": clients}
+        elif body.get("op") == "metrics":
+            result = {"metrics": server.metrics.snapshot()}
+        else:
+            result = {}
+        self._publish(BUS_REPLY, req_id + json.dumps(result).encode("utf-8"))
+
+
+def _worker_main(index, bus_path, listen_sock, forward_logs):
+    """Entry point proses worker"""
+    import server
+    server.WORKERS = 1
+    bus = WorkerBus(server, index, bus_path, forward_logs)
+    server.cluster_bus = bus
+    server.start_server(sock=listen_sock, reuse_port=listen_sock is None, console=False)
+
+
+def _bind_listener(server):
+    """Listening socket yang diwariskan ke worker jika SO_REUSEPORT tidak ada"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((server.HOST, server.PORT))
+    sock.listen(server.LISTEN_BACKLOG)
+    sock.setblocking(False)
+    return sock
+
+
+def _spawn_worker(ctx, index, bus_path, listen_sock, forward_logs):
+    proc = ctx.Process(target=_worker_main, name=f"chat-worker-{index}",
+                       args=(index, bus_path, listen_sock, forward_logs), daemon=True)
+    proc.start()
+    return proc
+
+
+async def _wait_exit(proc):
+    """Tunggu proses worker berhenti tanpa memblokir event loop"""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    loop.add_reader(proc.sentinel, lambda: done.done() or done.set_result(None))
+    try:
+        await done
+    finally:
+        loop.remove_reader(proc.sentinel)
+
+
+async def serve_master(server, workers):
+    """Coroutine utama proses master; berhenti ketika task-nya dibatalkan.
+
+    server adalah modul server.py yang sedang berjalan (bisa __main__).
+    """
+    if os.name != "posix":
+        server.log_event("[CLUSTER] Mode multi-proses butuh Unix domain socket; memakai 1 proses",
+                         WARNING)
+        await server.serve()
+        return
+
+    bus_dir = tempfile.mkdtemp(prefix="chatbox-bus-")
+    hub = BusHub(server, os.path.join(bus_dir, "bus.sock"))
+    await hub.start()
+    server.cluster_master = ClusterMaster(hub)
+    metrics_http = await server.start_metrics_http()
+
+    listen_sock = None if reuse_port_supported() else _bind_listener(server)
+    forward_logs = server.gui_attached
+    ctx = multiprocessing.get_context("spawn")
+    loop = asyncio.get_running_loop()
+    procs = {}
+    monitors = {}
+
+    def start_worker(index):
+        procs[index] = _spawn_worker(ctx, index, hub.path, listen_sock, forward_logs)
+        monitors[index] = asyncio.ensure_future(_wait_exit(procs[index]))
+
+    for index in range(workers):
+        start_worker(index)
+    server.server_running = True
+    server.log_event(f"[CLUSTER] {workers} worker berjalan di {server.HOST}:{server.PORT} ...")
+    try:
+        # Worker terhubung ke bus setelah listening socket-nya siap
+        deadline = loop.time() + READY_TIMEOUT
+        while len(hub.peers) < workers and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        server.notify_ready()
+        while True:
+            # Jalankan ulang worker yang mati
+            done, _pending = await asyncio.wait(list(monitors.values()),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+            for index, monitor in list(monitors.items()):
+                if monitor in done:
+                    code = procs[index].exitcode
+                    server.log_event(f"[CLUSTER] Worker {index} berhenti (exit {code}), dijalankan ulang")
+                    # Jeda agar worker yang langsung gagal tidak berputar terus
+                    await asyncio.sleep(1.0)
+                    start_worker(index)
+    finally:
+        server.server_running = False
+        server.notify_stopping()
+        server.cluster_master = None
+        if metrics_http is not None:
+            metrics_http.close()
+        for monitor in monitors.values():
+            monitor.cancel()
+        # SIGTERM ke worker: masing-masing mematikan server-nya dengan rapi
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in procs.values():
+            await loop.run_in_executor(None, proc.join, server.DRAIN_TIMEOUT + 5.0)
+            if proc.is_alive():
+                proc.kill()
+        await hub.close()
+        if listen_sock is not None:
+            listen_sock.close()
+        shutil.rmtree(bus_dir, ignore_errors=True)
+        server.log_event("[SHUTDOWN COMPLETE] Cluster berhasil dimatikan")
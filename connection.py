@@ -0,0 +1,255 @@
+"""Koneksi client di sisi server dengan antrean keluar (outbound) terbatas
+
+Broadcast tidak pernah menulis langsung ke socket. Frame dimasukkan ke antrean
+milik masing-masing client, lalu task writer per client yang mengirimnya dan
+menunggu drain(). Client yang lambat hanya menahan antreannya sendiri.
+
+Frame yang masuk antrean adalah objek bytes yang sama untuk semua penerima
+(di-encode sekali oleh pengirim broadcast; versi terkompresinya juga dibuat
+sekali untuk semua client yang menegosiasikan kompresi). Saat traffic padat, writer
+menggabungkan beberapa frame yang tertunda ke satu writelines() sehingga
+satu syscall mengirim banyak pesan.
+
+Isi file (send_file) punya prioritas lebih rendah dari antrean frame: writer
+hanya mengirim satu potongan FRAME_CHUNK dengan loop.sendfile() saat
+antrean kosong, jadi pesan chat paling lama menunggu satu potongan.
+"""
+import asyncio
+import collections
+import os
+import time
+
+from protocol import compress_frames, chunk_header
+
+# Kebijakan saat antrean penuh
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DISCONNECT)
+
+# Konfigurasi default dari environment
+OUTBOUND_QUEUE_SIZE = int(os.environ.get('OUTBOUND_QUEUE_SIZE', '1024'))
+OVERFLOW_POLICY = os.environ.get('OVERFLOW_POLICY', OVERFLOW_DROP_OLDEST)
+if OVERFLOW_POLICY not in OVERFLOW_POLICIES:
+    OVERFLOW_POLICY = OVERFLOW_DROP_OLDEST
+
+# Batas byte yang digabung dalam satu panggilan write
+MAX_BATCH_BYTES = int(os.environ.get('MAX_BATCH_BYTES', str(256 * 1024)))
+
+
+class ClientConnection:
+    """Satu client yang terhubung beserta antrean dan task writer-nya"""
+
+    __slots__ = ("id", "writer", "addr", "nickname", "joined_at", "bytes_in",
+                 "bytes_out", "room", "rooms", "queue", "maxsize", "policy", "closed",
+                 "frames_sent", "frames_dropped", "max_depth", "write_calls",
+                 "throttled", "compress", "heartbeat", "presence", "last_seen", "ping_sent",
+                 "reader", "decoder", "handed_off", "hold", "parked", "uploads", "downloads",
+                 "_wakeup", "_writer_task")
+
+    def __init__(self, writer, addr, maxsize=None, policy=None):
+        self.id = None  # diisi oleh ClientRegistry.add()
+        self.writer = writer
+        self.addr = addr
+        self.nickname = addr[0] if addr else "?"
+        self.joined_at = time.time()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.room = None      # room aktif untuk pesan biasa
+        self.rooms = set()    # semua room yang diikuti
+        self.queue = collections.deque()
+        self.maxsize = maxsize or OUTBOUND_QUEUE_SIZE
+        self.policy = policy or OVERFLOW_POLICY
+        self.closed = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.max_depth = 0
+        self.write_calls = 0
+        self.throttled = 0    # pesan/bacaan yang kena batas laju masuk
+        self.compress = False # client meminta FRAME_COMPRESSED (FRAME_HELLO)
+        self.heartbeat = False  # client berjanji membalas FRAME_PING
+        self.presence = False   # client berlangganan FRAME_PRESENCE
+        self.last_seen = time.monotonic()  # terakhir ada data dari client
+        self.ping_sent = 0.0    # waktu PING yang belum dibalas, 0 jika tidak ada
+        # StreamReader dan FrameDecoder client; dibaca handoff.py untuk byte
+        # masuk yang belum diproses
+        self.reader = None
+        self.decoder = None
+        self.handed_off = False  # socket sudah diserahkan ke proses baru
+        # Future dari handoff.py: handler berhenti di batas frame berikutnya
+        self.hold = None
+        # True saat handler menunggu data atau hold, tidak di tengah frame
+        self.parked = False
+        self.uploads = {}        # id file -> files.Upload yang sedang diterima
+        # Download antre (prioritas rendah): [id, file, offset, akhir, ukuran potongan, trailer]
+        self.downloads = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._writer_task = None
+
+    def start(self):
+        """Mulai task writer; harus dipanggil dari event loop"""
+        self._writer_task = asyncio.get_running_loop().create_task(self._writer_loop())
+
+    def send(self, frame):
+        """Masukkan frame ke antrean tanpa blocking.
+
+        Mengembalikan False jika koneksi sudah/ baru saja ditutup karena
+        kebijakan overflow, True jika frame diterima antrean.
+        """
+        if self.closed:
+            return False
+        if len(self.queue) >= self.maxsize:
+            if self.policy == OVERFLOW_DISCONNECT:
+                # Konsumen lambat: putuskan daripada menahan memori
+                self.close()
+                return False
+            self.queue.popleft()
+            self.frames_dropped += 1
+        self.queue.append(frame)
+        depth = len(self.queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self._wakeup.set()
+        return True
+
+    def send_compressible(self, data):
+        """send() untuk data khusus satu client; dikompres jika dinegosiasikan"""
+        if self.compress:
+            packed = compress_frames(data)
+            if packed is not None:
+                return self.send(packed)
+        return self.send(data)
+
+    def send_file(self, file_id, file, offset, end, chunk_size, trailer=b""):
+        """Antre isi file[offset:end] sebagai FRAME_CHUNK, lalu frame trailer.
+
+        file (biner) ditutup writer setelah selesai atau saat koneksi ditutup.
+        """
+        if self.closed:
+            file.close()
+            return False
+        self.downloads.append([file_id, file, offset, end, chunk_size, trailer])
+        self._wakeup.set()
+        return True
+
+    def cancel_file(self, file_id):
+        """Hentikan download file_id; potongan yang sedang dikirim tetap selesai"""
+        for job in self.downloads:
+            if job[0] == file_id:
+                # Writer menutup file saat giliran job ini
+                job[3] = job[2]
+                job[5] = b""
+
+    async def _send_file_chunk(self):
+        """Kirim satu potongan download terdepan (os.sendfile bila tersedia)"""
+        writer = self.writer
+        job = self.downloads[0]
+        file_id, file, offset, end, chunk_size, trailer = job
+        size = min(chunk_size, end - offset)
+        if size <= 0:
+            self.downloads.popleft()
+            file.close()
+            if trailer:
+                writer.write(trailer)
+                self.bytes_out += len(trailer)
+            return
+        header = chunk_header(file_id, offset, size)
+        writer.write(header)
+        # sendfile menunggu buffer transport kosong lalu menyalin dari page
+        # cache langsung ke socket; tanpa sendfile dibaca per potongan
+        await asyncio.get_running_loop().sendfile(writer.transport, file, offset, size)
+        job[2] = offset + size
+        self.frames_sent += 1
+        self.bytes_out += len(header) + size
+        self.write_calls += 1
+        await writer.drain()
+
+    async def _writer_loop(self):
+        queue = self.queue
+        writer = self.writer
+        try:
+            while not self.closed:
+                if not queue:
+                    if self.downloads:
+                        await self._send_file_chunk()
+                        continue
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                # Ambil semua frame yang tertunda (dibatasi MAX_BATCH_BYTES)
+                frame = queue.popleft()
+                if not queue:
+                    writer.write(frame)
+                    self.frames_sent += 1
+                    self.bytes_out += len(frame)
+                else:
+                    batch = [frame]
+                    size = len(frame)
+                    while queue and size < MAX_BATCH_BYTES:
+                        frame = queue.popleft()
+                        batch.append(frame)
+                        size += len(frame)
+                    writer.writelines(batch)
+                    self.frames_sent += len(batch)
+                    self.bytes_out += size
+                self.write_calls += 1
+                # Hanya task ini yang menunggu jika client lambat
+                await writer.drain()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Koneksi putus saat menulis; reader akan melihat EOF
+            self.close()
+
+    def queue_depth(self):
+        return len(self.queue)
+
+    def drained(self):
+        """True jika antrean, download dan buffer transport sudah kosong (terkirim ke kernel)"""
+        if self.queue or self.downloads:
+            return False
+        try:
+            return self.writer.transport.get_write_buffer_size() == 0
+        except Exception:
+            return True
+
+    def stats(self):
+        """Metadata dan metrik antrean untuk ditampilkan di console/GUI"""
+        return {
+            "id": self.id,
+            "addr": self.addr,
+            "nickname": self.nickname,
+            "joined_at": self.joined_at,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "room": self.room,
+            "rooms": sorted(self.rooms),
+            "queue_depth": len(self.queue),
+            "max_depth": self.max_depth,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "write_calls": self.write_calls,
+            "throttled": self.throttled,
+            "compress": self.compress,
+            "write_buffer": self.writer.transport.get_write_buffer_size()
+            if self.writer.transport else 0,
+        }
+
+    def close(self):
+        """Tutup koneksi; aman dipanggil berkali-kali"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if self._writer_task is not None and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+        while self.downloads:
+            self.downloads.popleft()[1].close()
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    async def wait_closed(self):
+        """Tunggu task writer selesai setelah close()"""
+        if self._writer_task is not None:
+            await asyncio.gather(self._writer_task, return_exceptions=True)
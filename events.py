@@ -0,0 +1,207 @@
+"""Event bus berlevel dengan ring buffer terbatas dan sink yang membaca batch
+
+Pengganti pasangan print() + log_queue di server.py. emit() hanya menambah
+Event ke deque berukuran tetap (EVENT_BUFFER); satu thread dispatcher
+mengambil semua event tertunda setiap EVENT_FLUSH_INTERVAL detik dan
+menyerahkannya sebagai satu list ke setiap sink (console, GUI, file, bus
+cluster). Tidak ada lock di jalur emit.
+
+Biaya saat tidak ada pembaca:
+    - Event di bawah level sink terendah ditolak dengan satu perbandingan;
+      tanpa sink sama sekali semua event ditolak. Pemanggil di hot path
+      cukup memeriksa enabled(level) sebelum memformat teks.
+    - Saat buffer terisi lebih dari setengah (sink tertinggal), event di
+      bawah WARNING hanya disimpan satu dari setiap EVENT_SAMPLE; sisanya
+      dihitung sebagai dropped. Jika buffer tetap penuh, event terlama
+      tertimpa. Dispatcher melaporkan jumlah yang dibuang sebagai WARNING.
+
+Konfigurasi lewat environment:
+    EVENT_LEVEL           level console: DEBUG, INFO (default), WARNING, ERROR, OFF
+    EVENT_FILE            path file event opsional (level yang sama dengan console)
+    EVENT_BUFFER          ukuran ring buffer (default 10000)
+    EVENT_SAMPLE          sampling event kecil saat tertekan, 1 dari N (default 10)
+    EVENT_FLUSH_INTERVAL  detik antar batch ke sink (default 0.1)
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR, "OFF": OFF}
+
+
+def parse_level(name, default=INFO):
+    return LEVELS.get(str(name).upper(), default)
+
+
+EVENT_LEVEL = parse_level(os.environ.get('EVENT_LEVEL', 'INFO'))
+EVENT_FILE = os.environ.get('EVENT_FILE', '')
+EVENT_BUFFER = int(os.environ.get('EVENT_BUFFER', '10000'))
+EVENT_SAMPLE = max(1, int(os.environ.get('EVENT_SAMPLE', '10')))
+EVENT_FLUSH_INTERVAL = float(os.environ.get('EVENT_FLUSH_INTERVAL', '0.1'))
+
+# source None = event proses ini; selain itu asal event (mis. "w0" worker 0)
+Event = collections.namedtuple("Event", "ts level text source")
+
+
+class _Sink:
+    __slots__ = ("func", "level", "local_only")
+
+    def __init__(self, func, level, local_only):
+        self.func = func
+        self.level = level
+        self.local_only = local_only
+
+
+class EventBus:
+    """Ring buffer event + dispatcher batch ke sink"""
+
+    def __init__(self, size=None, sample=None, flush_interval=None):
+        size = size or EVENT_BUFFER
+        self.buffer = collections.deque(maxlen=size)
+        self.high_water = size // 2
+        self.sample = sample or EVENT_SAMPLE
+        self.flush_interval = EVENT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        # Level terendah yang dibaca sink mana pun; OFF jika tidak ada sink
+        self.min_level = OFF
+        self.emitted = 0
+        self.dropped = 0
+        self._reported = 0
+        self._skip = 0
+        self._sinks = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enabled(self, level):
+        return level >= self.min_level
+
+    def emit(self, level, text, source=None):
+        """Catat satu event; tidak pernah blocking"""
+        if level < self.min_level:
+            return
+        buffer = self.buffer
+        if level < WARNING and len(buffer) >= self.high_water:
+            # Sink tertinggal: simpan hanya sebagian event kecil
+            self._skip += 1
+            if self._skip < self.sample:
+                self.dropped += 1
+                return
+            self._skip = 0
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        buffer.append(Event(time.time(), level, text, source))
+        self.emitted += 1
+
+    def debug(self, text):
+        self.emit(DEBUG, text)
+
+    def info(self, text):
+        self.emit(INFO, text)
+
+    def warning(self, text):
+        self.emit(WARNING, text)
+
+    def error(self, text):
+        self.emit(ERROR, text)
+
+    def add_sink(self, func, level=INFO, local_only=False):
+        """Daftarkan func(list Event); local_only melewatkan event dari worker"""
+        with self._lock:
+            self._sinks.append(_Sink(func, level, local_only))
+            self.min_level = min(s.level for s in self._sinks)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="events", daemon=True)
+                self._thread.start()
+        return func
+
+    def remove_sink(self, func):
+        with self._lock:
+            self._sinks = [s for s in self._sinks if s.func is not func]
+            self.min_level = min((s.level for s in self._sinks), default=OFF)
+
+    def has_sink(self, func):
+        return any(s.func is func for s in self._sinks)
+
+    def flush(self):
+        """Kirim semua event tertunda ke sink sekarang (dipanggil saat shutdown)"""
+        with self._lock:
+            self._dispatch()
+
+    def stats(self):
+        return {"pending": len(self.buffer), "emitted": self.emitted, "dropped": self.dropped}
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                self._dispatch()
+
+    def _dispatch(self):
+        buffer = self.buffer
+        batch = []
+        try:
+            while True:
+                batch.append(buffer.popleft())
+        except IndexError:
+            pass
+        dropped = self.dropped
+        if dropped > self._reported:
+            batch.append(Event(time.time(), WARNING,
+                               f"[EVENTS] {dropped - self._reported} event dibuang karena sink tertinggal",
+                               None))
+            self._reported = dropped
+        if not batch:
+            return
+        for sink in self._sinks:
+            events = [e for e in batch if e.level >= sink.level
+                      and not (sink.local_only and e.source is not None)]
+            if not events:
+                continue
+            try:
+                sink.func(events)
+            except Exception:
+                # Sink rusak (mis. widget GUI sudah ditutup) tidak boleh menghentikan bus
+                pass
+
+
+def format_event(event):
+    if event.source is not None:
+        return f"[{event.source}] {event.text}"
+    return event.text
+
+
+def console_sink(stream=None):
+    """Sink yang menulis satu batch ke stdout dengan satu write"""
+
+    def write(events):
+        out = stream or sys.stdout
+        out.write("\n".join(format_event(e) for e in events) + "\n")
+        out.flush()
+
+    return write
+
+
+class FileSink:
+    """Sink file teks dengan timestamp; file dibuka sekali dalam mode append"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, events):
+        lines = []
+        for e in events:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e.ts))
+            level = next((name for name, value in LEVELS.items() if value == e.level), "INFO")
+            lines.append(f"{stamp} {level} {format_event(e)}\n")
+        self.file.write("".join(lines))
+        self.file.flush()
@@ -0,0 +1,143 @@
+"""Penyimpanan file yang dibagikan antar client lewat server
+
+Upload ditulis bertahap ke "<dir>/<id>.part" (potongan FRAME_CHUNK, ditulis
+di thread executor agar event loop tidak menunggu disk). Ukuran file .part
+adalah offset lanjutan, jadi upload yang terputus diteruskan dari byte
+terakhir yang tersimpan, juga setelah server restart. Setelah lengkap file
+di-rename ke "<dir>/<id>" dan bisa diunduh dengan /get <id>.
+
+Download tidak dibaca ke memori: ClientConnection.send_file() mengirimnya
+per potongan dengan loop.sendfile() (os.sendfile) dan hanya saat antrean
+pesan chat kosong, sehingga file besar tidak menambah latensi chat.
+
+Metadata (nama, ukuran, pengirim, token) disimpan di "<dir>/<id>.json". Di
+mode cluster semua worker memakai direktori yang sama. Token acak hanya
+dikirim ke pengupload (op=ready) dan wajib disertakan untuk melanjutkan
+upload, jadi id file saja tidak cukup untuk menulis ke upload orang lain.
+
+Konfigurasi lewat environment:
+    FILE_DIR         direktori penyimpanan (default chat_files)
+    FILE_MAX_SIZE    ukuran maksimal satu file dalam byte (default 1 GiB)
+    FILE_CHUNK_SIZE  byte data per FRAME_CHUNK (default 32 KiB)
+
+Laju upload per client dibatasi FILE_RATE_BYTES (ratelimit.py).
+"""
+import json
+import os
+import secrets
+import time
+
+from protocol import MAX_FRAME_SIZE, CHUNK_HEADER
+
+FILE_DIR = os.environ.get('FILE_DIR', 'chat_files')
+FILE_MAX_SIZE = int(os.environ.get('FILE_MAX_SIZE', str(1024 ** 3)))
+FILE_CHUNK_SIZE = min(int(os.environ.get('FILE_CHUNK_SIZE', str(32 * 1024))),
+                      MAX_FRAME_SIZE - CHUNK_HEADER.size)
+
+# Panjang maksimal nama file yang disimpan di metadata
+MAX_NAME = 200
+
+
+def safe_name(name):
+    """Nama file tanpa direktori dan karakter kontrol"""
+    name = os.path.basename(str(name).replace("\\", "/")).strip()
+    name = "".join(ch for ch in name if ch.isprintable())
+    return name[:MAX_NAME] or "file"
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class Upload:
+    """Upload yang sedang berjalan di satu koneksi"""
+
+    __slots__ = ("id", "name", "size", "received", "file")
+
+    def __init__(self, file_id, name, size, received, file):
+        self.id = file_id
+        self.name = name
+        self.size = size
+        self.received = received
+        self.file = file
+
+
+class FileStore:
+    """File di FILE_DIR beserta metadata JSON-nya"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or FILE_DIR
+
+    def _path(self, file_id, suffix=""):
+        return os.path.join(self.directory, f"{file_id:08x}{suffix}")
+
+    def create(self, name, size, owner):
+        """Metadata upload baru; mengembalikan (id file, token lanjutan)"""
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            file_id = secrets.randbits(32)
+            if file_id and not os.path.exists(self._path(file_id, ".json")):
+                break
+        token = secrets.token_hex(16)
+        meta = {"id": file_id, "name": safe_name(name), "size": size, "owner": owner,
+                "token": token, "created": time.time(), "complete": False}
+        self._write_meta(meta)
+        return file_id, token
+
+    def meta(self, file_id):
+        """Metadata file, atau None jika tidak ada"""
+        try:
+            with open(self._path(file_id, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta):
+        path = self._path(meta["id"], ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def open_upload(self, file_id):
+        """Buka file .part untuk melanjutkan upload; Upload atau None"""
+        meta = self.meta(file_id)
+        if meta is None or meta["complete"]:
+            return None
+        # Tanpa buffer: ukuran file selalu sama dengan byte yang sudah diterima
+        f = open(self._path(file_id, ".part"), "ab", buffering=0)
+        # Byte yang sudah tersimpan = offset lanjutan
+        received = min(f.seek(0, os.SEEK_END), meta["size"])
+        return Upload(file_id, meta["name"], meta["size"], received, f)
+
+    def finish_upload(self, upload):
+        """Tutup dan tandai upload lengkap"""
+        upload.file.close()
+        os.replace(self._path(upload.id, ".part"), self._path(upload.id))
+        meta = self.meta(upload.id)
+        meta["complete"] = True
+        self._write_meta(meta)
+
+    def check_token(self, file_id, token):
+        """True jika token cocok dengan token upload file_id"""
+        meta = self.meta(file_id)
+        return meta is not None and secrets.compare_digest(meta.get("token", ""), token or "")
+
+    def open_download(self, file_id):
+        """(metadata, file biner) untuk file lengkap, atau (None, None)"""
+        meta = self.meta(file_id)
+        if meta is None or not meta["complete"]:
+            return None, None
+        try:
+            return meta, open(self._path(file_id), "rb")
+        except OSError:
+            return None, None
+
+
+def write_chunk(upload, data):
+    """Tulis potongan di akhir file .part (dipanggil di thread executor)"""
+    view = memoryview(data)
+    while view:
+        view = view[upload.file.write(view):]
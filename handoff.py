@@ -0,0 +1,408 @@
+"""Restart tanpa downtime: serah terima listening socket dan koneksi client
+
+Proses lama (HANDOFF_SOCKET diset) mendengarkan di Unix domain socket
+SOCK_SEQPACKET. Proses baru yang dijalankan dengan HANDOFF_TAKEOVER=1
+(chatd.py --takeover) menyambung ke socket itu, lalu proses lama:
+
+    1. mengirim listening socket (SCM_RIGHTS) dan berhenti accept; koneksi
+       baru menunggu di backlog kernel sampai proses baru accept, sedangkan
+       koneksi yang sudah di-accept ditunggu sampai terdaftar
+    2. berhenti membaca semua client, menunggu handler setiap client berhenti
+       di batas frame (frame yang sedang diproses, mis. tertahan rate limit
+       atau menulis potongan upload, diselesaikan dulu) dan antrean keluarnya
+       terkirim
+    3. mengirim riwayat replay room agar /resume dan nomor urut berlanjut,
+       serta daftar presence yang sudah dimiliki subscriber
+    4. mengirim fd setiap client beserta statusnya (nickname, room, opsi
+       HELLO, byte masuk yang belum diproses) dalam batch
+    5. setelah proses baru membalas "ok", menutup salinan fd-nya tanpa
+       notifikasi keluar lalu berhenti
+
+Client tidak melihat apa pun: koneksi TCP yang sama dilayani proses baru.
+Jika serah terima gagal sebelum "ok", proses lama melanjutkan melayani
+client-nya dan membuka lagi listening socket.
+
+Setiap pesan channel adalah header JSON (dengan fd sebagai ancillary data)
+diikuti potongan blob biner sebanyak header["blob"] byte, sehingga ukuran
+pesan tidak dibatasi buffer SOCK_SEQPACKET.
+
+Hanya mode satu proses (WORKERS=1) di Linux.
+
+Konfigurasi lewat environment:
+    HANDOFF_SOCKET    path Unix socket serah terima (kosong = mati)
+    HANDOFF_TAKEOVER  1 = ambil alih dari proses yang mendengarkan di HANDOFF_SOCKET
+"""
+import asyncio
+import base64
+import json
+import os
+import socket
+
+from rooms import DEFAULT_ROOM
+from events import WARNING, ERROR
+
+HANDOFF_SOCKET = os.environ.get('HANDOFF_SOCKET', '')
+HANDOFF_TAKEOVER = os.environ.get('HANDOFF_TAKEOVER', '') == '1'
+
+# Batas per pesan channel: jumlah fd (SCM_MAX_FD Linux 253) dan ukuran potongan
+CLIENT_BATCH = 200
+CHUNK_SIZE = 32 * 1024
+HEADER_MAX = 1024 * 1024
+
+
+def supported():
+    return hasattr(socket, "SOCK_SEQPACKET") and hasattr(socket, "send_fds")
+
+
+def _send(chan, header, fds=(), blob=b""):
+    """Kirim header JSON (dengan fd) lalu blob dalam potongan; blocking"""
+    header = dict(header, blob=len(blob))
+    socket.send_fds(chan, [json.dumps(header).encode("utf-8")], list(fds))
+    view = memoryview(blob)
+    for start in range(0, len(blob), CHUNK_SIZE):
+        chan.sendall(view[start:start + CHUNK_SIZE])
+
+
+def _recv(chan):
+    """Terima satu pesan: (header, fds, blob); blocking"""
+    data, fds, _flags, _addr = socket.recv_fds(chan, HEADER_MAX, CLIENT_BATCH)
+    if not data:
+        for fd in fds:
+            os.close(fd)
+        raise ConnectionError("Channel handoff ditutup")
+    header = json.loads(data)
+    size = header.get("blob", 0)
+    parts = []
+    while size > 0:
+        chunk = chan.recv(CHUNK_SIZE)
+        if not chunk:
+            raise ConnectionError("Channel handoff ditutup di tengah blob")
+        parts.append(chunk)
+        size -= len(chunk)
+    return header, fds, b"".join(parts)
+
+
+async def _call(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def client_state(conn):
+    """Status client yang perlu dibawa ke proses baru (tanpa byte pending)"""
+    return {
+        "nickname": conn.nickname,
+        "joined_at": conn.joined_at,
+        "room": conn.room,
+        "rooms": sorted(conn.rooms),
+        "compress": conn.compress,
+        "heartbeat": conn.heartbeat,
+        "presence": conn.presence,
+        "uploads": [f"{file_id:08x}" for file_id in conn.uploads],
+        "bytes_in": conn.bytes_in,
+        "bytes_out": conn.bytes_out,
+        "frames_sent": conn.frames_sent,
+        "throttled": conn.throttled,
+    }
+
+
+def restore_client(srv, conn, state):
+    """Daftarkan conn di proses baru dengan status dari proses lama, tanpa broadcast"""
+    srv.client_registry.add(conn)
+    # Pending input baru diproses setelah semua client terdaftar (take_over)
+    conn.hold = state.get("hold")
+    nickname = state.get("nickname")
+    if nickname and nickname != conn.nickname:
+        srv.client_registry.set_nickname(conn, nickname)
+    srv.presence.connect(conn.nickname)
+    if state.get("presence"):
+        # Subscriber sudah punya daftar dari proses lama (pesan "presence")
+        conn.presence = True
+        srv.presence.subscribe(conn)
+    for room in state.get("rooms") or [DEFAULT_ROOM]:
+        srv.room_index.join(room, conn)
+    conn.room = state.get("room") or DEFAULT_ROOM
+    if conn.room not in conn.rooms:
+        srv.room_index.join(conn.room, conn)
+    conn.compress = bool(state.get("compress"))
+    conn.heartbeat = bool(state.get("heartbeat"))
+    conn.joined_at = state.get("joined_at", conn.joined_at)
+    conn.bytes_in = state.get("bytes_in", 0)
+    conn.bytes_out = state.get("bytes_out", 0)
+    conn.frames_sent = state.get("frames_sent", 0)
+    conn.throttled = state.get("throttled", 0)
+    # Transfer file dilanjutkan dari offset yang tersimpan di disk/state
+    for file_id in state.get("uploads", ()):
+        upload = srv.file_store.open_upload(int(file_id, 16))
+        if upload is not None:
+            conn.uploads[upload.id] = upload
+            srv.active_uploads[upload.id] = conn
+    for file_id, offset in state.get("downloads", ()):
+        srv.queue_download(conn, file_id, offset, announce=False)
+
+
+def _pending_input(conn):
+    """Byte masuk yang sudah dibaca proses ini tapi belum diproses.
+
+    Hanya dipanggil setelah handler berhenti di batas frame (conn.parked),
+    jadi tidak ada frame yang sudah diambil dari decoder tapi belum selesai.
+    """
+    pending = conn.decoder.unprocessed() if conn.decoder is not None else b""
+    # StreamReader tidak punya API publik untuk mengintip buffernya
+    buffered = getattr(conn.reader, "_buffer", b"")
+    return pending + bytes(buffered)
+
+
+def _encode_history(history):
+    rooms = [[room, next_seq, [[stamp, base64.b64encode(frame).decode("ascii")]
+                               for stamp, frame in items]]
+             for room, next_seq, items in history.export()]
+    return json.dumps(rooms).encode("utf-8")
+
+
+def _decode_history(blob):
+    return [(room, next_seq, [(stamp, base64.b64decode(frame)) for stamp, frame in items])
+            for room, next_seq, items in json.loads(blob)]
+
+
+async def _wait_drained(conns, timeout):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if all(c.closed or c.drained() for c in conns):
+            return
+        await asyncio.sleep(0.01)
+
+
+async def _wait_registered(srv, timeout):
+    """True jika semua koneksi yang di-accept sebelum listener ditutup sudah
+    terdaftar di registry (atau ditolak admission) dalam timeout detik"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # Accept yang tertunda butuh beberapa putaran loop (transport, lalu
+    # callback accept_client) sebelum tercatat di pending_clients
+    await asyncio.sleep(0.01)
+    while srv.pending_clients:
+        if loop.time() >= deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+async def _wait_parked(conns, timeout):
+    """True jika semua handler sudah berhenti di batas frame dalam timeout detik"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not all(c.closed or c.parked for c in conns):
+        if loop.time() >= deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+def _release(conns):
+    """Lepas handler yang ditahan di batas frame (serah terima gagal)"""
+    for conn in conns:
+        hold, conn.hold = conn.hold, None
+        if hold is not None and not hold.done():
+            hold.set_result(None)
+
+
+async def _hand_off(srv, chan):
+    """Sisi proses lama; True jika proses baru sudah mengambil alih"""
+    listener = srv._listener
+    lsock = listener.sockets[0]
+    backup = os.dup(lsock.fileno())
+    send_fd = os.dup(lsock.fileno())
+    try:
+        await _call(_send, chan, {"type": "listen"}, [send_fd])
+    except OSError as e:
+        os.close(backup)
+        srv.log_event(f"[HANDOFF] Gagal mengirim listening socket: {e}", ERROR)
+        return False
+    finally:
+        os.close(send_fd)
+    # Berhenti accept; fd di proses baru menjaga backlog tetap hidup.
+    # Port metrik juga dilepas agar proses baru bisa membukanya
+    listener.close()
+    if srv._metrics_http is not None:
+        srv._metrics_http.close()
+        srv._metrics_http = None
+    registered = await _wait_registered(srv, srv.DRAIN_TIMEOUT)
+
+    conns = [c for c in srv.client_registry.snapshot() if not c.closed]
+    downloads = {}
+    loop = asyncio.get_running_loop()
+    for conn in conns:
+        # Frame yang sedang diproses diselesaikan di sini; frame berikutnya
+        # tetap di decoder dan diserahkan sebagai byte masuk yang belum diproses
+        conn.hold = loop.create_future()
+        conn.writer.transport.pause_reading()
+        srv.timer_wheel.cancel(conn)
+        # Download berhenti di sini dan dilanjutkan proses baru dari offset-nya;
+        # potongan yang terkirim dua kali ditulis ulang di offset yang sama
+        downloads[conn.id] = [[job[0], job[2]] for job in conn.downloads if job[3] > job[2]]
+        for file_id, _offset in downloads[conn.id]:
+            conn.cancel_file(file_id)
+    parked = await _wait_parked(conns, srv.DRAIN_TIMEOUT)
+    await _wait_drained(conns, srv.DRAIN_TIMEOUT)
+
+    try:
+        if not registered:
+            raise ConnectionError("Koneksi yang sudah di-accept belum terdaftar")
+        if not parked:
+            raise ConnectionError("Handler client tidak berhenti di batas frame")
+        # Riwayat lebih dulu: client yang diadopsi langsung bisa mengirim pesan
+        await _call(_send, chan, {"type": "history"}, (), _encode_history(srv.room_history))
+        await _call(_send, chan, {"type": "presence", "online": sorted(srv.presence.online)})
+        for start in range(0, len(conns), CLIENT_BATCH):
+            batch = conns[start:start + CLIENT_BATCH]
+            states, blobs, fds = [], [], []
+            try:
+                for conn in batch:
+                    pending = _pending_input(conn)
+                    state = client_state(conn)
+                    state["downloads"] = downloads[conn.id]
+                    state["pending"] = len(pending)
+                    states.append(state)
+                    blobs.append(pending)
+                    fds.append(os.dup(conn.writer.get_extra_info("socket").fileno()))
+                await _call(_send, chan, {"type": "clients", "clients": states}, fds, b"".join(blobs))
+            finally:
+                for fd in fds:
+                    os.close(fd)
+        await _call(_send, chan, {"type": "done"})
+        reply, _fds, _blob = await _call(_recv, chan)
+        if reply.get("type") != "ok":
+            raise ConnectionError(f"Balasan tidak dikenal: {reply}")
+    except (OSError, ValueError) as e:
+        srv.log_event(f"[HANDOFF] Serah terima gagal, melanjutkan melayani client: {e}", ERROR)
+        srv._listener = await asyncio.start_server(srv.accept_client,
+                                                   sock=socket.socket(fileno=backup),
+                                                   backlog=srv.LISTEN_BACKLOG)
+        srv._metrics_http = await srv.start_metrics_http()
+        _release(conns)
+        for conn in conns:
+            if not conn.closed:
+                for file_id, offset in downloads[conn.id]:
+                    srv.queue_download(conn, file_id, offset, announce=False)
+                conn.writer.transport.resume_reading()
+                if srv.HEARTBEAT_INTERVAL > 0:
+                    srv.timer_wheel.schedule(conn, srv.HEARTBEAT_INTERVAL)
+        return False
+
+    os.close(backup)
+    srv._handed_off = True
+    for conn in conns:
+        conn.handed_off = True
+    srv.log_event(f"[HANDOFF] {len(conns)} client diserahkan ke proses baru")
+    return True
+
+
+async def serve_handoff(srv, path):
+    """Task proses lama: tunggu proses baru di path lalu serahkan semuanya"""
+    loop = asyncio.get_running_loop()
+    while True:
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            listener.bind(path)
+            listener.listen(1)
+            listener.setblocking(False)
+            chan, _addr = await loop.sock_accept(listener)
+        finally:
+            listener.close()
+        try:
+            # Proses baru akan membuka path yang sama setelah mengambil alih
+            os.unlink(path)
+        except OSError:
+            pass
+        chan.setblocking(True)
+        try:
+            request, fds, _blob = await _call(_recv, chan)
+            for fd in fds:
+                os.close(fd)
+            if request.get("type") != "takeover":
+                continue
+            srv.log_event(f"[HANDOFF] Proses baru (pid {request.get('pid')}) mengambil alih")
+            done = await _hand_off(srv, chan)
+        except (OSError, ValueError) as e:
+            srv.log_event(f"[HANDOFF] Permintaan serah terima gagal: {e}", WARNING)
+            done = False
+        finally:
+            chan.close()
+        if done:
+            srv.shutdown_server()
+            return
+
+
+async def _adopt(srv, fd, state, pending, gate):
+    """Layani socket client yang diterima dari proses lama; frame-nya ditahan sampai gate"""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(fileno=fd)
+    sock.setblocking(False)
+    reader = asyncio.StreamReader(limit=2 ** 16, loop=loop)
+    # Byte yang sudah dibaca proses lama harus diproses sebelum data baru
+    if pending:
+        reader.feed_data(pending)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport, _ = await loop.connect_accepted_socket(lambda: protocol, sock=sock)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    loop.create_task(srv.handle_client(reader, writer, dict(state, hold=gate)))
+
+
+async def take_over(srv, path):
+    """Sisi proses baru; listening socket dari proses lama, atau None jika tidak ada"""
+    chan = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    try:
+        chan.connect(path)
+    except OSError as e:
+        chan.close()
+        srv.log_event(f"[HANDOFF] Tidak ada proses lama di {path} ({e}); mulai biasa", WARNING)
+        return None
+    listen_sock = None
+    adopted = 0
+    # Client yang diadopsi lebih dulu tidak boleh memproses pesan sebelum
+    # penerimanya (client berikutnya) terdaftar
+    gate = asyncio.get_running_loop().create_future()
+    try:
+        await _call(_send, chan, {"type": "takeover", "pid": os.getpid()})
+        while True:
+            header, fds, blob = await _call(_recv, chan)
+            kind = header.get("type")
+            if kind == "listen":
+                listen_sock = socket.socket(fileno=fds[0])
+                for fd in fds[1:]:
+                    os.close(fd)
+            elif kind == "clients":
+                offset = 0
+                for state, fd in zip(header["clients"], fds):
+                    size = state.pop("pending", 0)
+                    await _adopt(srv, fd, state, blob[offset:offset + size], gate)
+                    offset += size
+                    adopted += 1
+                for fd in fds[len(header["clients"]):]:
+                    os.close(fd)
+            elif kind == "history":
+                srv.room_history.restore(_decode_history(blob))
+            elif kind == "presence":
+                srv.presence.restore(header["online"])
+            elif kind == "done":
+                await _call(_send, chan, {"type": "ok"})
+                gate.set_result(None)
+                break
+    except (OSError, ValueError) as e:
+        # Proses lama akan melanjutkan client-nya; lepaskan salinan di sini
+        srv.log_event(f"[HANDOFF] Pengambilalihan gagal: {e}", ERROR)
+        gate.cancel()
+        for conn in srv.client_registry.snapshot():
+            conn.handed_off = True
+            conn.close()
+        if listen_sock is not None:
+            listen_sock.close()
+        raise
+    finally:
+        chan.close()
+    srv.log_event(f"[HANDOFF] Mengambil alih listening socket dan {adopted} client")
+    return listen_sock
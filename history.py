@@ -0,0 +1,242 @@
+"""Riwayat chat: tail, paging, rentang waktu dan pencarian kata kunci
+
+Semua operasi bekerja langsung pada file log harian di chat_logs/ tanpa
+membaca seluruh file:
+
+- tail/paging membaca file dari belakang per blok (seek mundur).
+- Setiap file harian punya index kecil di chat_logs/.index/<nama>.json berisi
+  offset byte untuk setiap menit pertama yang muncul, dipakai untuk lompat ke
+  rentang waktu, dan inverted index kata -> nomor blok (INDEX_BLOCK byte)
+  untuk pencarian. Index per blok jauh lebih kecil daripada per baris; saat
+  mencari hanya blok yang memuat semua kata yang dibaca.
+- Index diperbarui secara incremental: hanya bagian file yang baru ditambahkan
+  sejak index terakhir yang di-parse.
+"""
+import bisect
+import datetime
+import json
+import os
+import re
+
+INDEX_DIR = ".index"
+BLOCK_SIZE = 64 * 1024
+INDEX_BLOCK = 4096
+
+_TS_RE = re.compile(rb"^\[(\d{4}-\d{2}-\d{2}) (\d{2}):(\d{2}):(\d{2})\] ")
+_WORD_RE = re.compile(r"\w{2,}", re.UNICODE)
+
+
+def _tokens(text):
+    return {word.lower() for word in _WORD_RE.findall(text)}
+
+
+def _decode(line):
+    return line.decode("utf-8", "replace").rstrip("\r\n")
+
+
+def read_lines_backwards(path, block_size=BLOCK_SIZE):
+    """Generator baris dari akhir ke awal file (bytes tanpa newline)"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step) + rest
+            lines = block.split(b"\n")
+            # Baris pertama mungkin terpotong; simpan untuk blok berikutnya
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if rest:
+            yield rest
+
+
+class HistoryStore:
+    """Akses riwayat untuk file <log_dir>/<prefix>_<YYYY-mm-dd>.txt"""
+
+    def __init__(self, log_dir, prefix):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self._indexes = {}
+
+    def path_for(self, day):
+        return os.path.join(self.log_dir, f"{self.prefix}_{day.strftime('%Y-%m-%d')}.txt")
+
+    def days(self):
+        """Tanggal yang memiliki file log, terbaru lebih dulu"""
+        days = []
+        head = f"{self.prefix}_"
+        try:
+            names = os.listdir(self.log_dir)
+        except OSError:
+            return []
+        for name in names:
+            if name.startswith(head) and name.endswith(".txt"):
+                try:
+                    days.append(datetime.datetime.strptime(name[len(head):-4], "%Y-%m-%d").date())
+                except ValueError:
+                    continue
+        return sorted(days, reverse=True)
+
+    # Tail dan paging
+
+    def tail(self, n=10, day=None):
+        """n baris terakhir (urutan kronologis) dari file hari tertentu"""
+        return self.page(0, n, day)
+
+    def page(self, page=0, per_page=10, day=None):
+        """Halaman riwayat dihitung dari belakang: page 0 = baris terbaru"""
+        path = self.path_for(day or datetime.date.today())
+        if not os.path.exists(path):
+            return []
+        skip = page * per_page
+        lines = []
+        for i, line in enumerate(read_lines_backwards(path)):
+            if i < skip:
+                continue
+            lines.append(_decode(line))
+            if len(lines) >= per_page:
+                break
+        lines.reverse()
+        return lines
+
+    # Index per hari
+
+    def _index_path(self, path):
+        return os.path.join(self.log_dir, INDEX_DIR, os.path.basename(path)[:-4] + ".json")
+
+    def _load_index(self, path):
+        """Index offset + kata kunci untuk satu file; diperbarui incremental"""
+        size = os.path.getsize(path)
+        index = self._indexes.get(path)
+        index_path = self._index_path(path)
+        if index is None and os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = None
+        if index is None or index.get("size", 0) > size:
+            # Belum ada index atau file diganti: bangun ulang
+            index = {"size": 0, "minutes": [], "offsets": [], "terms": {}}
+        if index["size"] < size:
+            self._extend_index(path, index)
+            try:
+                os.makedirs(os.path.dirname(index_path), exist_ok=True)
+                tmp_path = index_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(index, f, separators=(",", ":"))
+                os.replace(tmp_path, index_path)
+            except OSError:
+                pass
+        self._indexes[path] = index
+        return index
+
+    def _extend_index(self, path, index):
+        minutes = index["minutes"]
+        offsets = index["offsets"]
+        terms = index["terms"]
+        with open(path, "rb") as f:
+            f.seek(index["size"])
+            offset = index["size"]
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Baris terakhir belum lengkap; index lagi nanti
+                    break
+                match = _TS_RE.match(line)
+                if match:
+                    minute = int(match.group(2)) * 60 + int(match.group(3))
+                    if not minutes or minute > minutes[-1]:
+                        minutes.append(minute)
+                        offsets.append(offset)
+                    block = offset // INDEX_BLOCK
+                    for token in _tokens(_decode(line[match.end():])):
+                        blocks = terms.get(token)
+                        if blocks is None:
+                            terms[token] = [block]
+                        elif blocks[-1] != block:
+                            blocks.append(block)
+                offset += len(line)
+        index["size"] = offset
+
+    def _block_lines(self, f, block):
+        """Baris yang dimulai di dalam blok index tertentu"""
+        start = block * INDEX_BLOCK
+        end = start + INDEX_BLOCK
+        if start:
+            # Lewati sisa baris yang dimulai di blok sebelumnya
+            f.seek(start - 1)
+            f.readline()
+        else:
+            f.seek(0)
+        lines = []
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line)
+        return lines
+
+    def range(self, start, end, limit=1000):
+        """Baris dengan timestamp di antara start dan end (datetime, inklusif)"""
+        results = []
+        day = start.date()
+        while day <= end.date() and len(results) < limit:
+            path = self.path_for(day)
+            if os.path.exists(path):
+                index = self._load_index(path)
+                first_minute = start.hour * 60 + start.minute if day == start.date() else 0
+                pos = bisect.bisect_left(index["minutes"], first_minute)
+                if pos < len(index["offsets"]):
+                    with open(path, "rb") as f:
+                        f.seek(index["offsets"][pos])
+                        for line in f:
+                            match = _TS_RE.match(line)
+                            if not match:
+                                continue
+                            stamp = datetime.datetime.strptime(
+                                line[1:20].decode("ascii"), "%Y-%m-%d %H:%M:%S")
+                            if stamp < start:
+                                continue
+                            if stamp > end or len(results) >= limit:
+                                break
+                            results.append(_decode(line))
+            day += datetime.timedelta(days=1)
+        return results
+
+    def search(self, query, limit=50, page=0):
+        """Cari baris yang memuat semua kata di query, terbaru lebih dulu"""
+        words = _tokens(query)
+        if not words:
+            return []
+        skip = page * limit
+        results = []
+        for day in self.days():
+            path = self.path_for(day)
+            index = self._load_index(path)
+            postings = None
+            for word in words:
+                hits = set(index["terms"].get(word, ()))
+                postings = hits if postings is None else postings & hits
+                if not postings:
+                    break
+            if not postings:
+                continue
+            with open(path, "rb") as f:
+                for block in sorted(postings, reverse=True):
+                    # Cocokkan ulang per baris: blok bisa memuat kata di baris berbeda
+                    for line in reversed(self._block_lines(f, block)):
+                        match = _TS_RE.match(line)
+                        if not match or not words <= _tokens(_decode(line[match.end():])):
+                            continue
+                        if skip:
+                            skip -= 1
+                            continue
+                        results.append(_decode(line))
+                        if len(results) >= limit:
+                            return results
+        return results
@@ -0,0 +1,374 @@
+"""Format log biner append-only (segmen .chs) beserta reader dan converter
+
+Satu file segmen per hari: <prefix>_<YYYY-mm-dd>.chs
+
+    header file   b"CHLOG" + versi (1 byte) + 2 byte cadangan
+    blok ...      [magic b"BLK1"][panjang terkompresi 4][panjang mentah 4]
+                  [jumlah record 4][crc32 4][timestamp dasar us 8][data zlib]
+
+Data blok berisi record berurutan, semua angka dalam varint:
+
+    [selisih timestamp (us) dari timestamp dasar][kode tipe]
+    [tipe jika kode 0: panjang + UTF-8][panjang sender][sender UTF-8]
+    [panjang pesan][pesan UTF-8]
+
+Satu blok ditulis dengan satu write() O_APPEND, jadi beberapa proses aman
+menulis ke file yang sama dan blok yang terpotong di akhir file (crash)
+diabaikan pembaca. Header blok menyimpan timestamp dasar dan jumlah record,
+sehingga LogSegment bisa membangun index blok (lewat mmap) tanpa
+mendekompresi isi blok.
+
+Penggunaan dari command line:
+
+    python logstore.py convert chat_logs/chat_history_2025-10-16.txt
+    python logstore.py cat chat_logs/chat_history_2025-10-16.chs [--from HH:MM] [--to HH:MM]
+    python logstore.py stats chat_logs/chat_history_2025-10-16.chs
+"""
+import bisect
+import collections
+import datetime
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+
+FILE_MAGIC = b"CHLOG\x01\x00\x00"
+BLOCK_MAGIC = b"BLK1"
+_BLOCK = struct.Struct("!4sIIIIq")
+BLOCK_RECORDS = 1024
+SEGMENT_SUFFIX = ".chs"
+
+# Tipe yang sering muncul disimpan sebagai kode 1 byte; lainnya ditulis utuh
+TYPES = ("", "RECEIVED", "BROADCAST", "SYSTEM", "DIRECT", "SERVER", "SENT")
+_TYPE_CODES = {name: code for code, name in enumerate(TYPES) if name}
+
+Record = collections.namedtuple("Record", "timestamp type sender message")
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _put_text(out, text):
+    raw = text.encode("utf-8")
+    _put_varint(out, len(raw))
+    out += raw
+
+
+def _get_text(buf, pos):
+    size, pos = _get_varint(buf, pos)
+    return str(buf[pos:pos + size], "utf-8", "replace"), pos + size
+
+
+def encode_block(records):
+    """Bytes satu blok (header + data zlib) dari list Record"""
+    base = round(records[0].timestamp * 1_000_000)
+    out = bytearray()
+    for rec in records:
+        _put_varint(out, max(0, round(rec.timestamp * 1_000_000) - base))
+        code = _TYPE_CODES.get(rec.type, 0)
+        _put_varint(out, code)
+        if code == 0:
+            _put_text(out, rec.type)
+        _put_text(out, rec.sender)
+        _put_text(out, rec.message)
+    data = zlib.compress(bytes(out), 6)
+    header = _BLOCK.pack(BLOCK_MAGIC, len(data), len(out), len(records),
+                         zlib.crc32(data), base)
+    return header + data
+
+
+def decode_block(buf, offset):
+    """Record di blok pada offset (buf: bytes/mmap); ValueError jika rusak"""
+    magic, comp_len, raw_len, count, crc, base = _BLOCK.unpack_from(buf, offset)
+    start = offset + _BLOCK.size
+    data = buf[start:start + comp_len]
+    if magic != BLOCK_MAGIC or len(data) != comp_len or zlib.crc32(data) != crc:
+        raise ValueError(f"Blok rusak di offset {offset}")
+    raw = zlib.decompress(data)
+    records = []
+    append = records.append
+    pos = 0
+    for _ in range(count):
+        delta, pos = _get_varint(raw, pos)
+        code = raw[pos]
+        pos += 1
+        if code == 0:
+            rec_type, pos = _get_text(raw, pos)
+        else:
+            rec_type = TYPES[code] if code < len(TYPES) else str(code)
+        # Jalur cepat panjang < 128 (varint 1 byte)
+        size = raw[pos]
+        if size < 0x80:
+            pos += 1
+            sender = raw[pos:pos + size].decode("utf-8", "replace")
+            pos += size
+        else:
+            sender, pos = _get_text(raw, pos)
+        size = raw[pos]
+        if size < 0x80:
+            pos += 1
+            message = raw[pos:pos + size].decode("utf-8", "replace")
+            pos += size
+        else:
+            message, pos = _get_text(raw, pos)
+        append(Record((base + delta) / 1_000_000, rec_type, sender, message))
+    return records
+
+
+def _scan_blocks(buf):
+    """Generator (offset, jumlah record, timestamp dasar) untuk blok yang utuh"""
+    pos = 0
+    size = len(buf)
+    while pos + _BLOCK.size <= size:
+        if buf[pos:pos + len(FILE_MAGIC)] == FILE_MAGIC:
+            # Header file (bisa muncul lagi jika dua proses membuat file bersamaan)
+            pos += len(FILE_MAGIC)
+            continue
+        magic, comp_len, _raw_len, count, _crc, base = _BLOCK.unpack_from(buf, pos)
+        if magic != BLOCK_MAGIC or pos + _BLOCK.size + comp_len > size:
+            # Sisa file rusak atau blok terakhir belum selesai ditulis
+            break
+        yield pos, count, base
+        pos += _BLOCK.size + comp_len
+
+
+class SegmentWriter:
+    """Penulis segmen append-only; record dikumpulkan lalu ditulis per blok"""
+
+    def __init__(self, path, block_records=BLOCK_RECORDS):
+        self.path = path
+        self.block_records = block_records
+        self.pending = []
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if os.fstat(self._fd).st_size == 0:
+            os.write(self._fd, FILE_MAGIC)
+
+    def append(self, timestamp, rec_type, sender, message):
+        self.pending.append(Record(timestamp, rec_type, sender, message))
+        if len(self.pending) >= self.block_records:
+            self.flush()
+
+    def flush(self):
+        """Tulis record tertunda sebagai satu blok"""
+        if self.pending:
+            os.write(self._fd, encode_block(self.pending))
+            self.pending = []
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        if self._fd is None:
+            return
+        self.flush()
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(path, start=None, end=None):
+    """Generator Record dari file segmen, dibaca per blok (streaming).
+
+    start/end: batas timestamp (detik epoch, inklusif) untuk menyaring.
+    """
+    with LogSegment(path) as segment:
+        yield from segment.range(start, end)
+
+
+class LogSegment:
+    """Akses acak ke file segmen lewat mmap.
+
+    Index blok (offset, record kumulatif, timestamp dasar) dibangun dari
+    header blok saja. segment[i] hanya mendekompresi blok yang memuat
+    record ke-i; blok terakhir yang dibuka di-cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.offsets = []
+        self.starts = []  # index record pertama setiap blok
+        self.bases = []   # timestamp dasar setiap blok (us)
+        total = 0
+        for offset, count, base in _scan_blocks(self._map):
+            self.offsets.append(offset)
+            self.starts.append(total)
+            self.bases.append(base)
+            total += count
+        self._count = total
+        self._cached = (None, None)
+
+    def __len__(self):
+        return self._count
+
+    def block(self, index):
+        """List Record di blok ke-index"""
+        if self._cached[0] != index:
+            self._cached = (index, decode_block(self._map, self.offsets[index]))
+        return self._cached[1]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        index = bisect.bisect_right(self.starts, i) - 1
+        return self.block(index)[i - self.starts[index]]
+
+    def __iter__(self):
+        for index in range(len(self.offsets)):
+            yield from self.block(index)
+
+    def range(self, start=None, end=None):
+        """Record dengan start <= timestamp <= end; blok di luar rentang dilewati"""
+        first = 0
+        if start is not None:
+            # Blok sebelum blok pertama yang dasarnya > start tidak mungkin cocok,
+            # kecuali blok tepat sebelumnya
+            first = max(0, bisect.bisect_right(self.bases, int(start * 1_000_000)) - 1)
+        for index in range(first, len(self.offsets)):
+            if end is not None and self.bases[index] > end * 1_000_000:
+                break
+            for rec in self.block(index):
+                if start is not None and rec.timestamp < start:
+                    continue
+                if end is not None and rec.timestamp > end:
+                    return
+                yield rec
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Konversi log teks lama
+
+_LINE_RE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] (?:(.*?) - ([A-Z_]+): )?(.*)$")
+
+
+def parse_text_line(line):
+    """Record dari satu baris log teks, None jika bukan awal record"""
+    match = _LINE_RE.match(line)
+    if not match:
+        return None
+    stamp = datetime.datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S").timestamp()
+    return Record(stamp, match.group(3) or "", match.group(2) or "", match.group(4))
+
+
+def convert_text_log(src, dst=None, block_records=BLOCK_RECORDS):
+    """Impor file log teks ke segmen biner; mengembalikan (path, jumlah record).
+
+    Baris tanpa timestamp (pesan multi-baris) digabung ke record sebelumnya.
+    """
+    dst = dst or os.path.splitext(src)[0] + SEGMENT_SUFFIX
+    tmp = dst + ".tmp"
+    count = 0
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with open(src, "r", encoding="utf-8", errors="replace") as f, \
+            SegmentWriter(tmp, block_records) as writer:
+        current = None
+        for line in f:
+            line = line.rstrip("\r\n")
+            rec = parse_text_line(line)
+            if rec is None:
+                if current is not None:
+                    current = current._replace(message=current.message + "\n" + line)
+                continue
+            if current is not None:
+                writer.append(*current)
+                count += 1
+            current = rec
+        if current is not None:
+            writer.append(*current)
+            count += 1
+    os.replace(tmp, dst)
+    return dst, count
+
+
+def format_record(rec):
+    """Baris teks seperti format log lama"""
+    stamp = datetime.datetime.fromtimestamp(rec.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    if rec.type:
+        return f"[{stamp}] {rec.sender} - {rec.type}: {rec.message}"
+    return f"[{stamp}] {rec.message}"
+
+
+def _parse_clock(day_path, value):
+    """HH:MM pada tanggal di nama file segmen -> timestamp"""
+    if value is None:
+        return None
+    date = re.search(r"(\d{4}-\d{2}-\d{2})", os.path.basename(day_path))
+    day = date.group(1) if date else datetime.date.today().isoformat()
+    return datetime.datetime.strptime(f"{day} {value}", "%Y-%m-%d %H:%M").timestamp()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Segmen log biner ChatBox")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    conv = sub.add_parser("convert", help="impor log teks ke .chs")
+    conv.add_argument("files", nargs="+")
+    cat = sub.add_parser("cat", help="tampilkan isi segmen sebagai teks")
+    cat.add_argument("file")
+    cat.add_argument("--from", dest="start", help="HH:MM")
+    cat.add_argument("--to", dest="end", help="HH:MM")
+    stats = sub.add_parser("stats", help="ringkasan segmen")
+    stats.add_argument("file")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "convert":
+        for src in args.files:
+            dst, count = convert_text_log(src)
+            print(f"{src} -> {dst}: {count} record, "
+                  f"{os.path.getsize(src)} -> {os.path.getsize(dst)} byte")
+    elif args.cmd == "cat":
+        start = _parse_clock(args.file, args.start)
+        end = _parse_clock(args.file, args.end)
+        if end is not None:
+            end += 59
+        for rec in iter_records(args.file, start, end):
+            print(format_record(rec))
+    elif args.cmd == "stats":
+        with LogSegment(args.file) as segment:
+            types = collections.Counter(rec.type for rec in segment)
+            print(f"{args.file}: {len(segment)} record, {len(segment.offsets)} blok, "
+                  f"{os.path.getsize(args.file)} byte")
+            for name, count in types.most_common():
+                print(f"  {name or '-'}: {count}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
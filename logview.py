@@ -0,0 +1,86 @@
+"""Render baris log/chat ke widget Text Tk secara batch
+
+append() boleh dipanggil dari thread mana pun: baris hanya dimasukkan ke
+deque. Timer Tk (root.after) mengambil semua baris yang tertunda dan
+menulisnya dengan satu insert, satu trim, dan satu see per frame, bukan satu
+siklus configure/insert/see per baris.
+
+Widget dibatasi GUI_SCROLLBACK baris; baris lama dipotong dari atas. Antrean
+tertunda juga dibatasi sebesar scrollback, jadi saat badai pesan baris yang
+toh akan langsung terpotong dibuang sebelum dirender.
+
+Interval polling adaptif: saat ada baris masuk, render setiap MIN_INTERVAL ms;
+saat sepi interval dilipatgandakan sampai MAX_INTERVAL ms.
+"""
+import collections
+import os
+
+GUI_SCROLLBACK = int(os.environ.get('GUI_SCROLLBACK', '5000'))
+
+MIN_INTERVAL = 30
+MAX_INTERVAL = 250
+# Batas baris per frame agar satu render tidak menahan main loop terlalu lama
+MAX_LINES_PER_FRAME = 2000
+
+
+class BatchedLogView:
+    """Penulis batch untuk widget Text/ScrolledText (state DISABLED)"""
+
+    def __init__(self, root, widget, scrollback=None):
+        self.root = root
+        self.widget = widget
+        self.scrollback = scrollback or GUI_SCROLLBACK
+        self.pending = collections.deque(maxlen=self.scrollback)
+        self.skipped = 0
+        self.interval = MIN_INTERVAL
+        self._job = None
+        self._schedule()
+
+    def append(self, text):
+        """Tambahkan satu baris; aman dipanggil dari thread lain"""
+        if len(self.pending) == self.pending.maxlen:
+            self.skipped += 1
+        self.pending.append(text)
+
+    def _schedule(self):
+        try:
+            self._job = self.root.after(self.interval, self._tick)
+        except Exception:
+            # Root sudah dihancurkan
+            self._job = None
+
+    def _tick(self):
+        pending = self.pending
+        if pending:
+            count = min(len(pending), MAX_LINES_PER_FRAME)
+            lines = [pending.popleft() for _ in range(count)]
+            try:
+                self._render(lines)
+            except Exception:
+                # Widget sudah dihancurkan
+                return
+            self.interval = MIN_INTERVAL
+        else:
+            self.interval = min(self.interval * 2, MAX_INTERVAL)
+        self._schedule()
+
+    def _render(self, lines):
+        widget = self.widget
+        # Hanya ikut scroll jika user sedang melihat bagian paling bawah
+        at_bottom = widget.yview()[1] >= 0.999
+        widget.configure(state="normal")
+        widget.insert("end", "\n".join(lines) + "\n")
+        total = int(widget.index("end-1c").split(".")[0]) - 1
+        if total > self.scrollback:
+            widget.delete("1.0", f"{total - self.scrollback + 1}.0")
+        widget.configure(state="disabled")
+        if at_bottom:
+            widget.see("end")
+
+    def close(self):
+        if self._job is not None:
+            try:
+                self.root.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
@@ -0,0 +1,198 @@
+"""Metrik server (counter, gauge, histogram) dan endpoint HTTP Prometheus
+
+Counter dan histogram hanya menambah angka pada atribut objek tanpa lock:
+hampir semua pemanggil berada di thread event loop, dan thread writer log
+hanya menulis ke histogram miliknya sendiri. Pembacaan saat scrape bisa
+sedikit tidak konsisten antar metrik, tapi tidak pernah menahan hot path.
+
+Gauge dihitung saat dibaca lewat fungsi (mis. panjang antrean semua client),
+jadi tidak ada biaya selama tidak ada yang membaca.
+
+snapshot() menghasilkan dict biasa (bisa di-JSON) yang dipakai GUI dan
+dijumlahkan antar worker di mode cluster (merge_snapshots), lalu diubah ke
+format teks Prometheus oleh render().
+
+Konfigurasi lewat environment:
+    METRICS_HOST  alamat endpoint HTTP (default 127.0.0.1)
+    METRICS_PORT  port endpoint HTTP, mis. 9181 (default 0 = mati)
+"""
+import asyncio
+import bisect
+import os
+
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+
+# Bucket latensi dalam detik: 10 us sampai 5 s
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    __slots__ = ("name", "help", "value")
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def snapshot(self):
+        return {"type": "counter", "help": self.help, "value": self.value}
+
+
+class Gauge:
+    __slots__ = ("name", "help", "func")
+
+    def __init__(self, name, help_text, func):
+        self.name = name
+        self.help = help_text
+        self.func = func
+
+    def snapshot(self):
+        try:
+            value = self.func()
+        except Exception:
+            value = 0
+        return {"type": "gauge", "help": self.help, "value": value}
+
+
+class Histogram:
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count")
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # Satu slot tambahan untuk nilai di atas bucket terbesar (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {"type": "histogram", "help": self.help, "buckets": list(self.buckets),
+                "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+def quantile(hist, q):
+    """Perkiraan kuantil dari snapshot histogram (batas atas bucket)"""
+    total = hist["count"]
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for bound, count in zip(hist["buckets"], hist["counts"]):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float("inf")
+
+
+class MetricsRegistry:
+    """Kumpulan metrik bernama; urutan pendaftaran dipakai saat render"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text):
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name, help_text, func):
+        return self._add(Gauge(name, help_text, func))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, buckets))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+def merge_snapshots(snapshots):
+    """Jumlahkan snapshot dari beberapa worker menjadi satu"""
+    merged = {}
+    for snap in snapshots:
+        for name, data in snap.items():
+            current = merged.get(name)
+            if current is None:
+                merged[name] = dict(data, counts=list(data["counts"])) if "counts" in data else dict(data)
+            elif data["type"] == "histogram":
+                current["counts"] = [a + b for a, b in zip(current["counts"], data["counts"])]
+                current["sum"] += data["sum"]
+                current["count"] += data["count"]
+            else:
+                current["value"] += data["value"]
+    return merged
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """Format teks Prometheus (exposition format 0.0.4)"""
+    lines = []
+    for name, data in snapshot.items():
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        if data["type"] == "histogram":
+            cumulative = 0
+            for bound, count in zip(data["buckets"], data["counts"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{_fmt(float(bound))}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {data["count"]}')
+            lines.append(f"{name}_sum {_fmt(float(data['sum']))}")
+            lines.append(f"{name}_count {data['count']}")
+        else:
+            lines.append(f"{name} {_fmt(data['value'])}")
+    return "\n".join(lines) + "\n"
+
+
+async def start_http(get_snapshot, host=None, port=None):
+    """Endpoint HTTP minimal: GET /metrics mengembalikan render(snapshot).
+
+    get_snapshot adalah coroutine function (agar master cluster bisa
+    mengumpulkan snapshot dari worker). Mengembalikan asyncio.Server.
+    """
+
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5.0)
+            # Buang header request sampai baris kosong
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 5.0)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] in (b"/", b"/metrics"):
+                body = render(await get_snapshot()).encode("utf-8")
+                status = b"200 OK"
+                ctype = b"text/plain; version=0.0.4; charset=utf-8"
+            else:
+                body = b"not found\n"
+                status = b"404 Not Found"
+                ctype = b"text/plain"
+            writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: " + ctype +
+                         b"\r\nContent-Length: " + str(len(body)).encode() +
+                         b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host or METRICS_HOST,
+                                      METRICS_PORT if port is None else port,
+                                      reuse_address=True)
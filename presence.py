@@ -0,0 +1,145 @@
+"""Daftar user online: snapshot saat subscribe, lalu delta yang digabung
+
+Pengganti broadcast teks "User X joined/left the chat" setiap connect dan
+disconnect, yang mengirim satu frame ke setiap client (O(N²) saat N client
+menyambung bersamaan setelah gangguan). Sekarang:
+
+    - connect, disconnect dan ganti nickname hanya mengubah hitungan di memori
+    - client yang mengirim "presence=1" di FRAME_HELLO menerima snapshot
+      daftar online sekali
+    - setiap PRESENCE_INTERVAL detik perubahan sejak flush terakhir dikirim
+      sebagai FRAME_PRESENCE (di-encode sekali) ke semua subscriber; user
+      yang masuk lalu keluar dalam satu interval tidak dikirim sama sekali
+
+Nickname dihitung per koneksi, jadi user dengan dua koneksi tetap online
+sampai keduanya putus. Di mode cluster setiap worker mengirim perubahan
+daftar lokalnya lewat bus dan daftar worker lain disimpan per worker
+(set_remote/update_remote/drop_remote).
+
+Semua method dipanggil dari thread event loop.
+
+Konfigurasi lewat environment:
+    PRESENCE_INTERVAL  detik antar delta presence (default 0.5)
+"""
+import os
+
+from protocol import encode_presence
+
+PRESENCE_INTERVAL = float(os.environ.get('PRESENCE_INTERVAL', '0.5'))
+
+
+class PresenceService:
+    """Hitungan nickname online dan subscriber FRAME_PRESENCE"""
+
+    def __init__(self):
+        self.local = {}        # nickname -> jumlah koneksi di proses ini
+        self.remote = {}       # index worker lain -> set nickname
+        self.online = set()    # daftar yang sudah dikirim ke subscriber
+        self.published = set() # daftar lokal yang sudah dikirim ke worker lain
+        self.subscribers = {}  # conn.id -> ClientConnection
+        # nickname (huruf kecil) -> jumlah worker lain tempat user itu online
+        self._remote_keys = {}
+        self._dirty = set()
+
+    def __len__(self):
+        return len(self.online)
+
+    def connect(self, nickname):
+        self.local[nickname] = self.local.get(nickname, 0) + 1
+        self._dirty.add(nickname)
+
+    def disconnect(self, nickname):
+        count = self.local.get(nickname, 0) - 1
+        if count > 0:
+            self.local[nickname] = count
+        else:
+            self.local.pop(nickname, None)
+        self._dirty.add(nickname)
+
+    def rename(self, old, new):
+        self.disconnect(old)
+        self.connect(new)
+
+    def _count_remote(self, names, delta):
+        for name in names:
+            key = name.lower()
+            count = self._remote_keys.get(key, 0) + delta
+            if count > 0:
+                self._remote_keys[key] = count
+            else:
+                self._remote_keys.pop(key, None)
+
+    def is_remote(self, nickname):
+        """True jika nickname online di worker lain (tanpa membedakan huruf besar)"""
+        return nickname.lower() in self._remote_keys
+
+    def set_remote(self, source, names):
+        """Ganti seluruh daftar worker source (snapshot dari bus)"""
+        old = self.remote.get(source, set())
+        names = set(names)
+        self.remote[source] = names
+        self._count_remote(old - names, -1)
+        self._count_remote(names - old, 1)
+        self._dirty |= old ^ names
+
+    def update_remote(self, source, added, removed):
+        names = self.remote.setdefault(source, set())
+        added = set(added) - names
+        names.update(added)
+        self._count_remote(added, 1)
+        removed = names.intersection(removed)
+        names.difference_update(removed)
+        self._count_remote(removed, -1)
+        self._dirty.update(added)
+        self._dirty.update(removed)
+
+    def drop_remote(self, source):
+        """Worker source berhenti; semua user-nya dianggap offline"""
+        names = self.remote.pop(source, set())
+        self._count_remote(names, -1)
+        self._dirty |= names
+
+    def restore(self, online):
+        """Daftar yang sudah dimiliki subscriber dari proses lama (handoff)"""
+        self.online = set(online)
+        self._dirty |= self.online
+
+    def clear(self):
+        """Kosongkan semua daftar (server berhenti)"""
+        self.__init__()
+
+    def subscribe(self, conn):
+        """Daftarkan conn; mengembalikan frame snapshot untuknya"""
+        self.subscribers[conn.id] = conn
+        return encode_presence(sorted(self.online), snapshot=True)
+
+    def unsubscribe(self, conn):
+        self.subscribers.pop(conn.id, None)
+
+    def flush(self):
+        """Hitung perubahan sejak flush terakhir.
+
+        Mengembalikan (frame untuk subscriber atau b"", (added, removed) daftar
+        lokal untuk worker lain).
+        """
+        if not self._dirty:
+            return b"", ((), ())
+        dirty, self._dirty = self._dirty, set()
+        added, removed, local_added, local_removed = [], [], [], []
+        for name in sorted(dirty):
+            is_local = name in self.local
+            if is_local and name not in self.published:
+                self.published.add(name)
+                local_added.append(name)
+            elif not is_local and name in self.published:
+                self.published.discard(name)
+                local_removed.append(name)
+            is_online = is_local or any(name in names for names in self.remote.values())
+            if is_online and name not in self.online:
+                self.online.add(name)
+                added.append(name)
+            elif not is_online and name in self.online:
+                self.online.discard(name)
+                removed.append(name)
+        frame = encode_presence(added, removed) if self.subscribers else b""
+        return frame, (local_added, local_removed)
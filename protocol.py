@@ -0,0 +1,337 @@
+"""Protokol framing pesan antara server.py dan client.py
+
+Setiap frame di wire berbentuk:
+
+    [panjang payload: 4 byte big-endian][tipe frame: 1 byte][payload]
+
+Payload FRAME_TEXT berisi teks UTF-8. Panjang payload dibatasi MAX_FRAME_SIZE
+agar client nakal tidak bisa membuat server mengalokasikan buffer raksasa.
+
+FRAME_SEQ mendahului setiap pesan room yang tersimpan di riwayat server:
+[nomor urut 8 byte][nama room UTF-8]. Client memakainya untuk membuang
+pesan replay yang sudah pernah diterima dan untuk meminta delta (/resume).
+Replay riwayat saat masuk room diawali FRAME_REPLAY dengan payload yang
+sama: pesan room itu dengan nomor urut sampai nilai ini adalah riwayat,
+bukan pesan baru.
+
+Kompresi (opsional, server -> client): client mengirim FRAME_HELLO berisi
+"compress=zlib" setelah connect; server membalas FRAME_HELLO dengan mode yang
+dipakai. Setelah itu server boleh membungkus satu atau beberapa frame utuh
+dalam FRAME_COMPRESSED (raw deflate dengan preset dictionary ZDICT). Setiap
+frame terkompresi berdiri sendiri tanpa konteks per koneksi, sehingga
+broadcast cukup dikompres sekali untuk semua subscriber.
+
+Heartbeat: client yang mengirim "heartbeat=1" di FRAME_HELLO wajib membalas
+setiap FRAME_PING dengan FRAME_PONG berisi payload yang sama. Server
+mengirim PING ke koneksi yang diam dan menutup koneksi yang tidak membalas.
+Kedua arah boleh mengirim PING.
+
+Presence: client yang mengirim "presence=1" di FRAME_HELLO menerima
+FRAME_PRESENCE berisi baris UTF-8 dipisah "\n": "+nick" (online) atau
+"-nick" (offline). Frame yang diawali baris "=" adalah snapshot; client
+mengosongkan daftarnya dulu. Snapshot besar dipecah menjadi frame "="
+diikuti frame delta "+".
+
+Transfer file: FRAME_FILE membawa perintah kontrol "kunci=nilai" seperti
+FRAME_HELLO (nilai di-quote URL, mis. op=put name=a%20b.txt size=10).
+Isi file dikirim sebagai FRAME_CHUNK: [id file 4 byte][offset 8 byte][data].
+Offset membuat transfer bisa dilanjutkan setelah koneksi putus. Frame
+chunk tidak pernah dikompres.
+
+Server penuh: koneksi yang ditolak admission control hanya menerima satu
+FRAME_BUSY "retry_after=<detik> reason=<clients|ip>" lalu ditutup. Tidak
+ada data client yang diproses, jadi client boleh mengirim ulang semuanya
+setelah menunggu retry_after.
+"""
+import os
+import struct
+import zlib
+from urllib.parse import quote, unquote
+
+HEADER = struct.Struct("!IB")
+HEADER_SIZE = HEADER.size
+
+# Batas ukuran payload satu frame (bisa diubah lewat environment)
+MAX_FRAME_SIZE = int(os.environ.get('MAX_FRAME_SIZE', str(64 * 1024)))
+
+# Tipe frame
+FRAME_TEXT = 1
+FRAME_SEQ = 2
+FRAME_COMPRESSED = 3
+FRAME_HELLO = 4
+FRAME_PING = 5
+FRAME_PONG = 6
+FRAME_PRESENCE = 7
+FRAME_FILE = 8
+FRAME_CHUNK = 9
+FRAME_BUSY = 10
+FRAME_REPLAY = 11
+
+COMPRESSION_ZLIB = "zlib"
+# Frame lebih kecil dari ini dikirim apa adanya
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '128'))
+# Batas hasil dekompresi satu FRAME_COMPRESSED (melindungi dari zip bomb)
+MAX_INFLATE_SIZE = int(os.environ.get('MAX_INFLATE_SIZE', str(1024 * 1024)))
+
+# Preset dictionary bersama: potongan teks yang sering muncul di pesan chat
+ZDICT = (b" joined the chat left the chat SERVER: (DM) #lobby Nickname sekarang "
+         b"Masuk ke Keluar dari room aktif anggota tidak ditemukan Perintah: "
+         b"/join /leave /rooms /msg /nick /resume /help 127.0.0.1 192.168. "
+         b"[00:00:00] [10:] [11:] [12:] [13:] [14:] [15:] [16:] [17:] [18:] [19:] [20:] ")
+
+_SEQ = struct.Struct("!Q")
+CHUNK_HEADER = struct.Struct("!IQ")
+
+
+class FrameError(Exception):
+    """Frame rusak atau melebihi batas ukuran"""
+
+
+def encode_frame(payload, frame_type=FRAME_TEXT, max_size=MAX_FRAME_SIZE):
+    """Bungkus payload (bytes) menjadi satu frame siap kirim"""
+    if len(payload) > max_size:
+        raise FrameError(f"Frame terlalu besar: {len(payload)} > {max_size} byte")
+    return HEADER.pack(len(payload), frame_type) + payload
+
+
+def encode_text(text, max_size=MAX_FRAME_SIZE):
+    """Encode string menjadi frame FRAME_TEXT"""
+    return encode_frame(text.encode("utf-8"), FRAME_TEXT, max_size)
+
+
+def decode_text(payload):
+    """Decode payload (bytes/memoryview) langsung ke str tanpa salinan perantara"""
+    return str(payload, "utf-8")
+
+
+def encode_seq(room, seq):
+    """Frame FRAME_SEQ untuk pesan ke-seq di room"""
+    return encode_frame(_SEQ.pack(seq) + room.encode("utf-8"), FRAME_SEQ)
+
+
+def encode_replay(room, seq):
+    """Frame FRAME_REPLAY: riwayat room yang menyusul berakhir di nomor urut seq"""
+    return encode_frame(_SEQ.pack(seq) + room.encode("utf-8"), FRAME_REPLAY)
+
+
+def decode_seq(payload):
+    """Kembalikan (room, seq) dari payload FRAME_SEQ atau FRAME_REPLAY"""
+    return str(payload[_SEQ.size:], "utf-8"), _SEQ.unpack_from(payload)[0]
+
+
+def compress_frames(data, min_size=COMPRESS_MIN_SIZE):
+    """Bungkus satu/lebih frame utuh (bytes) menjadi FRAME_COMPRESSED.
+
+    Mengembalikan None jika data terlalu kecil/besar atau hasilnya tidak
+    lebih pendek; pemanggil lalu mengirim data aslinya.
+    """
+    if len(data) < min_size or len(data) > MAX_INFLATE_SIZE:
+        return None
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15, zdict=ZDICT)
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) + HEADER_SIZE >= len(data) or len(packed) > MAX_FRAME_SIZE:
+        return None
+    return HEADER.pack(len(packed), FRAME_COMPRESSED) + packed
+
+
+def expand_frames(frames, max_frame_size=MAX_FRAME_SIZE):
+    """Generator frame dengan FRAME_COMPRESSED dibuka menjadi frame aslinya"""
+    for frame_type, payload in frames:
+        if frame_type != FRAME_COMPRESSED:
+            yield frame_type, payload
+            continue
+        inflater = zlib.decompressobj(-15, zdict=ZDICT)
+        try:
+            data = inflater.decompress(payload, MAX_INFLATE_SIZE)
+        except zlib.error as e:
+            raise FrameError(f"Frame terkompresi rusak: {e}")
+        if inflater.unconsumed_tail:
+            raise FrameError(f"Frame terkompresi melebihi {MAX_INFLATE_SIZE} byte")
+        inner = FrameDecoder(max_frame_size, len(data))
+        inner.feed(data)
+        for inner_type, inner_payload in inner.frames():
+            # Tidak ada kompresi bertingkat
+            if inner_type != FRAME_COMPRESSED:
+                yield inner_type, inner_payload
+        if inner.pending():
+            raise FrameError("Frame terkompresi berisi frame terpotong")
+
+
+def encode_ping(payload=b""):
+    return encode_frame(payload, FRAME_PING)
+
+
+def encode_pong(payload=b""):
+    """Balasan PING; payload disalin dari frame PING"""
+    return encode_frame(bytes(payload), FRAME_PONG)
+
+
+def encode_hello(**options):
+    """FRAME_HELLO berisi opsi 'kunci=nilai' dipisah spasi"""
+    text = " ".join(f"{key}={value}" for key, value in options.items())
+    return encode_frame(text.encode("utf-8"), FRAME_HELLO)
+
+
+def decode_hello(payload):
+    options = {}
+    for item in str(payload, "utf-8").split():
+        key, _, value = item.partition("=")
+        options[key] = value
+    return options
+
+
+def encode_presence(added=(), removed=(), snapshot=False, max_size=MAX_FRAME_SIZE):
+    """Satu atau beberapa frame FRAME_PRESENCE (bytes); b"" jika tidak ada perubahan"""
+    lines = [f"+{name}".encode("utf-8") for name in added]
+    lines.extend(f"-{name}".encode("utf-8") for name in removed)
+    frames = []
+    chunk = [b"="] if snapshot else []
+    size = len(b"=") if snapshot else 0
+    for line in lines:
+        if chunk and size + 1 + len(line) > max_size:
+            frames.append(encode_frame(b"\n".join(chunk), FRAME_PRESENCE, max_size))
+            chunk, size = [], -1
+        chunk.append(line)
+        size += 1 + len(line)
+    if chunk:
+        frames.append(encode_frame(b"\n".join(chunk), FRAME_PRESENCE, max_size))
+    return b"".join(frames)
+
+
+def decode_presence(payload):
+    """Kembalikan (snapshot, added, removed) dari payload FRAME_PRESENCE"""
+    snapshot = False
+    added, removed = [], []
+    for line in str(payload, "utf-8").split("\n"):
+        if line == "=":
+            snapshot = True
+        elif line.startswith("+"):
+            added.append(line[1:])
+        elif line.startswith("-"):
+            removed.append(line[1:])
+    return snapshot, added, removed
+
+
+def encode_file(**fields):
+    """Frame FRAME_FILE berisi perintah kontrol transfer"""
+    text = " ".join(f"{key}={quote(str(value), safe='')}" for key, value in fields.items())
+    return encode_frame(text.encode("utf-8"), FRAME_FILE)
+
+
+def decode_file(payload):
+    fields = {}
+    for item in str(payload, "utf-8").split():
+        key, _, value = item.partition("=")
+        fields[key] = unquote(value)
+    return fields
+
+
+def encode_busy(retry_after, reason):
+    """FRAME_BUSY: server menolak koneksi, coba lagi setelah retry_after detik"""
+    return encode_frame(f"retry_after={retry_after:g} reason={reason}".encode("utf-8"), FRAME_BUSY)
+
+
+def decode_busy(payload):
+    """Kembalikan (retry_after, reason) dari payload FRAME_BUSY"""
+    options = decode_hello(payload)
+    try:
+        retry_after = max(float(options.get("retry_after", "0")), 0.0)
+    except ValueError:
+        retry_after = 0.0
+    return retry_after, options.get("reason", "")
+
+
+def chunk_header(file_id, offset, size):
+    """Header frame FRAME_CHUNK untuk size byte data; data boleh dikirim terpisah (sendfile)"""
+    return HEADER.pack(CHUNK_HEADER.size + size, FRAME_CHUNK) + CHUNK_HEADER.pack(file_id, offset)
+
+
+def encode_chunk(file_id, offset, data):
+    return chunk_header(file_id, offset, len(data)) + data
+
+
+def decode_chunk(payload):
+    """Kembalikan (id file, offset, memoryview data) dari payload FRAME_CHUNK"""
+    file_id, offset = CHUNK_HEADER.unpack_from(payload)
+    return file_id, offset, memoryview(payload)[CHUNK_HEADER.size:]
+
+
+class FrameDecoder:
+    """Decoder incremental untuk aliran byte TCP.
+
+    Data diterima ke dalam satu bytearray yang dipakai ulang. Header dibaca
+    langsung dari buffer (struct.unpack_from) dan payload dikembalikan
+    sebagai memoryview, jadi tidak ada penyalinan per frame. Memoryview
+    payload hanya valid sampai feed()/get_buffer() berikutnya.
+
+    Pemakaian dengan socket (tanpa salinan sama sekali):
+
+        n = sock.recv_into(decoder.get_buffer())
+        decoder.buffer_updated(n)
+        for frame_type, payload in decoder.frames():
+            ...
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE, buffer_size=64 * 1024):
+        self.max_frame_size = max_frame_size
+        self._buf = bytearray(buffer_size)
+        self._start = 0  # awal data yang belum diproses
+        self._end = 0    # akhir data yang sudah diterima
+
+    def pending(self):
+        """Jumlah byte yang sudah diterima tapi belum membentuk frame utuh"""
+        return self._end - self._start
+
+    def _reserve(self, size):
+        """Pastikan ada ruang kosong minimal size byte di akhir buffer"""
+        if len(self._buf) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if pending + size <= len(self._buf):
+            # Geser sisa data ke depan (tanpa resize buffer)
+            self._buf[0:pending] = self._buf[self._start:self._end]
+        else:
+            # Alokasi buffer baru; buffer lama tetap utuh untuk memoryview
+            # yang mungkin masih dipegang pemanggil
+            new_buf = bytearray(max(len(self._buf) * 2, pending + size))
+            new_buf[0:pending] = self._buf[self._start:self._end]
+            self._buf = new_buf
+        self._start = 0
+        self._end = pending
+
+    def get_buffer(self, sizehint=16 * 1024):
+        """Kembalikan memoryview yang bisa ditulis (untuk recv_into)"""
+        self._reserve(sizehint)
+        return memoryview(self._buf)[self._end:]
+
+    def unprocessed(self):
+        """Salinan byte yang belum membentuk frame utuh (untuk handoff.py)"""
+        return bytes(self._buf[self._start:self._end])
+
+    def buffer_updated(self, nbytes):
+        """Tandai nbytes data baru sudah ditulis lewat get_buffer()"""
+        self._end += nbytes
+
+    def feed(self, data):
+        """Masukkan potongan data (bytes) yang diterima dari socket"""
+        n = len(data)
+        self._reserve(n)
+        self._buf[self._end:self._end + n] = data
+        self._end += n
+
+    def frames(self):
+        """Generator (frame_type, payload memoryview) untuk semua frame utuh"""
+        buf = self._buf
+        view = memoryview(buf)
+        while self._end - self._start >= HEADER_SIZE:
+            length, frame_type = HEADER.unpack_from(buf, self._start)
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame terlalu besar: {length} > {self.max_frame_size} byte")
+            body = self._start + HEADER_SIZE
+            if self._end - body < length:
+                break
+            self._start = body + length
+            yield frame_type, view[body:body + length]
+        if self._start == self._end:
+            # Buffer kosong, mulai lagi dari awal
+            self._start = self._end = 0
@@ -0,0 +1,122 @@
+"""Pembatasan laju pesan dan byte masuk dengan token bucket
+
+Setiap koneksi punya bucket pesan dan bucket byte sendiri, ditambah bucket
+global yang dipakai bersama semua koneksi di proses ini (di mode cluster
+batas global berlaku per worker).
+
+Tindakan saat batas terlampaui (RATE_ACTION):
+    delay       berhenti membaca socket client sampai token cukup (default).
+                Selama tidak dibaca, buffer StreamReader dan kernel penuh
+                sehingga TCP menahan pengirim; server tidak menumpuk data.
+    drop        pesan yang melebihi batas dibuang dan pengirim diberi tahu.
+    disconnect  koneksi ditutup.
+
+Batas byte selalu ditegakkan dengan delay (atau disconnect), karena byte
+tidak bisa dibuang sebagian tanpa merusak framing.
+
+Konfigurasi lewat environment (0 = tanpa batas):
+    RATE_MSGS, RATE_MSGS_BURST            pesan/detik per client (default 20, burst 40)
+    RATE_BYTES, RATE_BYTES_BURST          byte/detik per client (default 64 KiB, burst 256 KiB)
+    GLOBAL_RATE_MSGS, GLOBAL_RATE_BYTES   batas total semua client (default 2000 pesan, 8 MiB)
+    FILE_RATE_BYTES                       byte upload file/detik per client (default 8 MiB),
+                                          terpisah dari RATE_BYTES dan selalu delay
+"""
+import os
+import time
+
+ACTION_DELAY = "delay"
+ACTION_DROP = "drop"
+ACTION_DISCONNECT = "disconnect"
+RATE_ACTIONS = (ACTION_DELAY, ACTION_DROP, ACTION_DISCONNECT)
+
+RATE_ACTION = os.environ.get('RATE_ACTION', ACTION_DELAY)
+if RATE_ACTION not in RATE_ACTIONS:
+    RATE_ACTION = ACTION_DELAY
+RATE_MSGS = float(os.environ.get('RATE_MSGS', '20'))
+RATE_MSGS_BURST = float(os.environ.get('RATE_MSGS_BURST', '40'))
+RATE_BYTES = float(os.environ.get('RATE_BYTES', str(64 * 1024)))
+RATE_BYTES_BURST = float(os.environ.get('RATE_BYTES_BURST', str(256 * 1024)))
+GLOBAL_RATE_MSGS = float(os.environ.get('GLOBAL_RATE_MSGS', '2000'))
+GLOBAL_RATE_BYTES = float(os.environ.get('GLOBAL_RATE_BYTES', str(8 * 1024 * 1024)))
+FILE_RATE_BYTES = float(os.environ.get('FILE_RATE_BYTES', str(8 * 1024 * 1024)))
+
+
+class TokenBucket:
+    """Token bucket dengan laju rate token/detik dan kapasitas burst"""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = max(burst or rate, 1.0)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, amount=1.0):
+        """Detik sampai amount token tersedia (0 jika sudah tersedia)"""
+        self._refill()
+        missing = min(amount, self.burst) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def consume(self, amount=1.0):
+        """Ambil token walau sampai minus; kembalikan detik yang harus ditunggu"""
+        self._refill()
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+def _bucket(rate, burst=None):
+    return TokenBucket(rate, burst) if rate > 0 else None
+
+
+# Bucket global bersama semua koneksi (dipakai dari thread event loop)
+global_msgs = _bucket(GLOBAL_RATE_MSGS, GLOBAL_RATE_MSGS)
+global_bytes = _bucket(GLOBAL_RATE_BYTES, GLOBAL_RATE_BYTES)
+
+
+class InboundLimiter:
+    """Batas laju masuk satu koneksi beserta bucket global"""
+
+    __slots__ = ("action", "msgs", "bytes", "files")
+
+    def __init__(self, action=None):
+        self.action = action or RATE_ACTION
+        self.msgs = _bucket(RATE_MSGS, RATE_MSGS_BURST)
+        self.bytes = _bucket(RATE_BYTES, RATE_BYTES_BURST)
+        self.files = _bucket(FILE_RATE_BYTES, FILE_RATE_BYTES)
+
+    def _check(self, buckets, amount, allow_drop):
+        buckets = [b for b in buckets if b is not None]
+        if not buckets:
+            return 0.0
+        if self.action == ACTION_DELAY or (self.action == ACTION_DROP and not allow_drop):
+            # Ambil token (boleh berutang) dan tunggu sampai utangnya lunas
+            return max(b.consume(amount) for b in buckets)
+        wait = max(b.wait_time(amount) for b in buckets)
+        if wait == 0.0:
+            for b in buckets:
+                b.consume(amount)
+        return wait
+
+    def on_bytes(self, nbytes):
+        """Detik jeda sebelum membaca lagi setelah menerima nbytes (0 = lanjut)"""
+        return self._check((self.bytes, global_bytes), nbytes, allow_drop=False)
+
+    def on_file_bytes(self, nbytes):
+        """Seperti on_bytes untuk potongan upload file (FRAME_CHUNK)"""
+        if not nbytes or self.files is None:
+            return 0.0
+        return self.files.consume(nbytes)
+
+    def on_message(self):
+        """0 jika pesan boleh diproses; selain itu detik kekurangan token.
+
+        Pada aksi delay token sudah diambil dan pemanggil cukup menunggu;
+        pada drop/disconnect token tidak diambil dan pesan ditolak.
+        """
+        return self._check((self.msgs, global_msgs), 1.0, allow_drop=True)
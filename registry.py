@@ -0,0 +1,112 @@
+"""Registry koneksi client yang aman dipakai lintas thread
+
+Pengganti list connected_clients. Client disimpan dalam dict dengan key id
+koneksi sehingga add/remove/lookup O(1). Broadcast membaca snapshot berupa
+tuple yang dibangun ulang hanya setelah ada perubahan anggota (copy-on-write),
+jadi iterasi tidak pernah terganggu oleh join/leave di tengah jalan.
+
+Registry juga menyimpan index nickname -> koneksi untuk pesan langsung
+(direct message) tanpa memindai semua client. Client yang belum memakai
+/nick punya nickname default berupa alamat IP yang bisa dipakai beberapa
+koneksi sekaligus; mereka diindex terpisah dan pesan langsung dikirim ke
+salah satunya.
+"""
+import itertools
+import threading
+
+
+class ClientRegistry:
+    """Kumpulan ClientConnection dengan key conn.id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._by_nick = {}
+        self._by_default = {}  # nickname default (alamat IP) -> {id: koneksi}
+        self._snapshot = ()
+        self._dirty = False
+        self._ids = itertools.count(1)
+
+    def add(self, conn):
+        """Daftarkan koneksi dan berikan id unik; mengembalikan id tersebut"""
+        with self._lock:
+            conn.id = next(self._ids)
+            self._clients[conn.id] = conn
+            self._by_default.setdefault(conn.nickname.lower(), {})[conn.id] = conn
+            self._dirty = True
+        return conn.id
+
+    def remove(self, conn_id):
+        """Hapus koneksi berdasarkan id; mengembalikan koneksinya atau None"""
+        with self._lock:
+            conn = self._clients.pop(conn_id, None)
+            if conn is not None:
+                self._dirty = True
+                if self._by_nick.get(conn.nickname.lower()) is conn:
+                    del self._by_nick[conn.nickname.lower()]
+                self._drop_default(conn)
+        return conn
+
+    def _drop_default(self, conn):
+        """Keluarkan conn dari index nickname default (pemanggil memegang _lock)"""
+        key = conn.nickname.lower()
+        group = self._by_default.get(key)
+        if group is not None and group.pop(conn.id, None) is not None and not group:
+            del self._by_default[key]
+
+    def get(self, conn_id):
+        return self._clients.get(conn_id)
+
+    def set_nickname(self, conn, nickname):
+        """Ganti nickname conn; False jika nickname sudah dipakai client lain"""
+        key = nickname.lower()
+        with self._lock:
+            owner = self._by_nick.get(key)
+            if owner is not None and owner is not conn:
+                return False
+            old = conn.nickname.lower()
+            if self._by_nick.get(old) is conn:
+                del self._by_nick[old]
+            self._drop_default(conn)
+            self._by_nick[key] = conn
+            conn.nickname = nickname
+        return True
+
+    def find(self, target):
+        """Cari koneksi berdasarkan nickname atau '#<id>'"""
+        if target.startswith("#") and target[1:].isdigit():
+            return self._clients.get(int(target[1:]))
+        key = target.lower()
+        conn = self._by_nick.get(key)
+        if conn is None and key in self._by_default:
+            with self._lock:
+                group = self._by_default.get(key)
+                if group:
+                    conn = next(iter(group.values()))
+        return conn
+
+    def snapshot(self):
+        """Tuple semua koneksi saat ini; aman diiterasi walau registry berubah"""
+        if self._dirty:
+            with self._lock:
+                if self._dirty:
+                    self._snapshot = tuple(self._clients.values())
+                    self._dirty = False
+        return self._snapshot
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._by_nick.clear()
+            self._by_default.clear()
+            self._snapshot = ()
+            self._dirty = False
+
+    def __contains__(self, conn_id):
+        return conn_id in self._clients
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __iter__(self):
+        return iter(self.snapshot())
@@ -0,0 +1,130 @@
+"""Riwayat pesan terbaru per room di memori untuk replay ke client baru
+
+Setiap room menyimpan ring buffer berisi frame yang sudah di-encode (frame
+FRAME_SEQ + frame teks digabung menjadi satu bytes), jadi replay tidak perlu
+encode ulang dan seluruh replay bisa dikirim sebagai satu write. Nomor urut
+per room bertambah terus sehingga posisi frame di buffer bisa dihitung
+langsung dari nomor urut (delta untuk client yang reconnect tanpa pencarian).
+Nomor urut pertama sebuah room diambil dari jam dalam mikrodetik, jadi tetap
+lebih besar dari nomor lama setelah server restart dan client tidak salah
+menganggap pesan baru sebagai duplikat.
+
+Nomor urut berlaku per proses server; di mode cluster setiap worker punya
+buffer dan penomoran sendiri.
+
+Konfigurasi lewat environment:
+    REPLAY_BUFFER_SIZE  jumlah pesan yang disimpan per room (default 500, 0 = mati)
+    REPLAY_COUNT        jumlah pesan yang di-replay saat masuk room (default 50)
+    REPLAY_MINUTES      hanya replay pesan dari N menit terakhir (default 60, 0 = semua)
+    REPLAY_MAX_ROOMS    jumlah room yang disimpan; room terlama dibuang (default 1024)
+"""
+import collections
+import itertools
+import os
+import time
+
+from protocol import encode_seq
+
+REPLAY_BUFFER_SIZE = int(os.environ.get('REPLAY_BUFFER_SIZE', '500'))
+REPLAY_COUNT = int(os.environ.get('REPLAY_COUNT', '50'))
+REPLAY_MINUTES = float(os.environ.get('REPLAY_MINUTES', '60'))
+REPLAY_MAX_ROOMS = int(os.environ.get('REPLAY_MAX_ROOMS', '1024'))
+
+
+class _RoomBuffer:
+    __slots__ = ("frames", "times", "next_seq")
+
+    def __init__(self, size):
+        self.frames = collections.deque(maxlen=size)
+        self.times = collections.deque(maxlen=size)
+        self.next_seq = time.time_ns() // 1000
+
+    def first_seq(self):
+        return self.next_seq - len(self.frames)
+
+
+class RoomHistory:
+    """Ring buffer frame per room; dipakai hanya dari thread event loop"""
+
+    def __init__(self, size=None, max_rooms=None):
+        self.size = REPLAY_BUFFER_SIZE if size is None else size
+        self.max_rooms = max_rooms or REPLAY_MAX_ROOMS
+        self._rooms = collections.OrderedDict()
+
+    def append(self, room, frame):
+        """Simpan frame teks di room; mengembalikan frame berurut (seq + teks)"""
+        if self.size <= 0:
+            return frame
+        entry = self._rooms.get(room)
+        if entry is None:
+            entry = self._rooms[room] = _RoomBuffer(self.size)
+            if len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        else:
+            self._rooms.move_to_end(room)
+        stored = encode_seq(room, entry.next_seq) + frame
+        entry.frames.append(stored)
+        entry.times.append(time.time())
+        entry.next_seq += 1
+        return stored
+
+    def last_seq(self, room):
+        """Nomor urut pesan terakhir di room (0 jika belum ada)"""
+        entry = self._rooms.get(room)
+        return entry.next_seq - 1 if entry is not None else 0
+
+    def recent(self, room, count=None, minutes=None):
+        """Gabungan frame terakhir (maks count, dalam minutes menit terakhir)"""
+        entry = self._rooms.get(room)
+        if entry is None:
+            return b""
+        count = REPLAY_COUNT if count is None else count
+        minutes = REPLAY_MINUTES if minutes is None else minutes
+        n = min(count, len(entry.frames))
+        if minutes > 0:
+            cutoff = time.time() - minutes * 60
+            times = entry.times
+            # Buffer terurut waktu: hitung mundur sampai melewati cutoff
+            taken = 0
+            while taken < n and times[-1 - taken] >= cutoff:
+                taken += 1
+            n = taken
+        if n <= 0:
+            return b""
+        frames = entry.frames
+        return b"".join(itertools.islice(frames, len(frames) - n, None))
+
+    def since(self, room, seq):
+        """Frame setelah nomor urut seq; (bytes, lengkap?)
+
+        lengkap bernilai False jika sebagian pesan setelah seq sudah
+        tergeser keluar dari buffer.
+        """
+        entry = self._rooms.get(room)
+        if entry is None:
+            return b"", seq <= 0
+        first = entry.first_seq()
+        start = max(seq + 1, first)
+        data = b"".join(itertools.islice(entry.frames, start - first, None))
+        return data, seq + 1 >= first
+
+    def export(self):
+        """Isi buffer sebagai list (room, next_seq, [(waktu, frame), ...]) untuk handoff"""
+        return [(room, entry.next_seq, list(zip(entry.times, entry.frames)))
+                for room, entry in self._rooms.items()]
+
+    def restore(self, rooms):
+        """Kebalikan export(); nomor urut berlanjut dari proses lama"""
+        if self.size <= 0:
+            return
+        for room, next_seq, items in rooms:
+            entry = self._rooms[room] = _RoomBuffer(self.size)
+            entry.next_seq = next_seq
+            for stamp, frame in items:
+                entry.times.append(stamp)
+                entry.frames.append(frame)
+            if len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+
+    def clear(self):
+        self._rooms.clear()
@@ -0,0 +1,89 @@
+"""Index room/channel -> subscriber untuk routing pesan
+
+Pesan biasa hanya dikirim ke anggota room aktif pengirim, jadi biaya satu
+pesan sebanding dengan jumlah anggota room, bukan jumlah seluruh client.
+Setiap room menyimpan dict id -> ClientConnection dan snapshot tuple yang
+dibangun ulang hanya jika anggotanya berubah (sama seperti ClientRegistry).
+"""
+import re
+import threading
+
+DEFAULT_ROOM = "lobby"
+
+# Nama room dan nickname: huruf, angka, '_' atau '-', maksimal 32 karakter
+NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+
+def valid_name(name):
+    return bool(NAME_RE.match(name or ""))
+
+
+class _Room:
+    __slots__ = ("name", "members", "snapshot")
+
+    def __init__(self, name):
+        self.name = name
+        self.members = {}
+        self.snapshot = None
+
+
+class RoomIndex:
+    """Mapping nama room ke anggota; mutasi dilindungi lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}
+
+    def join(self, room, conn):
+        """Masukkan conn ke room; mengembalikan False jika sudah menjadi anggota"""
+        with self._lock:
+            entry = self._rooms.get(room)
+            if entry is None:
+                entry = self._rooms[room] = _Room(room)
+            if conn.id in entry.members:
+                return False
+            entry.members[conn.id] = conn
+            entry.snapshot = None
+        conn.rooms.add(room)
+        return True
+
+    def leave(self, room, conn):
+        """Keluarkan conn dari room; room kosong dihapus dari index"""
+        with self._lock:
+            entry = self._rooms.get(room)
+            if entry is None or entry.members.pop(conn.id, None) is None:
+                return False
+            entry.snapshot = None
+            if not entry.members:
+                del self._rooms[room]
+        conn.rooms.discard(room)
+        return True
+
+    def leave_all(self, conn):
+        """Keluarkan conn dari semua room (saat disconnect)"""
+        for room in list(conn.rooms):
+            self.leave(room, conn)
+
+    def members(self, room):
+        """Tuple anggota room; aman diiterasi walau ada join/leave"""
+        entry = self._rooms.get(room)
+        if entry is None:
+            return ()
+        snapshot = entry.snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = entry.snapshot = tuple(entry.members.values())
+        return snapshot
+
+    def count(self, room):
+        entry = self._rooms.get(room)
+        return len(entry.members) if entry is not None else 0
+
+    def rooms(self):
+        """Daftar (nama room, jumlah anggota) terurut berdasarkan nama"""
+        with self._lock:
+            return sorted((name, len(entry.members)) for name, entry in self._rooms.items())
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
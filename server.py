@@ -4,127 +4,813 @@ import datetime
 import os
 import signal
 import sys
-import queue
-try:
-    import tkinter as tk
-    from tkinter import ttk, messagebox
-    from tkinter.scrolledtext import ScrolledText
-except Exception:
-    tk = None
+import asyncio
+import concurrent.futures
+import time
+from protocol import (FrameDecoder, FRAME_TEXT, FRAME_HELLO, FRAME_PING, FRAME_PONG,
+                      FRAME_FILE, FRAME_CHUNK, COMPRESSION_ZLIB, encode_text, decode_text,
+                      compress_frames, encode_hello, decode_hello, encode_ping, encode_pong,
+                      encode_file, decode_file, decode_chunk, encode_busy, encode_replay)
+from connection import ClientConnection
+from chatlog import ChatLogWriter
+from registry import ClientRegistry
+from rooms import RoomIndex, DEFAULT_ROOM, valid_name
+from replay import RoomHistory
+import metrics as metrics_mod
+import events as events_mod
+from logview import BatchedLogView
+from ratelimit import InboundLimiter, ACTION_DELAY, ACTION_DROP, FILE_RATE_BYTES
+from timerwheel import TimerWheel
+from presence import PresenceService, PRESENCE_INTERVAL
+from files import FileStore, FILE_MAX_SIZE, FILE_CHUNK_SIZE, write_chunk, format_size
+from admission import AdmissionControl, LISTEN_BACKLOG, BUSY_LINGER
+import handoff
+
+# tkinter baru diimpor saat GUI dijalankan (load_tk), tidak di mode daemon
+tk = ttk = messagebox = ScrolledText = None
+
+def load_tk():
+    """Impor tkinter untuk GUI; False jika tidak tersedia"""
+    global tk, ttk, messagebox, ScrolledText
+    if tk is not None:
+        return True
+    try:
+        import tkinter
+        from tkinter import ttk as _ttk, messagebox as _messagebox
+        from tkinter.scrolledtext import ScrolledText as _ScrolledText
+    except Exception:
+        return False
+    tk, ttk, messagebox, ScrolledText = tkinter, _ttk, _messagebox, _ScrolledText
+    return True
 
 # Gunakan HOST/PORT dari environment bila ada; default ke semua interface
 HOST = os.environ.get('HOST', '0.0.0.0')
 PORT = int(os.environ.get('PORT', '8081'))
+# Jumlah proses worker; > 1 menjalankan mode multi-proses (cluster.py)
+WORKERS = int(os.environ.get('WORKERS', '1'))
+# Kompresi yang boleh dinegosiasikan client ('zlib' atau 'none')
+COMPRESSION = os.environ.get('COMPRESSION', COMPRESSION_ZLIB)
+# Heartbeat: PING dikirim setelah HEARTBEAT_INTERVAL detik tanpa data dari
+# client, koneksi ditutup jika PONG tidak datang dalam HEARTBEAT_TIMEOUT detik.
+# Client lama (tanpa heartbeat=1 di HELLO) hanya diawasi TCP keepalive.
+# HEARTBEAT_INTERVAL=0 mematikan heartbeat.
+HEARTBEAT_INTERVAL = float(os.environ.get('HEARTBEAT_INTERVAL', '30'))
+HEARTBEAT_TIMEOUT = float(os.environ.get('HEARTBEAT_TIMEOUT', '10'))
+HEARTBEAT_TICK = float(os.environ.get('HEARTBEAT_TICK', '1'))
+# Saat shutdown: detik maksimal menunggu antrean keluar client terkirim
+DRAIN_TIMEOUT = float(os.environ.get('DRAIN_TIMEOUT', '5'))
+# File yang dibuat saat server siap menerima koneksi (dihapus saat berhenti)
+READY_FILE = os.environ.get('READY_FILE', '')
+
+# Direktori log; dibuat writer saat record pertama ditulis
+LOG_DIR = os.environ.get('LOG_DIR', 'chat_logs')
+
+# Writer log di background; file harian tetap terbuka
+chat_log = ChatLogWriter(LOG_DIR, "chat_history")
+
+# Registry semua client yang terhubung (id -> ClientConnection)
+client_registry = ClientRegistry()
+# Index room -> anggota untuk routing pesan
+room_index = RoomIndex()
+# Ring buffer pesan terbaru per room untuk replay ke client baru/reconnect
+room_history = RoomHistory()
+# File yang dibagikan client (files.py); id file -> koneksi yang sedang mengupload
+file_store = FileStore()
+active_uploads = {}
+# Daftar user online untuk client yang berlangganan FRAME_PRESENCE
+presence = PresenceService()
+# Satu timer wheel untuk pemeriksaan idle semua koneksi (thread event loop)
+timer_wheel = TimerWheel(tick=HEARTBEAT_TICK)
+# Batas koneksi per proses dan per IP (admission.py)
+admission = AdmissionControl()
+# Set task asyncio untuk setiap client
+client_tasks = set()
+# Koneksi yang sudah di-accept tapi handler-nya belum berjalan (handoff.py)
+pending_clients = 0
+# Status server (hanya dibaca, tidak di-poll oleh loop)
+server_running = False
 
-# Buat direktori untuk menyimpan log 
-LOG_DIR = "chat_logs"
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+# Metrik hot path; dibaca lewat endpoint HTTP (metrics.py) dan GUI
+metrics = metrics_mod.MetricsRegistry()
+m_accepted = metrics.counter("chat_connections_accepted_total", "Koneksi client yang diterima")
+m_rejected = metrics.counter("chat_connections_rejected_total",
+                             "Koneksi yang ditolak dengan FRAME_BUSY karena batas koneksi")
+m_recv_bytes = metrics.counter("chat_recv_bytes_total", "Byte yang diterima dari client")
+m_frames_in = metrics.counter("chat_frames_received_total", "Frame yang diterima dari client")
+m_deliveries = metrics.counter("chat_deliveries_total", "Frame yang masuk antrean keluar client")
+m_send_failures = metrics.counter("chat_send_failures_total",
+                                  "Pengiriman gagal karena antrean penuh atau koneksi tertutup")
+m_rate_limited = metrics.counter("chat_rate_limited_total",
+                                 "Pesan/bacaan client yang ditahan, dibuang atau diputus karena batas laju")
+m_fanout = metrics.histogram("chat_broadcast_fanout_seconds",
+                             "Waktu memasukkan satu frame ke antrean semua penerima")
+m_compress_saved = metrics.counter("chat_compression_saved_bytes_total",
+                                   "Byte yang dihemat dengan FRAME_COMPRESSED")
+m_heartbeat_timeouts = metrics.counter("chat_heartbeat_timeouts_total",
+                                       "Koneksi yang ditutup karena PING tidak dibalas")
+m_file_bytes = metrics.counter("chat_file_upload_bytes_total", "Byte file yang diterima dari client")
+m_file_uploads = metrics.counter("chat_file_uploads_total", "Upload file yang selesai")
+m_file_downloads = metrics.counter("chat_file_downloads_total", "Download file yang dimulai")
+m_log_write = metrics.histogram("chat_log_write_seconds", "Waktu menulis satu batch log ke disk")
+metrics.gauge("chat_connections_active", "Client yang sedang terhubung",
+              lambda: len(client_registry))
+metrics.gauge("chat_connections_limit", "Batas koneksi proses ini (0 = tanpa batas)",
+              lambda: admission.max_clients or 0)
+metrics.gauge("chat_presence_online", "User online (nickname unik) di daftar presence",
+              lambda: len(presence))
+metrics.gauge("chat_outbound_queue_frames", "Total frame di antrean keluar semua client",
+              lambda: sum(c.queue_depth() for c in client_registry.snapshot()))
+metrics.gauge("chat_log_queue_pending", "Record log yang belum ditulis ke disk",
+              lambda: chat_log.pending())
+metrics.gauge("chat_log_records_dropped", "Record log yang dibuang karena antrean penuh",
+              lambda: chat_log.dropped)
+metrics.gauge("chat_events_dropped", "Event console/GUI yang dibuang karena sink tertinggal",
+              lambda: events.dropped)
+chat_log.write_observer = m_log_write.observe
 
-# List untuk menyimpan semua client yang terhubung
-connected_clients = []
-# List untuk menyimpan semua thread client
-client_threads = []
-# Flag untuk mengontrol server
-server_running = True
+# Event loop dan task utama server, dipakai untuk shutdown via cancellation
+_loop = None
+_server_task = None
+_server_stopped = threading.Event()
+_server_stopped.set()
+# Listening server asyncio aktif; diganti handoff.py jika serah terima gagal
+_listener = None
+# Endpoint metrik proses ini (None jika mati atau mode cluster)
+_metrics_http = None
+# True jika listening socket dan client sudah diambil alih proses baru
+_handed_off = False
+# Waktu log penolakan terakhir; lonjakan koneksi tidak membanjiri log
+_busy_logged = 0.0
 
-# Queue untuk mengirim log dari thread server ke GUI
-log_queue = queue.Queue()
+# Bus antar worker (diisi cluster.py di proses worker) dan master cluster
+# (diisi cluster.serve_master di proses induk)
+cluster_bus = None
+cluster_master = None
+# True jika ServerControlGUI aktif; worker meneruskan log ke GUI master
+gui_attached = False
 
-def enqueue_log(text: str):
+# Event server untuk console, GUI, file dan master cluster (events.py).
+# Sink dipasang oleh start_server()/GUI; tanpa sink emit tidak berbiaya.
+events = events_mod.EventBus()
+_console_sink = None
+
+def log_event(text, level=events_mod.INFO):
+    events.emit(level, text)
+
+def _setup_event_sinks():
+    """Pasang sink console/file (sekali per proses) dan penerus ke master cluster"""
+    global _console_sink
+    if _console_sink is None:
+        _console_sink = events_mod.console_sink()
+        if events_mod.EVENT_LEVEL < events_mod.OFF:
+            # Event dari worker sudah dicetak oleh worker itu sendiri
+            events.add_sink(_console_sink, events_mod.EVENT_LEVEL, local_only=True)
+        if events_mod.EVENT_FILE:
+            try:
+                events.add_sink(events_mod.FileSink(events_mod.EVENT_FILE), events_mod.EVENT_LEVEL)
+            except OSError as e:
+                print(f"[EVENTS] EVENT_FILE tidak bisa dibuka: {e}")
+    if cluster_bus is not None and cluster_bus.forward_logs and not events.has_sink(cluster_bus.forward_events):
+        # Worker: teruskan event ke GUI master dalam batch
+        events.add_sink(cluster_bus.forward_events, events_mod.DEBUG)
+
+def log_message(client_addr, message, message_type="RECEIVED"):
+    """Fungsi untuk menyimpan log percakapan (tidak menunggu disk)"""
+    chat_log.write_record(client_addr, message_type, message)
+
+def drop_client(client_conn):
+    """Hapus client dari registry dan tutup koneksinya"""
+    client_registry.remove(client_conn.id)
+    room_index.leave_all(client_conn)
     try:
-        log_queue.put(text)
+        client_conn.close()
     except Exception:
         pass
 
-def log_message(client_addr, message, message_type="RECEIVED"):
-    """Fungsi untuk menyimpan log percakapan"""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_file = os.path.join(LOG_DIR, f"chat_history_{datetime.datetime.now().strftime('%Y-%m-%d')}.txt")
-    
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"[{timestamp}] {client_addr} - {message_type}: {message}\n")
+def fan_out(frame, targets=None, exclude=None):
+    """Masukkan satu frame (bytes yang sama) ke antrean client tujuan.
+
+    targets default ke semua client di registry. send() hanya memasukkan
+    frame ke antrean client, jadi client lambat tidak menahan yang lain.
+    Versi terkompresi dibuat paling banyak sekali, hanya jika ada penerima
+    yang menegosiasikan kompresi. Mengembalikan jumlah client penerima.
+    """
+    if targets is None:
+        targets = client_registry.snapshot()
+    started = time.perf_counter()
+    delivered = 0
+    packed = None
+    for client_conn in targets:
+        if client_conn is exclude:
+            continue
+        out = frame
+        if client_conn.compress:
+            if packed is None:
+                packed = compress_frames(frame) or frame
+            out = packed
+            m_compress_saved.inc(len(frame) - len(packed))
+        if client_conn.send(out):
+            delivered += 1
+        else:
+            # Antrean penuh (kebijakan disconnect) atau koneksi tertutup
+            m_send_failures.inc()
+            drop_client(client_conn)
+    m_fanout.observe(time.perf_counter() - started)
+    m_deliveries.inc(delivered)
+    return delivered
+
+def deliver_room(room, frame, exclude=None):
+    """Simpan frame teks di riwayat room lalu kirim ke anggota lokal room"""
+    stored = room_history.append(room, frame)
+    return fan_out(stored, room_index.members(room), exclude=exclude)
 
-def broadcast_message(message, sender_addr, sender_conn):
-    """Fungsi untuk mengirim pesan ke semua client kecuali pengirim"""
+def broadcast_message(message, sender_addr, sender_conn, room=None):
+    """Fungsi untuk mengirim pesan ke anggota room kecuali pengirim"""
+    room = room or sender_conn.room or DEFAULT_ROOM
     timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-    formatted_message = f"[{timestamp}] {sender_addr[0]}: {message}"
+    if room == DEFAULT_ROOM:
+        formatted_message = f"[{timestamp}] {sender_conn.nickname}: {message}"
+    else:
+        formatted_message = f"[{timestamp}] #{room} {sender_conn.nickname}: {message}"
     
-    # Kirim ke semua client kecuali pengirim
-    for client_conn, client_addr in connected_clients:
-        if client_conn != sender_conn:
-            try:
-                client_conn.send(formatted_message.encode())
-            except:
-                # Jika gagal kirim, hapus client dari list
-                connected_clients.remove((client_conn, client_addr))
-                client_conn.close()
+    # Encode sekali, kirim hanya ke anggota room kecuali pengirim
+    frame = encode_text(formatted_message)
+    deliver_room(room, frame, exclude=sender_conn)
+    if cluster_bus is not None:
+        # Anggota room di worker lain
+        cluster_bus.publish_room(room, frame)
     
     # Log broadcast
-    log_message(sender_addr, f"BROADCAST: {message}", "BROADCAST")
+    if room == DEFAULT_ROOM:
+        log_message(sender_addr, f"BROADCAST: {message}", "BROADCAST")
+    else:
+        log_message(sender_addr, f"BROADCAST #{room}: {message}", "BROADCAST")
 
-def handle_client(conn, addr):
-    """Fungsi untuk menangani setiap client"""
-    print(f"[NEW CONNECTION] {addr} connected")
-    enqueue_log(f"[NEW CONNECTION] {addr} connected")
-    log_message(addr, "CLIENT CONNECTED", "SYSTEM")
-    
-    # Tambahkan client ke list
-    connected_clients.append((conn, addr))
-    print(f"[ACTIVE CONNECTIONS] {len(connected_clients)}")
-    enqueue_log(f"[ACTIVE CONNECTIONS] {len(connected_clients)}")
-    
-    # Kirim notifikasi ke semua client bahwa ada client baru
-    broadcast_message(f"User {addr[0]} joined the chat", addr, conn)
-    
+def send_system(conn, message):
+    """Kirim pesan SERVER hanya ke satu client"""
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    if not conn.send_compressible(encode_text(f"[{timestamp}] SERVER: {message}")):
+        m_send_failures.inc()
+        drop_client(conn)
+
+def send_direct(sender_conn, target, message):
+    """Jalur cepat pesan langsung: lookup O(1) dan satu frame ke satu client"""
+    target_conn = client_registry.find(target)
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    frame = encode_text(f"[{timestamp}] (DM) {sender_conn.nickname}: {message}")
+    if target_conn is None:
+        if cluster_bus is not None and presence.is_remote(target):
+            # Online di worker lain (daftar presence dari bus)
+            cluster_bus.publish_direct(target, frame)
+            log_message(sender_conn.addr, f"DM to {target}: {message}", "DIRECT")
+            return True
+        send_system(sender_conn, f"User '{target}' tidak ditemukan")
+        return False
+    if not target_conn.send_compressible(frame):
+        m_send_failures.inc()
+        drop_client(target_conn)
+        return False
+    log_message(sender_conn.addr, f"DM to {target_conn.nickname}: {message}", "DIRECT")
+    return True
+
+def replay_history(conn, room):
+    """Kirim pesan terbaru room ke conn sebagai satu write"""
+    data = room_history.recent(room)
+    if not data:
+        return
+    # Penanda: pesan room sampai nomor urut terakhir ini adalah riwayat
+    data = encode_replay(room, room_history.last_seq(room)) + data
+    if not conn.send_compressible(data):
+        drop_client(conn)
+
+def resume_room(conn, room, seq):
+    """Kirim hanya pesan room setelah nomor urut seq (client reconnect)"""
+    if room not in conn.rooms:
+        join_room(conn, room, replay=False)
+    data, complete = room_history.since(room, seq)
+    if not complete:
+        send_system(conn, f"Sebagian riwayat #{room} sudah tidak tersedia")
+    if data and not conn.send_compressible(data):
+        drop_client(conn)
+
+def handle_hello(conn, payload):
+    """Negosiasi opsi koneksi (FRAME_HELLO): kompresi, heartbeat dan presence"""
+    options = decode_hello(payload)
+    conn.compress = options.get("compress") == COMPRESSION_ZLIB == COMPRESSION
+    conn.heartbeat = options.get("heartbeat") == "1"
+    reply = encode_hello(compress=COMPRESSION_ZLIB if conn.compress else "none")
+    if not conn.send(reply):
+        drop_client(conn)
+        return
+    if options.get("presence") == "1" and not conn.presence:
+        # Snapshot daftar online sekali; setelah itu hanya delta
+        conn.presence = True
+        if not conn.send_compressible(presence.subscribe(conn)):
+            drop_client(conn)
+
+def join_room(conn, room, replay=True, announce=True):
+    """Masukkan client ke room dan jadikan room aktifnya.
+
+    announce=False untuk connect: kedatangan user dikirim lewat presence.
+    """
+    if room_index.join(room, conn):
+        if replay:
+            replay_history(conn, room)
+        if announce:
+            broadcast_message(f"User {conn.nickname} joined the chat", conn.addr, conn, room)
+    conn.room = room
+
+def leave_room(conn, room):
+    """Keluarkan client dari room; room aktif kembali ke room lain/lobby"""
+    if not room_index.leave(room, conn):
+        return False
+    broadcast_message(f"User {conn.nickname} left the chat", conn.addr, conn, room)
+    if conn.room == room:
+        if conn.rooms:
+            conn.room = sorted(conn.rooms)[0]
+        else:
+            join_room(conn, DEFAULT_ROOM)
+    return True
+
+def send_file_control(conn, **fields):
+    if not conn.send(encode_file(**fields)):
+        drop_client(conn)
+
+def _release_upload(file_id):
+    """Tutup upload file_id di koneksi lain (client menyambung ulang lalu melanjutkan)"""
+    owner = active_uploads.pop(file_id, None)
+    if owner is not None:
+        upload = owner.uploads.pop(file_id, None)
+        if upload is not None:
+            upload.file.close()
+
+def _start_upload(conn, fields):
+    """op=put: upload baru (name, size) atau lanjutan (id, token); balas op=ready
+    dengan offset dan rate (ditambah token untuk upload baru)"""
+    reply = {}
+    if "id" in fields:
+        file_id = int(fields["id"], 16)
+        # Hanya pengupload yang menerima token dari op=ready
+        if not file_store.check_token(file_id, fields.get("token")):
+            raise ValueError(f"Upload {file_id:08x} tidak ditemukan atau token salah")
+        meta = file_store.meta(file_id)
+        if meta["complete"]:
+            # Selesai sebelum koneksi client putus; cukup konfirmasi
+            send_file_control(conn, op="ready", ref=fields.get("ref", ""), id=fields["id"],
+                              offset=meta["size"])
+            send_file_control(conn, op="done", id=fields["id"])
+            return
+    else:
+        size = int(fields.get("size", "-1"))
+        if not 0 <= size <= FILE_MAX_SIZE:
+            raise ValueError(f"Ukuran file harus 0..{format_size(FILE_MAX_SIZE)}")
+        file_id, token = file_store.create(fields.get("name", ""), size, conn.nickname)
+        reply["token"] = token
+    _release_upload(file_id)
+    upload = file_store.open_upload(file_id)
+    if upload is None:
+        raise ValueError(f"Upload {file_id:08x} tidak ditemukan atau sudah selesai")
+    conn.uploads[file_id] = upload
+    active_uploads[file_id] = conn
+    # rate: client menjaga laju kirimnya sendiri agar pesan chat tidak antre
+    # di belakang potongan yang tertahan di buffer socket
+    send_file_control(conn, op="ready", ref=fields.get("ref", ""), id=f"{file_id:08x}",
+                      offset=upload.received, rate=int(FILE_RATE_BYTES), **reply)
+    if upload.received >= upload.size:
+        _finish_upload(conn, upload)
+
+def _finish_upload(conn, upload):
+    """Upload lengkap: simpan dan umumkan ke room aktif pengirim"""
+    conn.uploads.pop(upload.id, None)
+    active_uploads.pop(upload.id, None)
+    file_store.finish_upload(upload)
+    m_file_uploads.inc()
+    file_id = f"{upload.id:08x}"
+    send_file_control(conn, op="done", id=file_id)
+    log_event(f"[FILE] {conn.addr} mengupload {upload.name} ({format_size(upload.size)}) sebagai {file_id}")
+    broadcast_message(f"membagikan file {upload.name} ({format_size(upload.size)}), "
+                      f"unduh dengan /get {file_id}", conn.addr, conn)
+
+def queue_download(conn, file_id, offset, announce=True):
+    """Antre isi file_id mulai offset ke conn; False jika file tidak ada.
+
+    announce=False saat melanjutkan download yang metadatanya sudah dikirim.
+    """
+    meta, f = file_store.open_download(file_id)
+    if meta is None:
+        return False
+    offset = min(max(offset, 0), meta["size"])
+    if announce:
+        send_file_control(conn, op="meta", id=f"{file_id:08x}", name=meta["name"],
+                          size=meta["size"], offset=offset)
+    conn.send_file(file_id, f, offset, meta["size"], FILE_CHUNK_SIZE,
+                   encode_file(op="end", id=f"{file_id:08x}"))
+    return True
+
+def _start_download(conn, fields):
+    """op=get: kirim isi file mulai offset sebagai FRAME_CHUNK berprioritas rendah"""
+    file_id = int(fields["id"], 16)
+    if not queue_download(conn, file_id, int(fields.get("offset", "0"))):
+        raise ValueError(f"File {file_id:08x} tidak ditemukan")
+    m_file_downloads.inc()
+
+def handle_file(conn, payload):
+    """Perintah kontrol transfer file (FRAME_FILE): put, get, cancel"""
+    fields = decode_file(payload)
+    op = fields.get("op")
+    try:
+        if op == "put":
+            _start_upload(conn, fields)
+        elif op == "get":
+            _start_download(conn, fields)
+        elif op == "cancel":
+            conn.cancel_file(int(fields["id"], 16))
+        else:
+            raise ValueError(f"Perintah file tidak dikenal: {op}")
+    except (OSError, ValueError, KeyError) as e:
+        send_file_control(conn, op="error", ref=fields.get("ref", ""), id=fields.get("id", ""),
+                          reason=str(e))
+
+async def handle_chunk(conn, payload):
+    """Potongan upload (FRAME_CHUNK); ditulis ke disk di thread executor"""
+    file_id, offset, data = decode_chunk(payload)
+    upload = conn.uploads.get(file_id)
+    if upload is None:
+        # Mis. setelah server restart: client melanjutkan dengan op=put id=...
+        send_file_control(conn, op="error", id=f"{file_id:08x}", reason="Upload tidak aktif")
+        return
+    if offset != upload.received or offset + len(data) > upload.size:
+        # Potongan lama yang masih di jalan setelah client melanjutkan upload
+        return
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, write_chunk, upload, data)
+    except (OSError, ValueError) as e:
+        # Disk penuh, atau file ditutup karena upload dilanjutkan di koneksi lain
+        if conn.uploads.get(file_id) is upload:
+            conn.uploads.pop(file_id)
+            active_uploads.pop(file_id, None)
+            upload.file.close()
+            send_file_control(conn, op="error", id=f"{file_id:08x}", reason=str(e))
+        return
+    if conn.uploads.get(file_id) is not upload:
+        return
+    upload.received += len(data)
+    m_file_bytes.inc(len(data))
+    if upload.received == upload.size:
+        _finish_upload(conn, upload)
+
+COMMAND_HELP = ("Perintah: /join <room>, /leave [room], /rooms, "
+                "/msg <nick|#id> <pesan>, /nick <nama>, /resume <seq> [room], /help")
+
+def handle_command(conn, text):
+    """Proses perintah protokol (/join, /leave, /rooms, /msg, /nick, /resume)"""
+    parts = text.split(" ", 2)
+    cmd = parts[0].lower()
+    if cmd == "/join" and len(parts) >= 2:
+        room = parts[1]
+        if not valid_name(room):
+            send_system(conn, f"Nama room tidak valid: {room}")
+        else:
+            join_room(conn, room)
+            send_system(conn, f"Masuk ke #{room} ({room_index.count(room)} anggota)")
+    elif cmd == "/leave":
+        room = parts[1] if len(parts) >= 2 else conn.room
+        if leave_room(conn, room):
+            send_system(conn, f"Keluar dari #{room}; room aktif #{conn.room}")
+        else:
+            send_system(conn, f"Anda bukan anggota #{room}")
+    elif cmd == "/rooms":
+        listing = ", ".join(f"#{name} ({count})" for name, count in room_index.rooms())
+        send_system(conn, f"Room: {listing or '(kosong)'}")
+    elif cmd == "/msg" and len(parts) == 3:
+        send_direct(conn, parts[1], parts[2])
+    elif cmd == "/nick" and len(parts) >= 2:
+        nickname = parts[1]
+        if not valid_name(nickname):
+            send_system(conn, f"Nickname tidak valid: {nickname}")
+        else:
+            old = conn.nickname
+            if client_registry.set_nickname(conn, nickname):
+                presence.rename(old, nickname)
+                send_system(conn, f"Nickname sekarang {nickname}")
+            else:
+                send_system(conn, f"Nickname {nickname} sudah dipakai")
+    elif cmd == "/resume" and len(parts) >= 2 and parts[1].isdigit():
+        room = parts[2].strip() if len(parts) == 3 else conn.room
+        if not valid_name(room):
+            send_system(conn, f"Nama room tidak valid: {room}")
+        else:
+            resume_room(conn, room, int(parts[1]))
+    else:
+        send_system(conn, COMMAND_HELP)
+
+def _check_idle(conn, now):
+    """Dipanggil saat timer koneksi jatuh tempo; jadwalkan ulang atau tutup"""
+    if conn.closed:
+        return
+    if conn.ping_sent:
+        if now - conn.ping_sent >= HEARTBEAT_TIMEOUT:
+            m_heartbeat_timeouts.inc()
+            log_event(f"[HEARTBEAT] {conn.addr} tidak membalas PING, koneksi ditutup", events_mod.WARNING)
+            conn.close()
+            return
+        timer_wheel.schedule(conn, HEARTBEAT_TIMEOUT - (now - conn.ping_sent))
+        return
+    idle = now - conn.last_seen
+    if idle < HEARTBEAT_INTERVAL:
+        timer_wheel.schedule(conn, HEARTBEAT_INTERVAL - idle)
+    elif conn.heartbeat:
+        conn.ping_sent = now
+        if not conn.send(encode_ping()):
+            drop_client(conn)
+            return
+        timer_wheel.schedule(conn, HEARTBEAT_TIMEOUT)
+    else:
+        # Client lama tidak mengenal PING; andalkan TCP keepalive
+        timer_wheel.schedule(conn, HEARTBEAT_INTERVAL)
+
+async def _heartbeat_loop():
+    """Satu task untuk semua koneksi: majukan timer wheel setiap tick"""
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time() + timer_wheel.tick
+    while True:
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        # Jika loop sempat tertahan, kejar tick yang terlewat
+        while next_tick <= loop.time():
+            next_tick += timer_wheel.tick
+            now = time.monotonic()
+            for conn in timer_wheel.advance():
+                _check_idle(conn, now)
+
+def flush_presence():
+    """Kirim delta presence ke subscriber dan perubahan lokal ke worker lain"""
+    frame, (added, removed) = presence.flush()
+    if frame:
+        fan_out(frame, list(presence.subscribers.values()))
+    if cluster_bus is not None and (added or removed):
+        cluster_bus.publish_presence(added, removed)
+
+async def _presence_loop():
+    while True:
+        await asyncio.sleep(PRESENCE_INTERVAL)
+        flush_presence()
+
+def _set_keepalive(writer):
+    """Aktifkan TCP keepalive sebagai cadangan untuk client tanpa heartbeat"""
+    sock = writer.get_extra_info("socket")
+    if sock is None:
+        return
     try:
-        while server_running:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        idle = int(max(HEARTBEAT_INTERVAL, 1))
+        for name, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", idle),
+                            ("TCP_KEEPCNT", 3)):
+            if hasattr(socket, name):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+    except OSError:
+        pass
+
+async def _frames(conn, decoder):
+    """decoder.frames() yang berhenti di batas frame selama conn ditahan handoff.py
+    (proses lama saat serah terima, proses baru sampai semua client dipulihkan).
+
+    Frame berikutnya belum diambil dari decoder saat menunggu, jadi byte-nya
+    ikut diserahkan ke proses baru (decoder.unprocessed()).
+    """
+    frames = decoder.frames()
+    while True:
+        while conn.hold is not None:
+            hold = conn.hold
+            conn.parked = True
             try:
-                # Set timeout untuk recv agar bisa check server_running flag
-                conn.settimeout(1.0)
-                data = conn.recv(1024).decode()
-                if not data:
-                    break
+                await hold
+            finally:
+                conn.parked = False
+            if conn.hold is hold:
+                conn.hold = None
+        try:
+            frame = next(frames)
+        except StopIteration:
+            return
+        yield frame
+
+async def _discard_input(reader):
+    while await reader.read(64 * 1024):
+        pass
+
+async def reject_client(reader, writer, addr, reason, retry_after):
+    """Tolak koneksi dengan FRAME_BUSY tanpa membuat ClientConnection"""
+    global _busy_logged
+    m_rejected.inc()
+    now = time.monotonic()
+    if now - _busy_logged >= 1.0:
+        _busy_logged = now
+        log_event(f"[BUSY] Koneksi {addr} ditolak ({reason}), "
+                  f"{admission.active} koneksi aktif", events_mod.WARNING)
+    task = asyncio.current_task()
+    client_tasks.add(task)
+    try:
+        writer.write(encode_busy(retry_after, reason))
+        writer.write_eof()
+        # Menutup socket yang masih berisi data masuk membuat kernel mengirim
+        # RST, dan FRAME_BUSY bisa hilang sebelum dibaca client; buang data
+        # masuk sampai client menutup koneksinya
+        await asyncio.wait_for(_discard_input(reader), BUSY_LINGER)
+    except (OSError, asyncio.TimeoutError, asyncio.CancelledError):
+        pass
+    finally:
+        client_tasks.discard(task)
+        writer.close()
+
+def accept_client(reader, writer):
+    """Callback listening server: catat koneksi baru sebelum handler-nya berjalan"""
+    global pending_clients
+    pending_clients += 1
+    return _accepted_client(reader, writer)
+
+async def _accepted_client(reader, writer):
+    global pending_clients
+    pending_clients -= 1
+    # Admission sampai masuk registry berjalan tanpa await
+    await handle_client(reader, writer)
+
+async def handle_client(reader, writer, state=None):
+    """Fungsi untuk menangani setiap client (satu coroutine per koneksi).
+
+    state: status client dari proses lama saat handoff (handoff.py); client
+    dipulihkan tanpa notifikasi join dan tanpa replay.
+    """
+    addr = writer.get_extra_info("peername")
+    if state is None:
+        # Diperiksa sebelum koneksi memakan memori, registry dan room
+        busy = admission.admit(addr)
+        if busy is not None:
+            await reject_client(reader, writer, addr, *busy)
+            return
+    else:
+        # Sudah diterima proses lama
+        admission.add(addr)
+    # Slot dilepas walau persiapan koneksi di bawah gagal
+    try:
+        await _serve_client(reader, writer, addr, state)
+    finally:
+        admission.release(addr)
+
+async def _serve_client(reader, writer, addr, state):
+    """Isi handle_client setelah koneksi diterima admission control"""
+    conn = ClientConnection(writer, addr)
+    conn.start()
+    _set_keepalive(writer)
+    if HEARTBEAT_INTERVAL > 0:
+        timer_wheel.schedule(conn, HEARTBEAT_INTERVAL)
+    task = asyncio.current_task()
+    client_tasks.add(task)
+    # Decoder frame per koneksi; satu read bisa berisi banyak frame
+    decoder = FrameDecoder()
+    conn.reader = reader
+    conn.decoder = decoder
+
+    if state is not None:
+        handoff.restore_client(sys.modules[__name__], conn, state)
+    else:
+        m_accepted.inc()
+        log_event(f"[NEW CONNECTION] {addr} connected")
+        log_message(addr, "CLIENT CONNECTED", "SYSTEM")
+        
+        # Tambahkan client ke registry
+        client_registry.add(conn)
+        presence.connect(conn.nickname)
+        log_event(f"[ACTIVE CONNECTIONS] {len(client_registry)}")
+        
+        # Masuk ke room default; kedatangan client dikirim lewat delta presence
+        join_room(conn, DEFAULT_ROOM, announce=False)
+    
+    # Token bucket pesan/byte masuk (per koneksi + global)
+    limiter = InboundLimiter()
+    last_notice = 0.0
+    try:
+        while not conn.closed:
+            # Tidak perlu timeout: coroutine tidur sampai ada data atau dibatalkan
+            conn.parked = True
+            chunk = await reader.read(64 * 1024)
+            conn.parked = False
+            if not chunk:
+                break
+            conn.bytes_in += len(chunk)
+            m_recv_bytes.inc(len(chunk))
+            # Byte upload file dibatasi bucket terpisah dari byte chat
+            file_bytes = 0
+            # Data apa pun membuktikan client hidup
+            conn.last_seen = time.monotonic()
+            conn.ping_sent = 0.0
+            decoder.feed(chunk)
+            
+            async for frame_type, payload in _frames(conn, decoder):
+                m_frames_in.inc()
+                if frame_type == FRAME_HELLO:
+                    handle_hello(conn, payload)
+                    continue
+                if frame_type == FRAME_PING:
+                    conn.send(encode_pong(payload))
+                    continue
+                if frame_type == FRAME_PONG:
+                    # Liveness sudah dicatat lewat last_seen
+                    continue
+                if frame_type == FRAME_CHUNK:
+                    file_bytes += len(payload)
+                    await handle_chunk(conn, payload)
+                    continue
+                if frame_type == FRAME_FILE:
+                    handle_file(conn, payload)
+                    continue
+                if frame_type != FRAME_TEXT:
+                    continue
+                data = decode_text(payload)
+                
+                wait = limiter.on_message()
+                if wait:
+                    m_rate_limited.inc()
+                    conn.throttled += 1
+                    if limiter.action == ACTION_DELAY:
+                        # Tahan pembacaan client ini; client lain tetap dilayani
+                        await asyncio.sleep(wait)
+                    elif limiter.action == ACTION_DROP:
+                        if time.monotonic() - last_notice >= 1.0:
+                            last_notice = time.monotonic()
+                            send_system(conn, "Terlalu banyak pesan, pesan dibuang")
+                        continue
+                    else:
+                        log_event(f"[RATE LIMIT] {addr} diputus karena melebihi batas laju", events_mod.WARNING)
+                        conn.close()
+                        break
                 
-                print(f"[{addr}] Received: {data}")
-                enqueue_log(f"[{addr}] Received: {data}")
+                # Event per pesan: tidak diformat jika tidak ada sink DEBUG
+                if events.enabled(events_mod.DEBUG):
+                    events.emit(events_mod.DEBUG, f"[{addr}] Received: {data}")
                 # Log pesan yang diterima
                 log_message(addr, data, "RECEIVED")
                 
-                # Broadcast pesan ke semua client lain
-                broadcast_message(data, addr, conn)
-            except socket.timeout:
-                # Timeout, check server_running flag
-                continue
-            except Exception as e:
-                print(f"[ERROR] {addr}: {e}")
-                enqueue_log(f"[ERROR] {addr}: {e}")
-                log_message(addr, f"ERROR: {e}", "SYSTEM")
-                break
+                if data.startswith("/"):
+                    handle_command(conn, data)
+                else:
+                    # Broadcast pesan ke anggota room aktif
+                    broadcast_message(data, addr, conn)
+            
+            file_wait = limiter.on_file_bytes(file_bytes)
+            wait = limiter.on_bytes(len(chunk) - file_bytes)
+            if wait and not conn.closed:
+                m_rate_limited.inc()
+                conn.throttled += 1
+                if limiter.action == ACTION_DELAY or limiter.action == ACTION_DROP:
+                    # Backpressure: socket tidak dibaca sehingga TCP menahan pengirim
+                    await asyncio.sleep(wait)
+                else:
+                    log_event(f"[RATE LIMIT] {addr} diputus karena melebihi batas byte", events_mod.WARNING)
+                    break
+            if file_wait and not conn.closed:
+                # Upload file selalu ditahan, tidak pernah diputus
+                await asyncio.sleep(file_wait)
             
+    except asyncio.CancelledError:
+        # Server sedang dimatikan; selesai dengan normal agar tidak ada
+        # traceback dari callback StreamReaderProtocol
+        pass
     except Exception as e:
-        print(f"[ERROR] {addr}: {e}")
+        log_event(f"[ERROR] {addr}: {e}", events_mod.ERROR)
         log_message(addr, f"ERROR: {e}", "SYSTEM")
     finally:
-        # Hapus client dari list
-        if (conn, addr) in connected_clients:
-            connected_clients.remove((conn, addr))
-        
-        # Notifikasi ke semua client bahwa ada client yang keluar
-        if server_running:
-            broadcast_message(f"User {addr[0]} left the chat", addr, conn)
+        timer_wheel.cancel(conn)
+        # Hapus client dari registry
+        client_registry.remove(conn.id)
+        presence.unsubscribe(conn)
+        for file_id, upload in conn.uploads.items():
+            upload.file.close()
+            if active_uploads.get(file_id) is conn:
+                del active_uploads[file_id]
+        # Kepergian client dikirim lewat delta presence, bukan broadcast per room
+        if not conn.handed_off:
+            presence.disconnect(conn.nickname)
+        room_index.leave_all(conn)
         
+        # Koneksi yang sudah diserahkan tetap hidup di proses baru; yang
+        # ditutup di sini hanya salinan fd milik proses ini
         conn.close()
-        print(f"[DISCONNECTED] {addr}")
-        enqueue_log(f"[DISCONNECTED] {addr}")
-        print(f"[ACTIVE CONNECTIONS] {len(connected_clients)}")
-        enqueue_log(f"[ACTIVE CONNECTIONS] {len(connected_clients)}")
-        log_message(addr, "CLIENT DISCONNECTED", "SYSTEM")
+        try:
+            await conn.wait_closed()
+            if not conn.handed_off:
+                log_event(f"[DISCONNECTED] {addr}")
+                log_event(f"[ACTIVE CONNECTIONS] {len(client_registry)}")
+                log_message(addr, "CLIENT DISCONNECTED", "SYSTEM")
+        finally:
+            # Paling akhir: task tetap terlihat di client_tasks (shutdown
+            # menunggunya) sampai koneksi tertutup dan log keluar tertulis
+            client_tasks.discard(task)
 
 def server_chat_input():
     """Fungsi untuk server mengirim pesan ke semua client"""
     print("\nServer dapat mengirim pesan ke semua client!")
     print("Ketik pesan server atau 'quit' untuk keluar dari mode chat server")
+    print("Ketik 'stats' untuk melihat daftar client dan antrean keluarnya")
     print("-" * 50)
     
     while server_running:
@@ -134,150 +820,375 @@ def server_chat_input():
                 print("Server keluar dari mode chat")
                 break
             
-            if connected_clients:
-                # Broadcast pesan server ke semua client
-                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-                formatted_message = f"[{timestamp}] SERVER: {server_message}"
-                
-                for client_conn, client_addr in connected_clients:
-                    try:
-                        client_conn.send(formatted_message.encode())
-                    except:
-                        # Jika gagal kirim, hapus client dari list
-                        connected_clients.remove((client_conn, client_addr))
-                        client_conn.close()
-                
-                # Log pesan server
-                log_message(("SERVER", 0), f"SERVER MESSAGE: {server_message}", "SERVER")
-                print(f"Pesan server terkirim ke {len(connected_clients)} client")
+            if server_message.lower() == 'stats':
+                # Tampilkan metadata dan antrean keluar per client
+                for st in client_stats():
+                    print(format_client_stats(st))
+                continue
+            
+            # Broadcast dijalankan di thread event loop (atau semua worker)
+            delivered = broadcast_from_server(server_message)
+            if delivered:
+                print(f"Pesan server terkirim ke {delivered} client")
             else:
                 print("Tidak ada client yang terhubung")
                 
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, EOFError):
             print("\nServer chat interrupted")
             break
         except Exception as e:
             print(f"Error server chat: {e}")
 
+def _broadcast_server_message(message):
+    """Kirim pesan SERVER ke semua client, harus dipanggil di thread event loop"""
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    formatted_message = f"[{timestamp}] SERVER: {message}"
+    return fan_out(encode_text(formatted_message))
+
+def _collect_client_stats():
+    return [client_conn.stats() for client_conn in client_registry.snapshot()]
+
+def client_stats():
+    """Metadata dan antrean keluar per client (aman dipanggil dari thread lain)"""
+    try:
+        if cluster_master is not None:
+            return run_coroutine_in_loop(cluster_master.stats)
+        return run_in_loop(_collect_client_stats)
+    except Exception:
+        return []
+
+def format_client_stats(st):
+    """Satu baris ringkasan client untuk console/GUI"""
+    joined = datetime.datetime.fromtimestamp(st['joined_at']).strftime("%H:%M:%S")
+    worker = f"w{st['worker']} " if "worker" in st else ""
+    return (f"{worker}#{st['id']} {st['nickname']} {st['addr']} room=#{st['room']} joined={joined} "
+            f"in={st['bytes_in']}B out={st['bytes_out']}B queue={st['queue_depth']} "
+            f"max={st['max_depth']} sent={st['frames_sent']} writes={st['write_calls']} "
+            f"dropped={st['frames_dropped']} throttled={st.get('throttled', 0)}")
+
+async def collect_metrics():
+    """Snapshot metrik proses ini, atau gabungan semua worker di mode cluster"""
+    if cluster_master is not None:
+        return await cluster_master.metrics()
+    return metrics.snapshot()
+
+def metrics_snapshot():
+    """Snapshot metrik untuk GUI/console (aman dipanggil dari thread lain)"""
+    try:
+        return run_coroutine_in_loop(collect_metrics)
+    except Exception:
+        return {}
+
+async def start_metrics_http():
+    """Jalankan endpoint Prometheus jika METRICS_PORT diset; None jika mati"""
+    if not metrics_mod.METRICS_PORT:
+        return None
+    try:
+        http = await metrics_mod.start_http(collect_metrics)
+    except OSError as e:
+        log_event(f"[METRICS] Endpoint tidak bisa dibuka: {e}", events_mod.WARNING)
+        return None
+    url = f"http://{metrics_mod.METRICS_HOST}:{metrics_mod.METRICS_PORT}/metrics"
+    log_event(f"[METRICS] Endpoint Prometheus di {url}")
+    return http
+
+def _in_loop_thread():
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+def run_in_loop(func, *args, timeout=5.0):
+    """Jalankan func(*args) di thread event loop server dan kembalikan hasilnya"""
+    loop = _loop
+    if loop is None or loop.is_closed():
+        raise RuntimeError("Server tidak berjalan")
+    if _in_loop_thread():
+        return func(*args)
+    result = concurrent.futures.Future()
+
+    def _call():
+        try:
+            result.set_result(func(*args))
+        except Exception as e:
+            result.set_exception(e)
+
+    loop.call_soon_threadsafe(_call)
+    return result.result(timeout=timeout)
+
+def run_coroutine_in_loop(coro_func, *args, timeout=5.0):
+    """Jalankan coroutine di event loop server dari thread lain (GUI/console)"""
+    loop = _loop
+    if loop is None or loop.is_closed() or _in_loop_thread():
+        raise RuntimeError("Server tidak berjalan")
+    return asyncio.run_coroutine_threadsafe(coro_func(*args), loop).result(timeout=timeout)
+
 def broadcast_from_server(message: str):
     """Broadcast helper dipanggil dari GUI"""
     if not message:
         return 0
     delivered = 0
-    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-    formatted_message = f"[{timestamp}] SERVER: {message}"
-    for client_conn, client_addr in connected_clients[:]:
-        try:
-            client_conn.send(formatted_message.encode())
-            delivered += 1
-        except Exception:
-            try:
-                connected_clients.remove((client_conn, client_addr))
-            except Exception:
-                pass
-            try:
-                client_conn.close()
-            except Exception:
-                pass
+    try:
+        if cluster_master is not None:
+            delivered = run_coroutine_in_loop(cluster_master.broadcast, message)
+        else:
+            delivered = run_in_loop(_broadcast_server_message, message)
+    except Exception:
+        # Server belum/tidak berjalan, tidak ada client
+        pass
     log_message(("SERVER", 0), f"SERVER MESSAGE: {message}", "SERVER")
-    enqueue_log(f"SERVER broadcast delivered to {delivered} client(s)")
+    log_event(f"SERVER broadcast delivered to {delivered} client(s)")
     return delivered
 
 def shutdown_server():
-    """Fungsi untuk shutdown server dengan proper cleanup"""
-    global server_running
-    print("\n[SHUTTING DOWN] Server sedang dimatikan...")
-    enqueue_log("[SHUTTING DOWN] Server sedang dimatikan...")
-    server_running = False
-    
-    # Tutup semua koneksi client
-    for client_conn, client_addr in connected_clients[:]:
+    """Fungsi untuk shutdown server dengan proper cleanup (via cancellation)"""
+    loop, task = _loop, _server_task
+    if task is None or loop is None or loop.is_closed():
+        return
+    log_event("[SHUTTING DOWN] Server sedang dimatikan...")
+    if _in_loop_thread():
+        task.cancel()
+        return
+    try:
+        loop.call_soon_threadsafe(task.cancel)
+    except RuntimeError:
+        # Loop sudah ditutup
+        return
+    # Tunggu sampai antrean client terkirim dan semua koneksi ditutup
+    _server_stopped.wait(timeout=DRAIN_TIMEOUT + 5.0)
+
+async def _close_all_clients():
+    """Batalkan semua task client dan tunggu sampai koneksinya tertutup"""
+    tasks = list(client_tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    # Koneksi yang belum sempat punya task
+    for client_conn in client_registry.snapshot():
+        drop_client(client_conn)
+    client_registry.clear()
+    room_index.clear()
+    presence.clear()
+    timer_wheel.clear()
+
+def notify_ready():
+    """Sinyal siap untuk supervisor: sd_notify (NOTIFY_SOCKET) dan/atau READY_FILE"""
+    _sd_notify("READY=1")
+    if READY_FILE:
+        try:
+            with open(READY_FILE, "w") as f:
+                f.write(f"{os.getpid()}\n")
+        except OSError as e:
+            log_event(f"[READY] READY_FILE tidak bisa ditulis: {e}", events_mod.WARNING)
+    log_event(f"[READY] Server siap menerima koneksi di {HOST}:{PORT}")
+
+def notify_stopping():
+    _sd_notify("STOPPING=1")
+    if READY_FILE:
         try:
-            client_conn.close()
-        except:
+            os.unlink(READY_FILE)
+        except OSError:
             pass
-    connected_clients.clear()
-    
-    # Tunggu semua thread client selesai
-    for thread in client_threads[:]:
-        if thread.is_alive():
-            thread.join(timeout=2.0)
-    client_threads.clear()
-    
-    print("[SHUTDOWN COMPLETE] Server berhasil dimatikan")
-    enqueue_log("[SHUTDOWN COMPLETE] Server berhasil dimatikan")
 
-def signal_handler(signum, frame):
-    """Handler untuk signal SIGINT dan SIGTERM"""
-    print(f"\n[RECEIVED SIGNAL {signum}] Server akan dimatikan...")
-    shutdown_server()
-    sys.exit(0)
+def _sd_notify(state):
+    """Kirim status ke systemd (Type=notify); diam jika NOTIFY_SOCKET tidak ada"""
+    path = os.environ.get("NOTIFY_SOCKET")
+    if not path or not hasattr(socket, "AF_UNIX"):
+        return
+    if path.startswith("@"):
+        # Abstract namespace
+        path = "\0" + path[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(state.encode("ascii"), path)
+    except OSError:
+        pass
 
-def start_server():
-    global server_running
-    server_running = True
-    
-    # Register signal handler hanya jika di main thread
+async def _drain_clients(timeout):
+    """Beri tahu client lalu tunggu antrean keluarnya terkirim (maksimal timeout)"""
+    conns = client_registry.snapshot()
+    if not conns or timeout <= 0:
+        return
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    fan_out(encode_text(f"[{timestamp}] SERVER: Server sedang dimatikan, silakan sambung ulang"),
+            conns)
+    # Download tidak ditunggu; client melanjutkannya dari offset setelah reconnect
+    for conn in conns:
+        for job in list(conn.downloads):
+            conn.cancel_file(job[0])
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if all(c.closed or c.drained() for c in client_registry.snapshot()):
+            break
+        await asyncio.sleep(0.05)
+
+def _raise_fd_limit():
+    """Naikkan soft limit file descriptor agar bisa menampung banyak koneksi"""
     try:
-        if threading.current_thread() is threading.main_thread():
-            signal.signal(signal.SIGINT, signal_handler)
-            # SIGTERM mungkin tidak tersedia di Windows, tangani dengan aman
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except Exception:
+        pass
+
+def _install_signal_handlers(loop):
+    """Register SIGINT/SIGTERM agar membatalkan task utama server"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for signum in (signal.SIGINT, getattr(signal, "SIGTERM", None)):
+        if signum is None:
+            continue
+        try:
+            loop.add_signal_handler(signum, _on_signal, signum)
+        except (NotImplementedError, RuntimeError):
+            # Windows: tidak ada add_signal_handler, pakai signal.signal
             try:
-                signal.signal(signal.SIGTERM, signal_handler)
+                signal.signal(signum, lambda s, _f: loop.call_soon_threadsafe(_on_signal, s))
             except Exception:
                 pass
-    except Exception:
-        # Abaikan jika tidak bisa set signal (mis. bukan main thread)
-        pass
-    
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((HOST, PORT))
-    server.listen(5)
-    print(f"[STARTING] Server berjalan di {HOST}:{PORT} ...")
-    enqueue_log(f"[STARTING] Server berjalan di {HOST}:{PORT} ...")
-    print("Server dapat mengirim pesan ke semua client!")
-    enqueue_log("Server dapat mengirim pesan ke semua client!")
-    print("Tekan Ctrl+C untuk menghentikan server")
-    enqueue_log("Tekan Ctrl+C untuk menghentikan server")
-    
-    # Buat thread untuk server chat input
-    server_chat_thread = threading.Thread(target=server_chat_input)
-    server_chat_thread.daemon = True
-    server_chat_thread.start()
-    
+
+def _on_signal(signum):
+    """Handler untuk signal SIGINT dan SIGTERM"""
+    log_event(f"[RECEIVED SIGNAL {signum}] Server akan dimatikan...")
+    shutdown_server()
+
+async def serve(sock=None, reuse_port=False):
+    """Coroutine utama server; berhenti ketika task-nya dibatalkan.
+
+    sock: listening socket yang sudah di-bind (diwariskan dari master cluster).
+    reuse_port: bind dengan SO_REUSEPORT agar beberapa worker berbagi port.
+    """
+    global server_running, _listener, _metrics_http, _handed_off
+    _handed_off = False
+    # Batas koneksi default mengikuti batas fd yang sudah dinaikkan start_server()
+    admission.apply_fd_limit()
+    # Serah terima (handoff.py) hanya untuk mode satu proses
+    use_handoff = cluster_bus is None and sock is None and handoff.supported()
+    if use_handoff and handoff.HANDOFF_TAKEOVER:
+        sock = await handoff.take_over(sys.modules[__name__], handoff.HANDOFF_SOCKET)
+        if sock is not None:
+            # systemd (NotifyAccess=all) perlu tahu PID utama yang baru
+            _sd_notify(f"MAINPID={os.getpid()}")
+    if sock is not None:
+        _listener = await asyncio.start_server(accept_client, sock=sock, backlog=LISTEN_BACKLOG)
+    else:
+        _listener = await asyncio.start_server(
+            accept_client, HOST, PORT, reuse_address=True, reuse_port=reuse_port,
+            backlog=LISTEN_BACKLOG)
+    _metrics_http = None
+    heartbeat_task = None
+    handoff_task = None
+    presence_task = asyncio.create_task(_presence_loop())
+    if use_handoff and handoff.HANDOFF_SOCKET:
+        handoff_task = asyncio.create_task(
+            handoff.serve_handoff(sys.modules[__name__], handoff.HANDOFF_SOCKET))
+    if HEARTBEAT_INTERVAL > 0:
+        heartbeat_task = asyncio.create_task(_heartbeat_loop())
+    if cluster_bus is not None:
+        await cluster_bus.connect()
+    else:
+        # Di mode cluster endpoint dijalankan master (gabungan semua worker)
+        _metrics_http = await start_metrics_http()
+        # Worker cluster tidak memberi sinyal sendiri; master yang memberi
+        notify_ready()
+    log_event(f"[STARTING] Server berjalan di {HOST}:{PORT} ...")
+    log_event("Server dapat mengirim pesan ke semua client!")
+    log_event("Tekan Ctrl+C untuk menghentikan server")
     try:
-        while server_running:
+        # Tunggu sampai task dibatalkan (shutdown_server / signal)
+        await asyncio.Future()
+    finally:
+        server_running = False
+        # Setelah serah terima proses baru yang memegang READY_FILE dan
+        # client; yang tersisa di sini hanya salinan fd
+        if cluster_bus is None and not _handed_off:
+            notify_stopping()
+        # Berhenti menerima koneksi baru, lalu kuras antrean client yang ada
+        _listener.close()
+        presence_task.cancel()
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+        if handoff_task is not None:
+            handoff_task.cancel()
+        if _metrics_http is not None:
+            _metrics_http.close()
+        if not _handed_off:
+            await _drain_clients(DRAIN_TIMEOUT)
+        await _close_all_clients()
+        if cluster_bus is not None:
+            await cluster_bus.close()
+        chat_log.flush()
+        log_event("[SHUTDOWN COMPLETE] Server berhasil dimatikan")
+
+def start_server(sock=None, reuse_port=False, console=True):
+    """Jalankan server asyncio (selectors) sampai dibatalkan; blocking.
+
+    Jika WORKERS > 1, proses ini menjadi master cluster yang menjalankan
+    worker-worker (lihat cluster.py).
+    """
+    global _loop, _server_task, server_running
+    server_running = True
+    _raise_fd_limit()
+    loop = asyncio.SelectorEventLoop()
+    asyncio.set_event_loop(loop)
+    _server_stopped.clear()
+    _setup_event_sinks()
+    try:
+        _loop = loop
+        if WORKERS > 1:
+            import cluster
+            _server_task = loop.create_task(cluster.serve_master(sys.modules[__name__], WORKERS))
+        else:
+            _server_task = loop.create_task(serve(sock, reuse_port))
+        _install_signal_handlers(loop)
+
+        # Buat thread untuk server chat input
+        if console:
+            server_chat_thread = threading.Thread(target=server_chat_input)
+            server_chat_thread.daemon = True
+            server_chat_thread.start()
+
+        try:
+            loop.run_until_complete(_server_task)
+        except asyncio.CancelledError:
+            pass
+        except KeyboardInterrupt:
+            log_event("[KEYBOARD INTERRUPT] Server dimatikan oleh user")
+            _server_task.cancel()
             try:
-                # Set timeout untuk accept agar bisa check server_running flag
-                server.settimeout(1.0)
-                conn, addr = server.accept()
-                
-                # Buat thread baru untuk setiap client
-                thread = threading.Thread(target=handle_client, args=(conn, addr))
-                thread.daemon = True
-                thread.start()
-                client_threads.append(thread)
-                
-            except socket.timeout:
-                # Timeout, check server_running flag
-                continue
-            except Exception as e:
-                if server_running:
-                    print(f"[ERROR] Accept connection: {e}")
-                    enqueue_log(f"[ERROR] Accept connection: {e}")
-                    
-    except KeyboardInterrupt:
-        print("\n[KEYBOARD INTERRUPT] Server dimatikan oleh user")
+                loop.run_until_complete(_server_task)
+            except asyncio.CancelledError:
+                pass
+        except Exception as e:
+            log_event(f"[ERROR] Server: {e}", events_mod.ERROR)
     finally:
-        shutdown_server()
-        server.close()
+        server_running = False
+        _server_task = None
+        _loop = None
+        loop.close()
+        asyncio.set_event_loop(None)
+        events.flush()
+        _server_stopped.set()
 
 def cli_main():
     start_server()
 
+def daemon_main():
+    """Mode headless: tanpa GUI, tanpa thread input console.
+
+    Konfigurasi dari environment; chatd.py menambahkan flag CLI dan file
+    konfigurasi sebelum modul ini diimpor.
+    """
+    start_server(console=False)
+
 class ServerControlGUI:
     def __init__(self, root):
+        global gui_attached
+        gui_attached = True
         self.root = root
         self.root.title("Chat Server Control")
         self.server_thread = None
@@ -308,6 +1219,9 @@ class ServerControlGUI:
         self.log_box = ScrolledText(container, height=18, wrap=tk.WORD, state=tk.DISABLED)
         self.log_box.grid(row=1, column=0, sticky="nsew", pady=(10,10))
         container.rowconfigure(1, weight=1)
+        # Render batch; event server (termasuk per pesan) masuk lewat sink
+        self.log_view = BatchedLogView(root, self.log_box)
+        events.add_sink(self._on_events, events_mod.DEBUG)
 
         bcast = ttk.Frame(container)
         bcast.grid(row=2, column=0, sticky="ew")
@@ -319,16 +1233,24 @@ class ServerControlGUI:
         self.msg_entry.bind("<Return>", lambda _e: self.send_broadcast())
         self.send_btn = ttk.Button(bcast, text="Broadcast", command=self.send_broadcast)
         self.send_btn.grid(row=0, column=1, padx=(8,0))
+        self.stats_btn = ttk.Button(bcast, text="Clients", command=self.show_clients)
+        self.stats_btn.grid(row=0, column=2, padx=(8,0))
+
+        # Ringkasan metrik live, diperbarui setiap detik
+        self.metrics_var = tk.StringVar(value="Metrik: server belum berjalan")
+        ttk.Label(container, textvariable=self.metrics_var).grid(row=3, column=0, sticky="w", pady=(8,0))
+        self._last_metrics = None
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
-        # Polling queue log dari thread server
-        self.root.after(200, self._poll_logs)
+        self.root.after(1000, self._poll_metrics)
 
     def append_log(self, text):
-        self.log_box.configure(state=tk.NORMAL)
-        self.log_box.insert(tk.END, text + "\n")
-        self.log_box.see(tk.END)
-        self.log_box.configure(state=tk.DISABLED)
+        self.log_view.append(text)
+
+    def _on_events(self, batch):
+        # Dipanggil dari thread dispatcher event; append aman lintas thread
+        for event in batch:
+            self.log_view.append(events_mod.format_event(event))
 
     def toggle_server(self):
         if not self.running:
@@ -370,22 +1292,54 @@ class ServerControlGUI:
         self.append_log(f"Broadcast terkirim ke {delivered} client")
         self.msg_var.set("")
 
+    def show_clients(self):
+        stats = client_stats()
+        if not stats:
+            self.append_log("Tidak ada client yang terhubung")
+            return
+        for st in stats:
+            self.append_log(format_client_stats(st))
+
     def on_close(self):
         self.stop_server_gui()
+        events.remove_sink(self._on_events)
+        self.log_view.close()
         self.root.destroy()
 
-    def _poll_logs(self):
-        try:
-            while True:
-                msg = log_queue.get_nowait()
-                self.append_log(msg)
-        except Exception:
-            pass
-        # jadwalkan polling berikutnya
-        self.root.after(200, self._poll_logs)
+    def _poll_metrics(self):
+        snap = metrics_snapshot() if self.running else {}
+        if snap:
+            now = time.monotonic()
+
+            def value(name):
+                return snap.get(name, {}).get("value", 0)
+
+            prev = self._last_metrics
+            accept_rate = recv_rate = 0.0
+            if prev is not None and now > prev[0]:
+                elapsed = now - prev[0]
+                accept_rate = (value("chat_connections_accepted_total") - prev[1]) / elapsed
+                recv_rate = (value("chat_recv_bytes_total") - prev[2]) / elapsed
+            self._last_metrics = (now, value("chat_connections_accepted_total"),
+                                  value("chat_recv_bytes_total"))
+            fanout = snap.get("chat_broadcast_fanout_seconds")
+            log_write = snap.get("chat_log_write_seconds")
+            fanout_p99 = metrics_mod.quantile(fanout, 0.99) * 1000 if fanout else 0.0
+            log_p99 = metrics_mod.quantile(log_write, 0.99) * 1000 if log_write else 0.0
+            self.metrics_var.set(
+                f"Koneksi {value('chat_connections_active')} | accept {accept_rate:.1f}/s | "
+                f"recv {recv_rate / 1024:.1f} KiB/s | fan-out p99 {fanout_p99:.2f} ms | "
+                f"log p99 {log_p99:.2f} ms | antrean keluar {value('chat_outbound_queue_frames')} | "
+                f"antrean log {value('chat_log_queue_pending')} | "
+                f"gagal kirim {value('chat_send_failures_total')} | "
+                f"ditolak {value('chat_connections_rejected_total')}")
+        elif not self.running:
+            self._last_metrics = None
+            self.metrics_var.set("Metrik: server belum berjalan")
+        self.root.after(1000, self._poll_metrics)
 
 def gui_main():
-    if tk is None:
+    if not load_tk():
         print("Tkinter tidak tersedia. Menjalankan mode CLI.")
         cli_main()
         return
@@ -395,8 +1349,11 @@ def gui_main():
     root.mainloop()
 
 if __name__ == "__main__":
-    # Default ke GUI; gunakan argumen 'cli' untuk mode terminal
+    # Default ke GUI; 'cli' untuk mode terminal, 'daemon' untuk mode headless
+    # (lihat juga chatd.py untuk flag dan file konfigurasi)
     if len(sys.argv) > 1 and sys.argv[1].lower() == 'cli':
         cli_main()
+    elif len(sys.argv) > 1 and sys.argv[1].lower() == 'daemon':
+        daemon_main()
     else:
         gui_main()
\ No newline at end of file
@@ -0,0 +1,429 @@
+"""Mesin koneksi client yang tahan putus, dipakai CLI dan GUI client.py
+
+ChatSession menjaga satu koneksi ke server:
+    - Jika koneksi putus, sambung ulang otomatis dengan exponential backoff
+      dan full jitter (jeda acak 0..batas), agar saat server restart ribuan
+      client tidak menyerbu di detik yang sama.
+    - Pesan yang dikirim saat offline ditahan di antrean lokal terbatas
+      (CHAT_SEND_QUEUE) dan dikirim berurutan setelah tersambung lagi.
+    - Setelah tersambung lagi nickname dan room dipulihkan, dan setiap room
+      meminta delta sejak nomor urut terakhir yang diterima (/resume).
+      SeqFilter membuang pesan yang sudah pernah ditampilkan.
+    - Jika server diam selama CHAT_PING_INTERVAL detik client mengirim
+      FRAME_PING; koneksi dianggap putus jika tetap tidak ada data.
+    - Jika server menolak dengan FRAME_BUSY, percobaan berikutnya menunggu
+      acak retry_after..2*retry_after detik. Pesan yang terkirim sebelum
+      balasan FRAME_HELLO diantre lagi karena server tidak memprosesnya.
+
+Jika on_presence diberikan, session berlangganan daftar user online
+(FRAME_PRESENCE): users selalu berisi daftar terbaru dan on_presence(users)
+dipanggil dengan salinannya setiap kali berubah.
+
+Transfer file (transfer.py) lewat session.transfers: upload(path) dan
+download(id). Progres dan hasilnya dilaporkan lewat on_status.
+
+Callback on_message(text), on_status(text) dan on_presence(users) dipanggil
+dari thread penerima milik session.
+
+Konfigurasi lewat environment:
+    CHAT_SEND_QUEUE     maksimal pesan tertahan saat offline (default 1000)
+    RECONNECT_MIN       jeda backoff awal dalam detik (default 0.5)
+    RECONNECT_MAX       jeda backoff maksimal dalam detik (default 30)
+    CHAT_PING_INTERVAL  detik tanpa data sebelum client mengirim PING (default 30)
+"""
+import collections
+import os
+import random
+import socket
+import threading
+
+from protocol import (FrameDecoder, FrameError, FRAME_TEXT, FRAME_SEQ, FRAME_HELLO, FRAME_PING,
+                      FRAME_REPLAY, FRAME_PRESENCE, FRAME_FILE, FRAME_CHUNK, COMPRESSION_ZLIB,
+                      encode_text, decode_text, decode_seq, encode_hello, decode_hello, expand_frames,
+                      encode_ping, encode_pong, decode_presence, decode_file, FRAME_BUSY,
+                      decode_busy)
+from rooms import DEFAULT_ROOM
+from transfer import TransferManager
+
+CHAT_SEND_QUEUE = int(os.environ.get('CHAT_SEND_QUEUE', '1000'))
+RECONNECT_MIN = float(os.environ.get('RECONNECT_MIN', '0.5'))
+RECONNECT_MAX = float(os.environ.get('RECONNECT_MAX', '30'))
+CHAT_PING_INTERVAL = float(os.environ.get('CHAT_PING_INTERVAL', '30'))
+CONNECT_TIMEOUT = 10.0
+
+# Keterangan alasan FRAME_BUSY untuk on_status
+BUSY_REASONS = {"clients": "server penuh", "ip": "terlalu banyak koneksi dari IP ini"}
+
+# Hasil ChatSession.send()
+SEND_OK = "sent"
+SEND_QUEUED = "queued"
+SEND_FULL = "full"
+
+
+class SeqFilter:
+    """Lacak nomor urut pesan room dari frame FRAME_SEQ.
+
+    Pesan room yang di-replay server setelah reconnect dan sudah pernah
+    diterima dibuang agar tidak tampil dua kali. Nomor urut yang sudah
+    dilihat disimpan per room (dibatasi SEQ_WINDOW terakhir), jadi delta
+    dari /resume yang datang setelah replay otomatis tetap ditampilkan.
+
+    Pesan sampai nomor urut dari FRAME_REPLAY terakhir room-nya ditandai
+    replay=True (riwayat saat masuk room, bukan pesan baru).
+    """
+
+    SEQ_WINDOW = 4096
+
+    def __init__(self):
+        self.last_seq = {}
+        self._seen = {}
+        self._skip_next = False
+        self._next = (None, None)
+        self._next_replay = False
+        self._replay_until = {}
+        # (room, seq) pesan teks terakhir yang diterima accept(); (None, None)
+        # untuk pesan di luar room (SERVER, DM)
+        self.context = (None, None)
+        self.replay = False
+
+    def accept(self, frame_type, payload):
+        """True jika frame adalah teks yang perlu ditampilkan"""
+        if frame_type == FRAME_REPLAY:
+            room, seq = decode_seq(payload)
+            self._replay_until[room] = seq
+            return False
+        if frame_type == FRAME_SEQ:
+            room, seq = decode_seq(payload)
+            seen = self._seen.setdefault(room, set())
+            last = self.last_seq.get(room, 0)
+            self._skip_next = seq in seen or seq <= last - self.SEQ_WINDOW
+            self._next = (room, seq)
+            self._next_replay = seq <= self._replay_until.get(room, 0)
+            if not self._skip_next:
+                seen.add(seq)
+                if seq > last:
+                    self.last_seq[room] = last = seq
+                if len(seen) > 2 * self.SEQ_WINDOW:
+                    self._seen[room] = {s for s in seen if s > last - self.SEQ_WINDOW}
+            return False
+        if frame_type != FRAME_TEXT:
+            return False
+        skip, self._skip_next = self._skip_next, False
+        self.context, self._next = self._next, (None, None)
+        self.replay, self._next_replay = self._next_replay, False
+        return not skip
+
+    def forget(self, room):
+        """Berhenti melacak room (setelah /leave) agar tidak di-resume"""
+        self.last_seq.pop(room, None)
+        self._seen.pop(room, None)
+        self._replay_until.pop(room, None)
+
+
+def hello_notice(payload, compress):
+    """Teks info dari balasan FRAME_HELLO server ('' jika tidak perlu info)"""
+    if not compress:
+        return ""
+    mode = decode_hello(payload).get("compress", "none")
+    if mode == COMPRESSION_ZLIB:
+        return "Kompresi zlib aktif"
+    return "Server tidak mendukung kompresi; pesan dikirim tanpa kompresi"
+
+
+def backoff_delay(attempt, low=None, high=None):
+    """Jeda sebelum percobaan ke-attempt: acak 0..min(high, low * 2^attempt)"""
+    low = RECONNECT_MIN if low is None else low
+    high = RECONNECT_MAX if high is None else high
+    return random.uniform(0, min(high, low * (2 ** min(attempt, 30))))
+
+
+class ChatSession:
+    """Koneksi client yang menyambung ulang sendiri; aman dipakai dari banyak thread"""
+
+    def __init__(self, host, port, compress=False, on_message=None, on_status=None,
+                 queue_size=None, seq_filter=None, on_presence=None):
+        self.host = host
+        self.port = port
+        self.compress = compress
+        self.on_message = on_message or (lambda text: None)
+        self.on_status = on_status or (lambda text: None)
+        self.on_presence = on_presence
+        self.users = set()  # user online; diisi hanya jika on_presence diberikan
+        self.pending = collections.deque()
+        self.queue_size = CHAT_SEND_QUEUE if queue_size is None else queue_size
+        # Dipertahankan antar koneksi agar reconnect hanya menampilkan delta
+        self.seq_filter = seq_filter or SeqFilter()
+        self.nickname = None
+        self.rooms = [DEFAULT_ROOM]  # room yang diikuti, room aktif paling akhir
+        self.connected = False
+        self.closed = False
+        self.reconnects = 0
+        self.transfers = TransferManager(self)
+        self._sock = None
+        # Teks terkirim yang belum dikonfirmasi balasan FRAME_HELLO (None jika sudah)
+        self._unconfirmed = None
+        self._retry_after = 0.0  # saran jeda dari FRAME_BUSY terakhir
+        # Melindungi _sock, pending dan urutan tulis ke socket
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Sambungkan pertama kali (melempar OSError jika gagal) lalu jalankan thread"""
+        self._open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, text):
+        """Kirim teks; SEND_OK, SEND_QUEUED jika offline, SEND_FULL jika antrean penuh.
+
+        FrameError dilempar jika pesan terlalu besar.
+        """
+        frame = encode_text(text)
+        with self._lock:
+            if self.connected and not self.pending:
+                try:
+                    self._sock.sendall(frame)
+                    self._track(text)
+                    if self._unconfirmed is not None:
+                        self._unconfirmed.append(text)
+                    return SEND_OK
+                except OSError:
+                    self._drop_locked()
+            if self.closed or len(self.pending) >= self.queue_size:
+                return SEND_FULL
+            self.pending.append(text)
+            return SEND_QUEUED
+
+    def send_many(self, texts):
+        """Kirim banyak teks dengan satu write; hasil seperti send() untuk semuanya"""
+        texts = list(texts)
+        frames = b"".join(encode_text(text) for text in texts)
+        with self._lock:
+            if self.connected and not self.pending:
+                try:
+                    self._sock.sendall(frames)
+                    for text in texts:
+                        self._track(text)
+                    if self._unconfirmed is not None:
+                        self._unconfirmed.extend(texts)
+                    return SEND_OK
+                except OSError:
+                    self._drop_locked()
+            if self.closed or len(self.pending) + len(texts) > self.queue_size:
+                return SEND_FULL
+            self.pending.extend(texts)
+            return SEND_QUEUED
+
+    def send_frame(self, frame):
+        """Kirim satu frame apa adanya jika tersambung; False jika offline (tidak diantre)"""
+        with self._lock:
+            if not self.connected:
+                return False
+            try:
+                self._sock.sendall(frame)
+                return True
+            except OSError:
+                self._drop_locked()
+                return False
+
+    def wait_connected(self):
+        """Blok sampai tersambung atau session ditutup; True jika tersambung"""
+        while not self.connected and not self.closed:
+            self._stop.wait(0.2)
+        return self.connected
+
+    def close(self):
+        """Tutup koneksi dan hentikan reconnect; pesan tertahan dibuang"""
+        self.closed = True
+        self._stop.set()
+        with self._lock:
+            self._drop_locked()
+        self.transfers.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    def _track(self, text):
+        """Catat nickname/room dari perintah yang terkirim untuk dipulihkan nanti"""
+        parts = text.split()
+        if not parts:
+            return
+        cmd = parts[0].lower()
+        if cmd == "/leave" and len(parts) == 1 and self.rooms:
+            parts.append(self.rooms[-1])
+        if len(parts) < 2:
+            return
+        name = parts[1]
+        if cmd == "/nick":
+            self.nickname = name
+        elif cmd == "/join":
+            if name in self.rooms:
+                self.rooms.remove(name)
+            self.rooms.append(name)
+        elif cmd == "/leave" and name in self.rooms:
+            self.rooms.remove(name)
+            self.seq_filter.forget(name)
+
+    def _restore_commands(self):
+        """Nickname, lalu /resume (atau /join) setiap room; room aktif terakhir"""
+        commands = []
+        if self.nickname:
+            commands.append(f"/nick {self.nickname}")
+        last_seq = self.seq_filter.last_seq
+        # Room yang hanya dikenal dari nomor urut (mis. dari session sebelumnya)
+        rooms = [room for room in last_seq if room not in self.rooms] + self.rooms
+        for room in rooms:
+            if room in last_seq:
+                commands.append(f"/resume {last_seq[room]} {room}")
+            elif room != DEFAULT_ROOM:
+                commands.append(f"/join {room}")
+        if len(self.rooms) > 1 and self.rooms[-1] == DEFAULT_ROOM:
+            # Client baru selalu di lobby; jadikan aktif lagi setelah room lain
+            commands.append(f"/join {DEFAULT_ROOM}")
+        return commands
+
+    def _open(self):
+        """Buka socket, negosiasi, pulihkan room dan kirim antrean; dalam satu write"""
+        sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        sock.settimeout(CHAT_PING_INTERVAL if CHAT_PING_INTERVAL > 0 else None)
+        options = {"heartbeat": 1}
+        if self.compress:
+            options["compress"] = COMPRESSION_ZLIB
+        if self.on_presence is not None:
+            options["presence"] = 1
+        with self._lock:
+            if self.closed:
+                sock.close()
+                raise OSError("Session sudah ditutup")
+            restore = self._restore_commands()
+            queued = list(self.pending)
+            data = [encode_hello(**options)]
+            data.extend(encode_text(command) for command in restore)
+            data.extend(encode_text(text) for text in queued)
+            # Download yang terputus dilanjutkan dari byte terakhir yang diterima
+            data.extend(self.transfers.resume_frames())
+            try:
+                sock.sendall(b"".join(data))
+            except OSError:
+                sock.close()
+                raise
+            self.pending.clear()
+            for text in queued:
+                self._track(text)
+            self._unconfirmed = queued
+            self._sock = sock
+            self.connected = True
+        return len(queued)
+
+    def _drop_locked(self):
+        """Tandai putus dan tutup socket (pemanggil memegang _lock)"""
+        sock, self._sock = self._sock, None
+        self.connected = False
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def _run(self):
+        attempt = 0
+        while not self.closed:
+            sock = self._sock
+            if sock is not None:
+                reason = self._receive(sock)
+                with self._lock:
+                    if self._sock is sock:
+                        self._drop_locked()
+                if self.closed:
+                    break
+                self.on_status(f"Koneksi terputus ({reason}), mencoba menyambung ulang...")
+            delay = backoff_delay(attempt)
+            if self._retry_after:
+                # Server penuh: jitter menyebar percobaan ulang semua client
+                delay = max(delay, random.uniform(self._retry_after, 2 * self._retry_after))
+                self._retry_after = 0.0
+            if self._stop.wait(delay):
+                break
+            attempt += 1
+            try:
+                flushed = self._open()
+            except OSError as e:
+                self.on_status(f"Gagal menyambung ulang (percobaan {attempt}): {e}")
+                continue
+            attempt = 0
+            self.reconnects += 1
+            note = f", {flushed} pesan tertahan terkirim" if flushed else ""
+            self.on_status(f"Tersambung kembali ke server{note}")
+
+    def _receive(self, sock):
+        """Terima pesan sampai koneksi putus; mengembalikan alasan putus"""
+        decoder = FrameDecoder()
+        ping_pending = False
+        try:
+            while True:
+                try:
+                    # recv_into langsung ke buffer decoder, tanpa salinan tambahan
+                    nbytes = sock.recv_into(decoder.get_buffer())
+                except socket.timeout:
+                    if ping_pending:
+                        return "server tidak membalas PING"
+                    ping_pending = True
+                    self._send_raw(sock, encode_ping())
+                    continue
+                if not nbytes:
+                    return "ditutup server"
+                ping_pending = False
+                decoder.buffer_updated(nbytes)
+                for frame_type, payload in expand_frames(decoder.frames()):
+                    if frame_type == FRAME_BUSY:
+                        return self._on_busy(payload)
+                    if frame_type == FRAME_HELLO:
+                        with self._lock:
+                            self._unconfirmed = None
+                        notice = hello_notice(payload, self.compress)
+                        if notice:
+                            self.on_status(notice)
+                        continue
+                    if frame_type == FRAME_PING:
+                        self._send_raw(sock, encode_pong(payload))
+                        continue
+                    if frame_type == FRAME_PRESENCE:
+                        self._apply_presence(payload)
+                        continue
+                    if frame_type == FRAME_CHUNK:
+                        self.transfers.on_chunk(payload)
+                        continue
+                    if frame_type == FRAME_FILE:
+                        self.transfers.on_control(decode_file(payload))
+                        continue
+                    if not self.seq_filter.accept(frame_type, payload):
+                        continue
+                    self.on_message(decode_text(payload))
+        except (OSError, FrameError) as e:
+            return str(e) or e.__class__.__name__
+
+    def _on_busy(self, payload):
+        """Koneksi ditolak server; antre lagi teks yang belum diproses"""
+        retry_after, reason = decode_busy(payload)
+        self._retry_after = retry_after
+        with self._lock:
+            if self._unconfirmed:
+                self.pending.extendleft(reversed(self._unconfirmed))
+            self._unconfirmed = None
+        reason = BUSY_REASONS.get(reason, reason or "server sibuk")
+        return f"{reason}, coba lagi dalam {retry_after:g} detik"
+
+    def _apply_presence(self, payload):
+        snapshot, added, removed = decode_presence(payload)
+        if snapshot:
+            self.users.clear()
+        self.users.update(added)
+        self.users.difference_update(removed)
+        if self.on_presence is not None:
+            self.on_presence(set(self.users))
+
+    def _send_raw(self, sock, data):
+        with self._lock:
+            if self._sock is sock:
+                sock.sendall(data)
@@ -0,0 +1,58 @@
+"""Regresi ChatLogWriter: batch yang melewati tengah malam
+
+Jalankan dari root repo:
+    python -m unittest discover tests
+"""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import chatlog  # noqa: E402
+import logstore  # noqa: E402
+
+
+class MidnightBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        day1 = datetime.datetime(2024, 1, 1, 23, 59, 59)
+        self.day1 = day1.timestamp()
+        self.day2 = (day1 + datetime.timedelta(seconds=2)).timestamp()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, log_format):
+        writer = chatlog.ChatLogWriter(self.tmp.name, "t", log_format=log_format)
+        writer._write_batch([(self.day1, "a", None), (self.day2, "b", None)])
+        writer._sync(force=True)
+        return writer
+
+    def _text(self, timestamp):
+        writer = chatlog.ChatLogWriter(self.tmp.name, "t")
+        with open(writer.path_for(datetime.date.fromtimestamp(timestamp)), encoding="utf-8") as f:
+            return f.read()
+
+    def test_text_records_land_in_both_days(self):
+        writer = self._write("text")
+        writer._file.close()
+        self.assertTrue(self._text(self.day1).endswith("] a\n"))
+        self.assertTrue(self._text(self.day2).endswith("] b\n"))
+
+    def test_text_and_binary_agree(self):
+        writer = self._write("both")
+        writer._file.close()
+        writer._close_segment()
+        for timestamp, text in ((self.day1, "a"), (self.day2, "b")):
+            self.assertTrue(self._text(timestamp).endswith(f"] {text}\n"))
+            path = writer.path_for(datetime.date.fromtimestamp(timestamp))[:-4] + \
+                logstore.SEGMENT_SUFFIX
+            self.assertGreater(os.path.getsize(path), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""Regresi SeqFilter: penanda replay riwayat saat masuk room
+
+Jalankan dari root repo:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from protocol import (FrameDecoder, FRAME_REPLAY, FRAME_SEQ, FRAME_TEXT,  # noqa: E402
+                      encode_replay, encode_seq)
+from session import SeqFilter  # noqa: E402
+
+
+def _frames(data):
+    decoder = FrameDecoder()
+    decoder.feed(data)
+    return list(decoder.frames())
+
+
+class ReplayMarkerTest(unittest.TestCase):
+    def _accept(self, seq_filter, room, seq):
+        (seq_type, seq_payload), = _frames(encode_seq(room, seq))
+        self.assertEqual(seq_type, FRAME_SEQ)
+        seq_filter.accept(seq_type, seq_payload)
+        self.assertTrue(seq_filter.accept(FRAME_TEXT, b"x"))
+        return seq_filter.replay
+
+    def test_history_up_to_marker_is_replay(self):
+        seq_filter = SeqFilter()
+        (frame_type, payload), = _frames(encode_replay("lobby", 2))
+        self.assertEqual(frame_type, FRAME_REPLAY)
+        self.assertFalse(seq_filter.accept(frame_type, payload))
+        self.assertTrue(self._accept(seq_filter, "lobby", 1))
+        self.assertTrue(self._accept(seq_filter, "lobby", 2))
+        self.assertFalse(self._accept(seq_filter, "lobby", 3))
+        self.assertFalse(self._accept(seq_filter, "other", 1))
+
+    def test_leave_forgets_marker(self):
+        seq_filter = SeqFilter()
+        seq_filter.accept(*_frames(encode_replay("lobby", 5))[0])
+        seq_filter.forget("lobby")
+        self.assertFalse(self._accept(seq_filter, "lobby", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Timer wheel (hashed) untuk timeout banyak koneksi dengan satu timer
+
+Wheel berisi sejumlah slot; setiap tick satu slot diperiksa. Menjadwalkan,
+membatalkan, dan memindahkan timer adalah O(1), dan satu tick hanya
+menyentuh entry di slot tersebut. Timeout yang lebih panjang dari satu
+putaran wheel disimpan dengan sisa putaran (rounds).
+
+Wheel tidak memanggil callback sendiri: advance() mengembalikan key yang
+jatuh tempo dan pemanggil yang memutuskan tindakannya. Wheel tidak aman
+lintas thread; pakai hanya dari thread event loop.
+"""
+import math
+
+
+class TimerWheel:
+    """Wheel dengan len(slots) slot berukuran tick detik"""
+
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]
+        self.current = 0
+        self._where = {}  # key -> index slot
+
+    def schedule(self, key, delay):
+        """Jadwalkan (atau pindahkan) key agar jatuh tempo setelah delay detik"""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        size = len(self.slots)
+        index = (self.current + ticks) % size
+        self.slots[index][key] = (ticks - 1) // size
+        self._where[key] = index
+
+    def cancel(self, key):
+        index = self._where.pop(key, None)
+        if index is not None:
+            self.slots[index].pop(key, None)
+
+    def advance(self):
+        """Maju satu tick; mengembalikan list key yang jatuh tempo"""
+        self.current = (self.current + 1) % len(self.slots)
+        slot = self.slots[self.current]
+        expired = []
+        for key, rounds in list(slot.items()):
+            if rounds == 0:
+                del slot[key]
+                del self._where[key]
+                expired.append(key)
+            else:
+                slot[key] = rounds - 1
+        return expired
+
+    def clear(self):
+        for slot in self.slots:
+            slot.clear()
+        self._where.clear()
+
+    def __len__(self):
+        return len(self._where)
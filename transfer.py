@@ -0,0 +1,237 @@
+"""Upload dan download file lewat server untuk ChatSession (CLI dan GUI client.py)
+
+Upload berjalan di thread sendiri: file dibaca per FILE_CHUNK_SIZE dan setiap
+potongan dikirim sebagai satu FRAME_CHUNK dengan memegang lock session hanya
+selama potongan itu ditulis. Pesan chat yang dikirim bersamaan masuk di
+antara potongan, jadi paling lama menunggu satu potongan. Laju kirim
+mengikuti "rate" dari op=ready (FILE_RATE_BYTES server) agar buffer socket
+tidak terisi potongan yang menunggu giliran dibaca server.
+
+Koneksi putus di tengah transfer:
+    - upload menunggu session tersambung lagi lalu mengirim op=put id=...
+      token=... (token dari op=ready pertama); server membalas offset yang
+      sudah tersimpan dan upload diteruskan
+    - download diminta ulang (op=get offset=ukuran file .part) oleh
+      ChatSession saat menyambung ulang
+
+Download ditulis ke "<DOWNLOAD_DIR>/<id>.part" sesuai offset setiap potongan,
+lalu di-rename ke nama aslinya setelah server mengirim op=end.
+
+Konfigurasi lewat environment:
+    DOWNLOAD_DIR  direktori hasil download (default downloads)
+"""
+import itertools
+import os
+import threading
+import time
+
+from files import FILE_CHUNK_SIZE, format_size, safe_name
+from protocol import encode_file, encode_chunk, decode_chunk
+
+DOWNLOAD_DIR = os.environ.get('DOWNLOAD_DIR', 'downloads')
+# Detik menunggu balasan op=ready sebelum op=put dikirim ulang
+READY_TIMEOUT = 10.0
+
+
+class _Upload:
+    def __init__(self, path, ref):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self.ref = ref
+        self.id = None
+        self.token = None  # syarat melanjutkan upload, dari op=ready pertama
+        self.offset = 0
+        self.rate = 0  # byte/detik dari server, 0 = tanpa batas
+        self.error = None
+        self.interrupted = False  # server tidak lagi mengenal upload ini
+        self.ready = threading.Event()
+        self.done = threading.Event()
+
+
+class _Download:
+    def __init__(self, file_id, directory):
+        self.id = file_id
+        self.name = None
+        self.size = None
+        self.directory = directory
+        self.path = os.path.join(directory, f"{file_id:08x}.part")
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "r+b" if os.path.exists(self.path) else "w+b")
+        # Potongan yang sudah tersimpan = offset lanjutan
+        self.received = self.file.seek(0, os.SEEK_END)
+
+
+class TransferManager:
+    """Transfer file milik satu ChatSession"""
+
+    def __init__(self, session):
+        self.session = session
+        self.uploads = {}    # ref -> _Upload
+        self.downloads = {}  # id file -> _Download (hanya diakses thread penerima dan pemanggil)
+        self._refs = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def upload(self, path):
+        """Mulai upload di background; server mengumumkannya ke room aktif.
+
+        OSError dilempar jika file tidak bisa dibaca.
+        """
+        upload = _Upload(path, next(self._refs))
+        self.uploads[upload.ref] = upload
+        threading.Thread(target=self._run_upload, args=(upload,), daemon=True).start()
+        return upload
+
+    def download(self, file_id):
+        """Minta file (id heksadesimal dari pengumuman /get); dilanjutkan jika ada .part"""
+        file_id = int(file_id, 16)
+        with self._lock:
+            if file_id in self.downloads:
+                return
+            download = _Download(file_id, DOWNLOAD_DIR)
+            self.downloads[file_id] = download
+        # Jika offline, permintaan dikirim ChatSession saat tersambung (resume_frames)
+        self.session.send_frame(encode_file(op="get", id=f"{file_id:08x}",
+                                            offset=download.received))
+
+    def resume_frames(self):
+        """Permintaan lanjutan semua download untuk koneksi baru"""
+        with self._lock:
+            return [encode_file(op="get", id=f"{d.id:08x}", offset=d.received)
+                    for d in self.downloads.values()]
+
+    def _status(self, text):
+        self.session.on_status(text)
+
+    def _run_upload(self, upload):
+        session = self.session
+        try:
+            with open(upload.path, "rb") as f:
+                while not session.closed:
+                    if self._upload_once(upload, f):
+                        self._status(f"Upload {upload.name} selesai ({format_size(upload.size)})")
+                        return
+                    if upload.error:
+                        self._status(f"Upload {upload.name} gagal: {upload.error}")
+                        return
+                    # Koneksi putus: tunggu tersambung lagi lalu lanjutkan
+                    session.wait_connected()
+        except OSError as e:
+            self._status(f"Upload {upload.name} gagal: {e}")
+        finally:
+            self.uploads.pop(upload.ref, None)
+
+    def _upload_once(self, upload, f):
+        """Satu percobaan di satu koneksi; True jika server menyatakan selesai"""
+        session = self.session
+        generation = session.reconnects
+        fields = {"op": "put", "ref": upload.ref}
+        if upload.id is None:
+            fields.update(name=upload.name, size=upload.size)
+        else:
+            fields.update(id=f"{upload.id:08x}", token=upload.token)
+        upload.ready.clear()
+        upload.interrupted = False
+        if not session.send_frame(encode_file(**fields)):
+            return False
+        if not upload.ready.wait(READY_TIMEOUT) or upload.error:
+            return False
+        offset = upload.offset
+        if offset:
+            self._status(f"Upload {upload.name} dilanjutkan dari {format_size(offset)}")
+        f.seek(offset)
+        started, start_offset = time.monotonic(), offset
+        while offset < upload.size:
+            if upload.interrupted or session.reconnects != generation:
+                return False
+            data = f.read(FILE_CHUNK_SIZE)
+            if not data:
+                upload.error = "file berubah ukuran saat diupload"
+                return False
+            if not session.send_frame(encode_chunk(upload.id, offset, data)):
+                return False
+            offset += len(data)
+            if upload.rate:
+                ahead = started + (offset - start_offset) / upload.rate - time.monotonic()
+                if ahead > 0:
+                    time.sleep(ahead)
+        # Tunggu konfirmasi server; jika koneksi putus, op=put berikutnya memeriksa
+        while not upload.done.wait(0.2):
+            if upload.interrupted or session.reconnects != generation or session.closed:
+                return False
+        return True
+
+    def on_control(self, fields):
+        """Balasan FRAME_FILE dari server (dipanggil thread penerima session)"""
+        op = fields.get("op")
+        file_id = int(fields["id"], 16) if fields.get("id") else None
+        upload = None
+        if fields.get("ref", "").isdigit():
+            upload = self.uploads.get(int(fields["ref"]))
+        elif file_id is not None:
+            upload = next((u for u in list(self.uploads.values()) if u.id == file_id), None)
+        if op == "ready" and upload is not None:
+            upload.id = file_id
+            upload.token = fields.get("token", upload.token)
+            upload.offset = int(fields.get("offset", "0"))
+            upload.rate = int(fields.get("rate", "0"))
+            upload.ready.set()
+        elif op == "done" and upload is not None:
+            upload.done.set()
+        elif op == "error":
+            reason = fields.get("reason", "")
+            if upload is not None:
+                if upload.ready.is_set():
+                    # Server kehilangan upload (mis. restart): lanjutkan dengan op=put id
+                    upload.interrupted = True
+                else:
+                    upload.error = reason
+                    upload.ready.set()
+            elif file_id in self.downloads:
+                self._finish_download(file_id, f"Download {file_id:08x} gagal: {reason}")
+        elif op == "meta" and file_id in self.downloads:
+            download = self.downloads[file_id]
+            download.name = fields.get("name")
+            download.size = int(fields.get("size", "0"))
+            offset = int(fields.get("offset", "0"))
+            if offset:
+                self._status(f"Download {download.name} dilanjutkan dari {format_size(offset)}")
+        elif op == "end" and file_id in self.downloads:
+            self._finish_download(file_id)
+
+    def on_chunk(self, payload):
+        file_id, offset, data = decode_chunk(payload)
+        download = self.downloads.get(file_id)
+        if download is None:
+            return
+        # Tulis di offset-nya: potongan yang terkirim ulang menimpa data yang sama
+        download.file.seek(offset)
+        download.file.write(data)
+        download.received = max(download.received, offset + len(data))
+
+    def _finish_download(self, file_id, error=None):
+        with self._lock:
+            download = self.downloads.pop(file_id)
+        download.file.close()
+        if error:
+            self._status(error)
+            return
+        target = _unique_path(download.directory, safe_name(download.name or f"{file_id:08x}"))
+        os.replace(download.path, target)
+        self._status(f"Download {download.name} selesai: {target}")
+
+    def close(self):
+        with self._lock:
+            for download in self.downloads.values():
+                download.file.close()
+            self.downloads.clear()
+
+
+def _unique_path(directory, name):
+    """Path di directory yang belum dipakai: nama, nama (1), nama (2), ..."""
+    base, ext = os.path.splitext(name)
+    path = os.path.join(directory, name)
+    for n in itertools.count(1):
+        if not os.path.exists(path):
+            return path
+        path = os.path.join(directory, f"{base} ({n}){ext}")